@@ -1,15 +1,92 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import re
+from app import config
+from app.services.intent_model import CentroidIntentModel, get_intent_model
+from app.utils.logger import get_logger
+
+logger = get_logger("classification_agent")
+
+_GROUP_RE = re.compile(r"\([^()]*\)")
+_TOKEN_RE = re.compile(r"\w+")
+# A leading word, or a leading group of plain alternatives, that ends on a word boundary
+_LEADING_WORD_RE = re.compile(r"(\w+)(?=\s|\\b|$)")
+_LEADING_GROUP_RE = re.compile(r"\(([\w |]+)\)(?=\s|\\b|$)")
+
+def _trigger_words(pattern: str) -> Optional[List[str]]:
+    """
+    Get the words a rule can start with, or None if they cannot be read
+    from the pattern (e.g. '\\ballerg(y|ies)\\b' starts inside a word).
+    """
+    if not pattern.startswith(r"\b"):
+        return None
+    body = pattern[2:]
+
+    group = _LEADING_GROUP_RE.match(body)
+    if group:
+        alternatives = [alternative.split() for alternative in group.group(1).split('|')]
+        if not all(alternatives):
+            return None
+        return [alternative[0].lower() for alternative in alternatives]
+
+    word = _LEADING_WORD_RE.match(body)
+    if word:
+        return [word.group(1).lower()]
+    return None
 
 class ClassificationAgent:
     """
     Classification Agent that determines the intent of a user message
     and routes it to the appropriate specialized agent.
+
+    Three modes are available:
+        'rules': every pattern is searched separately and the intent with
+            the most matching patterns wins (confidence is always 1.0)
+        'scored': the message is scanned once against an index of the
+            rules by first word; each match adds its rule's weight to its
+            intent, and the confidence is the winner's share of all scores
+        'embedding': the message embedding is compared with per-intent
+            centroids trained from labeled interactions (see
+            app/services/intent_model.py); messages close to no centroid,
+            and all messages when the embedding model cannot be loaded,
+            are classified as in 'scored' mode
     """
+
+    # Weight of a pattern in 'scored' mode unless given in rule_weights:
+    # phrases are more specific than single keywords
+    KEYWORD_WEIGHT = 1.0
+    PHRASE_WEIGHT = 2.0
+
+    # Classifier implementations selectable as `mode`
+    MODES = ('rules', 'scored', 'embedding')
+
+    # Map intent to agent
+    AGENT_MAPPING = {
+        'order': 'order_agent',
+        'details': 'details_agent',
+        'recommendation': 'recommendation_agent',
+        'unknown': 'details_agent'  # Default to details agent for unknown intents
+    }
     
-    def __init__(self):
+    def __init__(self, mode: str = config.CLASSIFIER_MODE,
+                 intent_patterns: Optional[Dict[str, List[str]]] = None,
+                 rule_weights: Optional[Dict[str, float]] = None,
+                 intent_model: Optional[CentroidIntentModel] = None):
+        """
+        Args:
+            mode: 'rules', 'scored' or 'embedding'
+            intent_patterns: Intent -> regex patterns, replacing the built-in rules
+            rule_weights: Pattern -> weight in 'scored' mode
+            intent_model: Centroid model for 'embedding' mode (default: the shared one)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown classifier mode: {mode}")
+        self.mode = mode
+        self.intent_model = intent_model
+        self._intent_model_checked = intent_model is not None
+
         # Define patterns for each intent
-        self.intent_patterns = {
+        self.intent_patterns = intent_patterns or {
             'order': [
                 r'\b(order|buy|purchase|get|add to cart)\b',
                 r'\bhow (can|do) I (order|buy|purchase|get)\b',
@@ -54,6 +131,98 @@ class ClassificationAgent:
         self.compiled_patterns = {}
         for intent, patterns in self.intent_patterns.items():
             self.compiled_patterns[intent] = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+        self._build_scored_rules(rule_weights or {})
+
+    def _pattern_weight(self, pattern: str, rule_weights: Dict[str, float]) -> float:
+        if pattern in rule_weights:
+            return rule_weights[pattern]
+        # A space outside the alternations means the rule needs several words
+        return self.PHRASE_WEIGHT if ' ' in _GROUP_RE.sub('', pattern) else self.KEYWORD_WEIGHT
+
+    def _build_scored_rules(self, rule_weights: Dict[str, float]):
+        # first word -> [(compiled rule, intent, weight)], heaviest first
+        self._triggered_rules: Dict[str, List[Tuple[re.Pattern, str, float]]] = {}
+        # regex group name -> (intent, weight) for rules without a fixed first word
+        self._rule_groups: Dict[str, Tuple[str, float]] = {}
+        alternatives = []
+
+        for intent, patterns in self.intent_patterns.items():
+            for pattern in patterns:
+                weight = self._pattern_weight(pattern, rule_weights)
+                words = _trigger_words(pattern)
+                if words is None:
+                    name = f"r{len(self._rule_groups)}"
+                    self._rule_groups[name] = (intent, weight)
+                    alternatives.append(f"(?P<{name}>{pattern})")
+                    continue
+                compiled = re.compile(pattern, re.IGNORECASE)
+                for word in words:
+                    self._triggered_rules.setdefault(word, []).append((compiled, intent, weight))
+
+        # The sort is stable, so equal weights keep their listed order
+        for rules in self._triggered_rules.values():
+            rules.sort(key=lambda rule: -rule[2])
+        self._combined_pattern = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def score_intents(self, message: str) -> Dict[str, float]:
+        """
+        Score every intent with a single scan of the message ('scored' mode).
+
+        Each word of the message is looked up in an index of the rules that
+        start with it, and the heaviest of those that match there adds its
+        weight to its intent, so the cost depends on the message rather than
+        on the number of rules. Rules without a fixed first word are
+        combined into one regex that also runs once.
+
+        Args:
+            message: The user message to score
+
+        Returns:
+            Intent -> sum of the weights of its matches
+        """
+        scores = {intent: 0.0 for intent in self.intent_patterns}
+
+        if self._triggered_rules:
+            for token in _TOKEN_RE.finditer(message):
+                rules = self._triggered_rules.get(token.group().lower())
+                if not rules:
+                    continue
+                for compiled, intent, weight in rules:
+                    if compiled.match(message, token.start()):
+                        scores[intent] += weight
+                        break
+
+        if self._combined_pattern is not None:
+            for match in self._combined_pattern.finditer(message):
+                intent, weight = self._rule_groups[match.lastgroup]
+                scores[intent] += weight
+
+        return scores
+
+    def classify_scored(self, message: str) -> Tuple[str, float, Optional[str]]:
+        """
+        Classify a message by weighted scores ('scored' mode).
+
+        Args:
+            message: The user message to classify
+
+        Returns:
+            Tuple containing:
+                - The classified intent, or 'unknown' if no rule matched
+                - Confidence: the intent's share of the total score (0.0 if unknown)
+                - The runner-up intent, or None if no other intent matched
+        """
+        scores = self.score_intents(message)
+        total = sum(scores.values())
+        if total <= 0:
+            return 'unknown', 0.0, None
+
+        # Ties go to the intent listed first, as in classify_intent()
+        ranked = sorted(scores, key=lambda intent: -scores[intent])
+        intent = ranked[0]
+        runner_up = ranked[1] if len(ranked) > 1 and scores[ranked[1]] > 0 else None
+        return intent, round(scores[intent] / total, 4), runner_up
     
     def classify_intent(self, message: str) -> str:
         """
@@ -88,6 +257,58 @@ class ClassificationAgent:
         
         return max_intent
     
+    def _get_intent_model(self) -> Optional[CentroidIntentModel]:
+        if not self._intent_model_checked:
+            self.intent_model = get_intent_model(list(self.intent_patterns))
+            self._intent_model_checked = True
+            if self.intent_model is None:
+                logger.warning("Intent model unavailable, classifying with the scored rules")
+        return self.intent_model
+
+    def classify_embedding(self, messages: List[str]) -> List[Tuple[str, float, Optional[str]]]:
+        """
+        Classify messages by their nearest intent centroid ('embedding' mode).
+
+        The messages are embedded in batches and scored with one matrix
+        product. Their embeddings stay in the embedding cache, so retrieval
+        for the same message does not encode it again.
+
+        Args:
+            messages: The user messages to classify
+
+        Returns:
+            One (intent, confidence, runner-up intent) per message, as in classify_scored()
+        """
+        intent_model = self._get_intent_model()
+        if intent_model is None or not messages:
+            return [self.classify_scored(message) for message in messages]
+
+        try:
+            from app.utils.embeddings import get_embedding_matrix
+            predictions = intent_model.predict(get_embedding_matrix(messages))
+        except Exception as e:
+            logger.error("Error classifying with the intent model: %s", e)
+            return [self.classify_scored(message) for message in messages]
+
+        # Messages close to no centroid fall back to the rules
+        return [prediction if prediction[0] is not None else self.classify_scored(message)
+                for message, prediction in zip(messages, predictions)]
+
+    def _classify(self, messages: List[str]) -> List[Tuple[str, float, Optional[str]]]:
+        if self.mode == 'embedding':
+            return self.classify_embedding(messages)
+        if self.mode == 'scored':
+            return [self.classify_scored(message) for message in messages]
+        return [(self.classify_intent(message), 1.0, None) for message in messages]
+
+    def _result(self, intent: str, confidence: float, runner_up: Optional[str]) -> Dict:
+        return {
+            'intent': intent,
+            'confidence': confidence,
+            'runner_up': runner_up,
+            'agent': self.AGENT_MAPPING.get(intent, self.AGENT_MAPPING['unknown'])
+        }
+
     def process(self, message: str) -> Dict:
         """
         Process a user message and determine which agent should handle it.
@@ -98,21 +319,37 @@ class ClassificationAgent:
         Returns:
             Dict containing:
                 - 'intent': The classified intent
-                - 'confidence': Confidence score (placeholder for now)
+                - 'confidence': Confidence score (always 1.0 in 'rules' mode)
+                - 'runner_up': The second most likely intent (None in 'rules' mode)
                 - 'agent': The agent that should handle the message
         """
-        intent = self.classify_intent(message)
-        
-        # Map intent to agent
-        agent_mapping = {
-            'order': 'order_agent',
-            'details': 'details_agent',
-            'recommendation': 'recommendation_agent',
-            'unknown': 'details_agent'  # Default to details agent for unknown intents
-        }
-        
-        return {
-            'intent': intent,
-            'confidence': 1.0,  # Placeholder for now
-            'agent': agent_mapping[intent]
-        }
+        return self._result(*self._classify([message])[0])
+
+    def process_batch(self, messages: List[str]) -> List[Dict]:
+        """
+        Classify many user messages at once.
+
+        Identical messages are only classified once, and in 'embedding' mode
+        the whole batch is embedded and scored together.
+
+        Args:
+            messages: The user messages to process
+
+        Returns:
+            One process() result per message, in the same order
+        """
+        unique = list(dict.fromkeys(messages))
+        results = {message: self._result(*classified)
+                   for message, classified in zip(unique, self._classify(unique))}
+        return [results[message] for message in messages]
+
+    async def aprocess(self, message: str) -> Dict:
+        """
+        Async variant of process() for the asyncio chat pipeline.
+
+        The regex modes are cheap CPU work and run inline; embedding a
+        message runs the model, so in 'embedding' mode it runs on a thread.
+        """
+        if self.mode == 'embedding':
+            return await asyncio.to_thread(self.process, message)
+        return self.process(message)
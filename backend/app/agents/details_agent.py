@@ -1,7 +1,16 @@
-from typing import Dict, List, Optional, Any
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+import asyncio
 import re
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import config
 from app.database.models import Product, FAQ
+from app.services.pipeline_executor import BranchResults
+from app.services.product_cards import render_listing, render_listing_line, render_product_card
+from app.utils.helpers import reciprocal_rank_fusion
+from app.utils.logger import get_logger
+
+logger = get_logger("details_agent")
 
 class DetailsAgent:
     """
@@ -9,14 +18,69 @@ class DetailsAgent:
     including FAQs, allergens, and menu items.
     """
 
-    def __init__(self, db: Optional[Session] = None, faiss_index=None):
-        self.db = db
-        # We're not using FAISS for now to simplify the implementation
+    # Answers depend only on the message, so they may be cached
+    CACHEABLE = True
+
+    # Used for a search that fails or times out
+    RETRIEVAL_DEFAULTS = {'products': [], 'faqs': [], 'semantic': []}
+
+    def __init__(self, faiss_index=None, executor=None, product_index=None, card_cache=None, faq_search=None,
+                 retrieval_k: int = config.RETRIEVAL_K, rrf_k: int = config.RETRIEVAL_RRF_K):
+        # Optional FAISSIndex over product and FAQ embeddings (see init_faiss.py)
+        self.faiss_index = faiss_index
+        # Optional PipelineExecutor that runs the product, FAQ and semantic searches concurrently
+        self.executor = executor
+        # Optional ProductIndex over the products table
+        self.product_index = product_index
+        # Optional FAQSearch over the faqs table
+        self.faq_search = faq_search
+        # Optional ProductCardCache of rendered product cards
+        self.card_cache = card_cache
+        # Results kept per source and after fusion
+        self.retrieval_k = retrieval_k
+        self.rrf_k = rrf_k
+        # Whether real embeddings are available for the semantic search: None
+        # until checked (on a retrieval thread, since it loads the model)
+        self._embeddings_available: Optional[bool] = None
+        # Per-search timeouts in seconds, so a slow embedding does not hold up the lexical results
+        self.retrieval_timeouts = {
+            'products': config.RETRIEVAL_LEXICAL_TIMEOUT_MS / 1000,
+            'faqs': config.RETRIEVAL_LEXICAL_TIMEOUT_MS / 1000,
+            'semantic': config.RETRIEVAL_SEMANTIC_TIMEOUT_MS / 1000,
+        }
 
     def _search_products(self, query: str) -> List[Dict]:
         """
         Search for products in the database based on a query.
 
+        Products are ranked by the product index; the built-in sample
+        products are only used when there is no index or the products table
+        is empty.
+
+        Args:
+            query: The search query
+
+        Returns:
+            List of matching products, best match first
+        """
+        if self.product_index is not None:
+            try:
+                if not query or query.lower() in ['hi', 'hello', 'hey', 'hii']:
+                    # Show a couple of products for generic greetings
+                    products = self.product_index.first(2)
+                else:
+                    products = self.product_index.search(query)
+                if products or len(self.product_index):
+                    return products
+            except Exception as e:
+                logger.error("Error searching the product index: %s", e)
+
+        return self._search_sample_products(query)
+
+    def _search_sample_products(self, query: str) -> List[Dict]:
+        """
+        Search the built-in sample products based on a query.
+
         Args:
             query: The search query
 
@@ -81,7 +145,30 @@ class DetailsAgent:
 
     def _search_faqs(self, query: str) -> List[Dict]:
         """
-        Search for FAQs based on a query.
+        Search the FAQs based on a query.
+
+        FAQs are ranked by the FAQ search backend; the built-in sample FAQs
+        are only used when there is no FAQ search or the faqs table is empty.
+
+        Args:
+            query: The search query
+
+        Returns:
+            List of matching FAQs, best match first
+        """
+        if self.faq_search is not None and query and query.lower() not in ['hi', 'hello', 'hey', 'hii']:
+            try:
+                faqs = self.faq_search.search(query, limit=self.retrieval_k)
+                if faqs or not self.faq_search.is_empty():
+                    return faqs
+            except Exception as e:
+                logger.error("Error searching the FAQs: %s", e)
+
+        return self._search_sample_faqs(query)
+
+    def _search_sample_faqs(self, query: str) -> List[Dict]:
+        """
+        Search the built-in sample FAQs based on a query.
 
         Args:
             query: The search query
@@ -123,6 +210,97 @@ class DetailsAgent:
 
         return results if results else [mock_faqs[0]]  # Return at least one FAQ
 
+    def _search_semantic(self, query: str) -> List[Dict]:
+        """
+        Search the FAISS index for products and FAQs similar to a query.
+
+        Products and FAQs share one index, so a single embedding and k-NN
+        query covers both; the hits are split by their 'type' afterwards.
+
+        Args:
+            query: The search query
+
+        Returns:
+            Index metadata of the nearest documents, best match first
+        """
+        if self._embeddings_available is None:
+            self._embeddings_available = self._check_embeddings()
+        if not self._embeddings_available:
+            return []
+
+        try:
+            from app.utils.embeddings import get_embedding_vector
+
+            # Never random vectors: their hits would be fused into real answers
+            vector = get_embedding_vector(query, random_fallback=False)
+            if vector.shape[0] != self.faiss_index.index.d:
+                logger.warning("FAISS index has %d dimensions but the embedding model produces %d; "
+                               "rebuild it with init_faiss.py", self.faiss_index.index.d, vector.shape[0])
+                return []
+            # Twice k, since products and FAQs share the hits
+            return self.faiss_index.search(vector.reshape(1, -1), k=self.retrieval_k * 2)
+        except Exception as e:
+            logger.error("Error searching the FAISS index: %s", e)
+            return []
+
+    def _check_embeddings(self) -> bool:
+        """
+        Check once whether the embedding model loaded; the semantic search is
+        skipped for good (with one warning) if it did not.
+        """
+        try:
+            from app.utils.embeddings import is_model_available
+            available = is_model_available()
+            reason = "the model could not be loaded"
+        except ImportError as e:
+            available = False
+            reason = str(e)
+        if not available:
+            logger.warning("No embedding model (%s), semantic search is disabled", reason)
+        return available
+
+    def _fuse(self, found: Dict) -> Dict:
+        """
+        Merge the lexical and semantic search results by reciprocal-rank fusion.
+
+        Semantic product hits are resolved through the product index, so every
+        fused product has its full, current fields; hits for products that are
+        no longer indexed are dropped.
+
+        Args:
+            found: Branch results from _retrieval_branches()
+
+        Returns:
+            Dict with the fused 'products' and 'faqs'
+        """
+        products, faqs = found['products'], found['faqs']
+        semantic = found.get('semantic')
+        if not semantic:
+            return {'products': products, 'faqs': faqs}
+
+        semantic_products, semantic_faqs = [], []
+        for document in semantic:
+            # Index IDs look like 'faq_3' / 'product_12'
+            document_id = str(document.get('id', '')).split('_')[-1]
+            if document.get('type') == 'faq':
+                semantic_faqs.append({
+                    'faq_id': int(document_id) if document_id.isdigit() else document_id,
+                    'question': document.get('question', ''),
+                    'answer': document.get('answer', ''),
+                })
+            elif document.get('type') == 'product' and self.product_index is not None:
+                product = self.product_index.get(int(document_id)) if document_id.isdigit() else None
+                if product is not None:
+                    semantic_products.append(product)
+
+        return {
+            'products': reciprocal_rank_fusion([products, semantic_products], key=lambda product: product['product_id'],
+                                               k=self.rrf_k, limit=self.retrieval_k),
+            # FAQ IDs differ between the sources, the question text does not
+            'faqs': reciprocal_rank_fusion([faqs, semantic_faqs], key=lambda faq: faq['question'].strip().lower(),
+                                           k=self.rrf_k, limit=self.retrieval_k),
+        }
+
     def _format_product_info(self, product: Dict) -> str:
         """
         Format product information for display.
@@ -133,88 +311,261 @@ class DetailsAgent:
         Returns:
             Formatted product information string
         """
-        result = f"**{product['name']}**\n\n"
-        result += f"**Category:** {product['category']}\n"
-        result += f"**Price:** ${product['price']:.2f}\n"
-        result += f"**Availability:** {'In Stock' if product['stock'] > 0 else 'Out of Stock'}\n\n"
-        result += f"**Description:**\n{product['description']}\n\n"
-
-        if product.get('features') and isinstance(product['features'], dict):
-            result += "**Features:**\n"
-            for key, value in product['features'].items():
-                result += f"- {key.capitalize()}: {value}\n"
+        if self.card_cache is not None:
+            return self.card_cache.card(product)
+        return render_product_card(product)
 
-        return result
+    def _format_product_list(self, products: List[Dict]) -> str:
+        """
+        Format a numbered name and price listing of several products.
+        """
+        if self.card_cache is not None:
+            return self.card_cache.listing(products)
+        return render_listing([render_listing_line(product) for product in products])
 
-    def _generate_response(self, query: str, products: List[Dict], faqs: List[Dict]) -> str:
+    def iter_response(self, query: str, products: List[Dict], faqs: List[Dict]) -> Iterator[str]:
         """
-        Generate a response based on the query and search results.
+        Generate a response based on the query and search results, one chunk
+        at a time so it can be streamed to the client as it is produced.
 
         Args:
             query: The search query
             products: List of matching products
             faqs: List of matching FAQs
 
-        Returns:
-            Generated response string
+        Yields:
+            Consecutive pieces of the response string
         """
         # Handle greetings
         if query.lower() in ['hi', 'hello', 'hey', 'hii']:
-            return "Hello! How can I help you today? You can ask about our products, shipping, or return policy."
+            yield "Hello! How can I help you today? You can ask about our products, shipping, or return policy."
+            return
 
-        response = ""
+        produced = False
 
         # Add product information
         if products:
+            produced = True
             if len(products) == 1:
-                response += f"Here's the information about {products[0]['name']}:\n\n"
-                response += self._format_product_info(products[0])
+                yield f"Here's the information about {products[0]['name']}:\n\n"
+                yield self._format_product_info(products[0])
             else:
-                response += f"I found {len(products)} products that match your query:\n\n"
-                for i, product in enumerate(products, 1):
-                    response += f"{i}. **{product['name']}** - ${product['price']:.2f}\n"
-                response += "\nPlease specify which product you'd like more information about."
+                yield f"I found {len(products)} products that match your query:\n\n"
+                yield self._format_product_list(products)
+                yield "\nPlease specify which product you'd like more information about."
 
         # Add FAQ information if available and not too many products
         if faqs and (len(products) <= 1):
-            if response:
-                response += "\n\n**Related FAQs:**\n\n"
+            if produced:
+                yield "\n\n**Related FAQs:**\n\n"
 
             for faq in faqs:
-                response += f"**Q: {faq['question']}**\n"
-                response += f"A: {faq['answer']}\n\n"
+                produced = True
+                yield f"**Q: {faq['question']}**\nA: {faq['answer']}\n\n"
 
         # If no response was generated, provide a fallback
-        if not response:
-            response = f"I couldn't find specific information about '{query}'. Please try asking about our products, shipping, or return policy."
+        if not produced:
+            yield f"I couldn't find specific information about '{query}'. Please try asking about our products, shipping, or return policy."
 
-        return response
+    def _generate_response(self, query: str, products: List[Dict], faqs: List[Dict]) -> str:
+        """
+        Generate a response based on the query and search results.
 
-    def process(self, message: str) -> Dict:
+        Args:
+            query: The search query
+            products: List of matching products
+            faqs: List of matching FAQs
+
+        Returns:
+            Generated response string
         """
-        Process a user message and retrieve relevant product information.
+        return "".join(self.iter_response(query, products, faqs))
+
+    def retrieve(self, message: str, db: Optional[Session] = None) -> Dict:
+        """
+        Search for the products and FAQs relevant to a user message.
 
         Args:
             message: The user message to process
+            db: The database session for this request (optional)
 
         Returns:
             Dict containing:
-                - 'response': The agent's response
+                - 'query': The normalized query
                 - 'products': List of matching products
                 - 'faqs': List of matching FAQs
+                - 'degraded': True if a search failed or timed out, so the
+                  results may be incomplete
         """
         # Use the message as the query
         query = message.strip()
 
         # Search for matching products and FAQs
-        products = self._search_products(query)
-        faqs = self._search_faqs(query)
+        branches = self._retrieval_branches(query)
+        if self.executor is None:
+            found = BranchResults((name, branch()) for name, branch in branches.items())
+        else:
+            found = self.executor.run(branches, defaults=self.RETRIEVAL_DEFAULTS, timeouts=self.retrieval_timeouts)
+
+        return {'query': query, **self._fuse(found), 'degraded': found.degraded}
+
+    def _retrieval_branches(self, query: str) -> Dict:
+        """
+        Build the independent product, FAQ and semantic searches for a query.
+        """
+        branches = {
+            'products': lambda: self._search_products(query),
+            'faqs': lambda: self._search_faqs(query),
+        }
+        # Greetings get the fixed lexical answer, no need to embed them; without
+        # an embedding model there is nothing to search with
+        if (self.faiss_index is not None and self._embeddings_available is not False
+                and query and query.lower() not in ['hi', 'hello', 'hey', 'hii']):
+            branches['semantic'] = lambda: self._search_semantic(query)
+        return branches
+
+    def process(self, message: str, db: Optional[Session] = None) -> Dict:
+        """
+        Process a user message and retrieve relevant product information.
+
+        Args:
+            message: The user message to process
+            db: The database session for this request (optional)
+
+        Returns:
+            Dict containing:
+                - 'response': The agent's response
+                - 'products': List of matching products
+                - 'faqs': List of matching FAQs
+                - 'degraded': Whether the retrieval was incomplete
+        """
+        retrieved = self.retrieve(message, db=db)
 
         # Generate a response based on the search results
-        response = self._generate_response(query, products, faqs)
+        response = self._generate_response(retrieved['query'], retrieved['products'], retrieved['faqs'])
+
+        return {
+            'response': response,
+            'products': retrieved['products'],
+            'faqs': retrieved['faqs'],
+            'degraded': retrieved['degraded']
+        }
+
+    def process_batch(self, messages: List[str], db: Optional[Session] = None) -> List[Dict]:
+        """
+        Process many user messages at once.
+
+        Retrieval and formatting run once per distinct query, so repeated
+        questions in a batch are answered from the same search results.
+
+        Args:
+            messages: The user messages to process
+            db: The database session (optional)
+
+        Returns:
+            One process() result per message, in the same order
+        """
+        results = {}
+        for message in messages:
+            query = message.strip()
+            if query not in results:
+                results[query] = self.process(query, db=db)
+        return [results[message.strip()] for message in messages]
+
+    async def aretrieve(self, message: str, db: Optional[AsyncSession] = None) -> Dict:
+        """
+        Async variant of retrieve() for the asyncio chat pipeline.
+
+        The searches need no database session (the product index, FAQ search
+        and FAISS index manage their own), so they always run off the event
+        loop: on the executor's threads, or on a worker thread without one.
+        """
+        if self.executor is None:
+            return await asyncio.to_thread(self.retrieve, message)
+
+        query = message.strip()
+        found = await self.executor.arun(self._retrieval_branches(query), defaults=self.RETRIEVAL_DEFAULTS,
+                                         timeouts=self.retrieval_timeouts)
+        return {'query': query, **self._fuse(found), 'degraded': found.degraded}
+
+    async def aprocess(self, message: str, db: Optional[AsyncSession] = None) -> Dict:
+        """
+        Async variant of process() for the asyncio chat pipeline.
+
+        Args:
+            message: The user message to process
+            db: The async database session for this request (unused, see aretrieve())
+
+        Returns:
+            Same as process()
+        """
+        retrieved = await self.aretrieve(message)
+
+        # Formatting is cheap next to retrieval (cards are cached), so it stays on the loop
+        response = self._generate_response(retrieved['query'], retrieved['products'], retrieved['faqs'])
 
         return {
             'response': response,
-            'products': products,
-            'faqs': faqs
-        }
\ No newline at end of file
+            'products': retrieved['products'],
+            'faqs': retrieved['faqs'],
+            'degraded': retrieved['degraded']
+        }
+
+    def _handle_result(self, details_result: Dict) -> Dict:
+        return {
+            'response': details_result['response'],
+            'additional_data': {
+                'products': details_result['products'],
+                'faqs': details_result['faqs']
+            },
+            'degraded': details_result.get('degraded', False)
+        }
+
+    def handle(self, message: str, session: Optional[Dict] = None, user_id: Optional[int] = None,
+               db: Optional[Session] = None) -> Dict:
+        """
+        Dispatch entry point used by QueryHandler.
+
+        Args:
+            message: The filtered user message
+            session: The session's conversation state (unused)
+            user_id: The user ID (unused)
+            db: The database session for this request (optional)
+
+        Returns:
+            Dict with 'response', 'additional_data' (products, faqs) and 'degraded'
+        """
+        return self._handle_result(self.process(message, db=db))
+
+    def handle_batch(self, messages: List[str], db: Optional[Session] = None) -> List[Dict]:
+        """
+        Batch variant of handle(), see process_batch().
+        """
+        return [self._handle_result(result) for result in self.process_batch(messages, db=db)]
+
+    async def ahandle(self, message: str, session: Optional[Dict] = None, user_id: Optional[int] = None,
+                      db: Optional[AsyncSession] = None) -> Dict:
+        """
+        Async variant of handle() for the asyncio chat pipeline.
+        """
+        return self._handle_result(await self.aprocess(message, db=db))
+
+    async def astream(self, message: str, session: Optional[Dict] = None, user_id: Optional[int] = None,
+                      db: Optional[AsyncSession] = None) -> AsyncIterator[Union[str, Dict]]:
+        """
+        Streaming variant of ahandle(): yields the response text in chunks
+        as it is formatted, then the same result dict as ahandle().
+        """
+        retrieved = await self.aretrieve(message, db=db)
+
+        chunks = []
+        for chunk in self.iter_response(retrieved['query'], retrieved['products'], retrieved['faqs']):
+            chunks.append(chunk)
+            yield chunk
+
+        yield self._handle_result({
+            'response': "".join(chunks),
+            'products': retrieved['products'],
+            'faqs': retrieved['faqs'],
+            'degraded': retrieved['degraded']
+        })
@@ -1,5 +1,14 @@
-import re
-from typing import Dict, List, Tuple, Optional
+from collections import namedtuple
+from typing import Dict, List, Optional, Set, Tuple
+from app import config
+from app.utils.pattern_matcher import LexiconMatcher, Match
+
+# Outcome of screening one message:
+#   safe: True if the message may go on to the other agents
+#   reason: Reason code ('empty', 'too_long' or the lexicon category), None if safe
+#   message: Rejection message for the user, None if safe
+#   matches: Lexicon matches (category, term, start, end) behind the rejection
+GuardVerdict = namedtuple('GuardVerdict', ['safe', 'reason', 'message', 'matches'])
 
 class GuardAgent:
     """
@@ -7,26 +16,85 @@ class GuardAgent:
     before they are processed by other agents.
     """
 
-    def __init__(self):
-        # Patterns for detecting inappropriate content
-        self.profanity_patterns = [
-            r'\b(fuck|shit|ass|bitch|cunt|damn|dick|piss|cock|pussy|asshole)\b',
-            # Add more patterns as needed
-        ]
-
-        # Patterns for detecting spam or irrelevant content
-        self.spam_patterns = [
-            r'buy now',
-            r'click here',
-            r'limited time offer',
-            r'www\.',
-            r'http',
-            # Add more patterns as needed
-        ]
-
-        # Compile all patterns for efficiency
-        self.compiled_profanity = [re.compile(pattern, re.IGNORECASE) for pattern in self.profanity_patterns]
-        self.compiled_spam = [re.compile(pattern, re.IGNORECASE) for pattern in self.spam_patterns]
+    # Longest message accepted, in characters
+    MAX_MESSAGE_LENGTH = 500
+
+    # Built-in lexicons, used when the lexicon directory is missing
+    DEFAULT_LEXICONS = {
+        'profanity': ['fuck', 'shit', 'ass', 'bitch', 'cunt', 'damn', 'dick', 'piss', 'cock', 'pussy', 'asshole'],
+        'spam': ['buy now', 'click here', 'limited time offer', r're:www\.', 're:http'],
+    }
+
+    # Rejection reason per lexicon category, checked in this order
+    REJECTION_MESSAGES = {
+        'profanity': "Your message contains inappropriate language. Please rephrase your request.",
+        'spam': "Your message appears to be spam or promotional content, which is not supported.",
+    }
+    DEFAULT_REJECTION_MESSAGE = "Your message contains content that is not supported. Please rephrase your request."
+
+    def __init__(self, lexicon_dir: str = config.GUARD_LEXICON_DIR,
+                 reload_interval: float = config.GUARD_LEXICON_RELOAD_SECONDS):
+        # Every lexicon category (one file each) is matched in a single scan
+        # of the message, and edits to the files are picked up while running
+        self.lexicons = LexiconMatcher(lexicon_dir, reload_interval=reload_interval,
+                                       fallback=self.DEFAULT_LEXICONS)
+
+    def scan(self, message: str) -> List[Match]:
+        """
+        Find every lexicon entry in a message.
+
+        Args:
+            message: The user message to scan
+
+        Returns:
+            Matches (category, term, start, end) in order of position
+        """
+        return self.lexicons.scan(message)
+
+    def _rejection_message(self, categories: Set[str]) -> str:
+        for category, rejection in self.REJECTION_MESSAGES.items():
+            if category in categories:
+                return rejection
+        return self.DEFAULT_REJECTION_MESSAGE
+
+    def _verdict(self, message: str) -> GuardVerdict:
+        # Structural checks first: they cost O(1) and their rejections need no scan
+        stripped = message.strip()
+        if len(stripped) < 2:
+            return GuardVerdict(False, 'empty', "Please provide a valid message.", [])
+
+        if len(message) > self.MAX_MESSAGE_LENGTH:
+            return GuardVerdict(False, 'too_long',
+                                "Your message is too long. Please keep your message under 500 characters.", [])
+
+        # Then a single content scan for profanity, spam and any other lexicon category
+        matches = self.scan(message)
+        if matches:
+            categories = {match.category for match in matches}
+            reason = next((category for category in self.REJECTION_MESSAGES if category in categories),
+                          matches[0].category)
+            return GuardVerdict(False, reason, self._rejection_message(categories), matches)
+
+        return GuardVerdict(True, None, None, [])
+
+    def check_messages(self, messages: List[str]) -> List[GuardVerdict]:
+        """
+        Screen many messages at once.
+
+        Empty and over-long messages are rejected before any content scan, so
+        they cost almost nothing, and identical messages are only checked once.
+
+        Args:
+            messages: The user messages to check
+
+        Returns:
+            One GuardVerdict per message, in the same order
+        """
+        verdicts: Dict[str, GuardVerdict] = {}
+        for message in messages:
+            if message not in verdicts:
+                verdicts[message] = self._verdict(message)
+        return [verdicts[message] for message in messages]
 
     def check_message(self, message: str) -> Tuple[bool, Optional[str]]:
         """
@@ -40,25 +108,26 @@ class GuardAgent:
                 - Boolean indicating if message is safe (True) or not (False)
                 - Optional reason for rejection if message is not safe
         """
-        # Check for profanity
-        for pattern in self.compiled_profanity:
-            if pattern.search(message):
-                return False, "Your message contains inappropriate language. Please rephrase your request."
-
-        # Check for spam or irrelevant content
-        for pattern in self.compiled_spam:
-            if pattern.search(message):
-                return False, "Your message appears to be spam or promotional content, which is not supported."
+        verdict = self._verdict(message)
+        return verdict.safe, verdict.message
 
-        # Check for empty or too short messages
-        if not message.strip() or len(message.strip()) < 2:
-            return False, "Please provide a valid message."
-
-        # Check for extremely long messages
-        if len(message) > 500:
-            return False, "Your message is too long. Please keep your message under 500 characters."
-
-        return True, None
+    def _result(self, message: str, verdict: GuardVerdict) -> Dict:
+        if verdict.safe:
+            # Message is safe, return cleaned message
+            return {
+                'status': 'success',
+                'message': message,
+                'filtered_message': message.strip(),
+                'reason': None
+            }
+        else:
+            # Message is not safe, return rejection reason
+            return {
+                'status': 'rejected',
+                'message': verdict.message,
+                'filtered_message': None,
+                'reason': verdict.reason
+            }
 
     def process(self, message: str) -> Dict:
         """
@@ -72,20 +141,27 @@ class GuardAgent:
                 - 'status': 'success' or 'rejected'
                 - 'message': Original message if successful, or rejection reason if rejected
                 - 'filtered_message': Cleaned message if successful, None if rejected
+                - 'reason': Rejection reason code if rejected, None if successful
         """
-        is_safe, reason = self.check_message(message)
+        return self._result(message, self._verdict(message))
 
-        if is_safe:
-            # Message is safe, return cleaned message
-            return {
-                'status': 'success',
-                'message': message,
-                'filtered_message': message.strip()
-            }
-        else:
-            # Message is not safe, return rejection reason
-            return {
-                'status': 'rejected',
-                'message': reason,
-                'filtered_message': None
-            }
\ No newline at end of file
+    def process_batch(self, messages: List[str]) -> List[Dict]:
+        """
+        Process many user messages at once, screening them with check_messages().
+
+        Args:
+            messages: The user messages to process
+
+        Returns:
+            One process() result per message, in the same order
+        """
+        return [self._result(message, verdict)
+                for message, verdict in zip(messages, self.check_messages(messages))]
+
+    async def aprocess(self, message: str) -> Dict:
+        """
+        Async variant of process() for the asyncio chat pipeline.
+
+        The guard checks are pure CPU work, so this simply runs them inline.
+        """
+        return self.process(message)
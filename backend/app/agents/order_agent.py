@@ -1,6 +1,8 @@
 from typing import Dict, List, Optional, Any
+import json
 import re
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import Product, Order, User
 
 class OrderAgent:
@@ -9,8 +11,7 @@ class OrderAgent:
     using step-by-step reasoning.
     """
 
-    def __init__(self, db: Optional[Session] = None):
-        self.db = db
+    def __init__(self):
         self.order_states = {
             'init': self._handle_init,
             'product_selection': self._handle_product_selection,
@@ -127,17 +128,18 @@ class OrderAgent:
 
         return None
 
-    def _get_product_by_name(self, product_name: str) -> Optional[Dict]:
+    def _get_product_by_name(self, product_name: str, db: Optional[Session] = None) -> Optional[Dict]:
         """
         Get product details by name from the database.
 
         Args:
             product_name: The name of the product to search for
+            db: The database session (optional)
 
         Returns:
             Product details as a dictionary or None if not found
         """
-        if not self.db:
+        if not db:
             # Mock product for testing without DB
             return {
                 'product_id': 1,
@@ -148,7 +150,7 @@ class OrderAgent:
             }
 
         # Search for product in database
-        product = self.db.query(Product).filter(Product.name.ilike(f'%{product_name}%')).first()
+        product = db.query(Product).filter(Product.name.ilike(f'%{product_name}%')).first()
 
         if product:
             return {
@@ -161,13 +163,14 @@ class OrderAgent:
 
         return None
 
-    def _handle_init(self, message: str, context: Dict) -> Dict:
+    def _handle_init(self, message: str, context: Dict, db: Optional[Session] = None) -> Dict:
         """
         Handle initial state of the order process.
 
         Args:
             message: The user message
             context: The current context of the conversation
+            db: The database session (optional)
 
         Returns:
             Updated context and response
@@ -175,7 +178,7 @@ class OrderAgent:
         product_name = self._extract_product_name(message)
 
         if product_name:
-            product = self._get_product_by_name(product_name)
+            product = self._get_product_by_name(product_name, db)
 
             if product:
                 context['product'] = product
@@ -195,13 +198,14 @@ class OrderAgent:
             'response': "What product would you like to order today?"
         }
 
-    def _handle_product_selection(self, message: str, context: Dict) -> Dict:
+    def _handle_product_selection(self, message: str, context: Dict, db: Optional[Session] = None) -> Dict:
         """
         Handle product selection state.
 
         Args:
             message: The user message
             context: The current context of the conversation
+            db: The database session (optional)
 
         Returns:
             Updated context and response
@@ -209,7 +213,7 @@ class OrderAgent:
         product_name = self._extract_product_name(message)
 
         if product_name:
-            product = self._get_product_by_name(product_name)
+            product = self._get_product_by_name(product_name, db)
 
             if product:
                 context['product'] = product
@@ -229,13 +233,14 @@ class OrderAgent:
             'response': "I didn't catch which product you want. Could you please specify the product name?"
         }
 
-    def _handle_quantity_selection(self, message: str, context: Dict) -> Dict:
+    def _handle_quantity_selection(self, message: str, context: Dict, db: Optional[Session] = None) -> Dict:
         """
         Handle quantity selection state.
 
         Args:
             message: The user message
             context: The current context of the conversation
+            db: The database session (optional)
 
         Returns:
             Updated context and response
@@ -272,13 +277,14 @@ class OrderAgent:
             'response': "I need to know how many you'd like to order. Please provide a quantity."
         }
 
-    def _handle_address_collection(self, message: str, context: Dict) -> Dict:
+    def _handle_address_collection(self, message: str, context: Dict, db: Optional[Session] = None) -> Dict:
         """
         Handle address collection state.
 
         Args:
             message: The user message
             context: The current context of the conversation
+            db: The database session (optional)
 
         Returns:
             Updated context and response
@@ -299,13 +305,14 @@ class OrderAgent:
             'response': "I need a valid delivery address to proceed with your order. Please provide your full address including street, city, and zip code."
         }
 
-    def _handle_payment_method(self, message: str, context: Dict) -> Dict:
+    def _handle_payment_method(self, message: str, context: Dict, db: Optional[Session] = None) -> Dict:
         """
         Handle payment method selection state.
 
         Args:
             message: The user message
             context: The current context of the conversation
+            db: The database session (optional)
 
         Returns:
             Updated context and response
@@ -337,13 +344,14 @@ class OrderAgent:
             'response': "Please select a valid payment method. We accept credit card, debit card, PayPal, or cash on delivery."
         }
 
-    def _handle_confirmation(self, message: str, context: Dict) -> Dict:
+    def _handle_confirmation(self, message: str, context: Dict, db: Optional[Session] = None) -> Dict:
         """
         Handle order confirmation state.
 
         Args:
             message: The user message
             context: The current context of the conversation
+            db: The database session (optional)
 
         Returns:
             Updated context and response
@@ -359,20 +367,21 @@ class OrderAgent:
         for pattern in confirmation_patterns:
             if re.search(pattern, message, re.IGNORECASE):
                 # Create order in database if DB is available
-                if self.db:
+                if db:
                     new_order = Order(
                         user_id=context.get('user_id', 1),  # Default user ID if not provided
                         order_status='Pending',
-                        products={
+                        # Stored as a JSON string, like init_db.py does
+                        products=json.dumps({
                             'product_id': context.get('product', {}).get('product_id', 0),
                             'quantity': context.get('quantity', 0)
-                        },
+                        }),
                         total_price=context.get('total_price', 0),
                         payment_status='Unpaid',
                         shipping_address=context.get('address', '')
                     )
-                    self.db.add(new_order)
-                    self.db.commit()
+                    db.add(new_order)
+                    db.commit()
                     context['order_id'] = new_order.order_id
                 else:
                     # Mock order ID for testing without DB
@@ -397,13 +406,14 @@ class OrderAgent:
             'response': "I didn't understand your response. Please confirm with 'yes' or cancel with 'no'."
         }
 
-    def _handle_complete(self, message: str, context: Dict) -> Dict:
+    def _handle_complete(self, message: str, context: Dict, db: Optional[Session] = None) -> Dict:
         """
         Handle completed order state.
 
         Args:
             message: The user message
             context: The current context of the conversation
+            db: The database session (optional)
 
         Returns:
             Updated context and response
@@ -416,13 +426,14 @@ class OrderAgent:
             'response': "Your order has been processed successfully. Is there anything else I can help you with?"
         }
 
-    def process(self, message: str, context: Optional[Dict] = None) -> Dict:
+    def process(self, message: str, context: Optional[Dict] = None, db: Optional[Session] = None) -> Dict:
         """
         Process a user message in the context of an order.
 
         Args:
             message: The user message to process
             context: The current context of the conversation (optional)
+            db: The database session for this request (optional)
 
         Returns:
             Dict containing:
@@ -438,8 +449,73 @@ class OrderAgent:
 
         # Handle the message based on the current state
         if current_state in self.order_states:
-            return self.order_states[current_state](message, context)
+            return self.order_states[current_state](message, context, db)
 
         # Default to init state if unknown state
         context['state'] = 'init'
-        return self.order_states['init'](message, context)
\ No newline at end of file
+        return self.order_states['init'](message, context, db)
+
+    async def aprocess(self, message: str, context: Optional[Dict] = None,
+                       db: Optional[AsyncSession] = None) -> Dict:
+        """
+        Async variant of process() for the asyncio chat pipeline.
+
+        Args:
+            message: The user message to process
+            context: The current context of the conversation (optional)
+            db: The async database session for this request (optional)
+
+        Returns:
+            Same as process()
+        """
+        if db is None:
+            return self.process(message, context)
+
+        # Reuse the sync code path on the async connection
+        return await db.run_sync(lambda session: self.process(message, context, db=session))
+
+    def _session_context(self, session: Dict, user_id: Optional[int]) -> Dict:
+        """
+        Get the session's order to continue, or a fresh one for a new order.
+        """
+        context = session.get('order')
+        if not context or context.get('state') == 'complete':
+            context = {'state': 'init'}
+        context['user_id'] = user_id
+        return context
+
+    def _handle_result(self, session: Dict, order_result: Dict) -> Dict:
+        # Keep the order's progress in the session for the next message
+        session['order'] = order_result['context']
+        return {
+            'response': order_result['response'],
+            'additional_data': {
+                'order_state': order_result['context'].get('state', 'init')
+            }
+        }
+
+    def handle(self, message: str, session: Dict, user_id: Optional[int] = None,
+               db: Optional[Session] = None) -> Dict:
+        """
+        Dispatch entry point used by QueryHandler. Starts or continues the
+        order stored in `session['order']`.
+
+        Args:
+            message: The filtered user message
+            session: The session's conversation state, updated in place
+            user_id: The user placing the order
+            db: The database session for this request (optional)
+
+        Returns:
+            Dict with 'response' and 'additional_data' (order_state)
+        """
+        order_result = self.process(message, context=self._session_context(session, user_id), db=db)
+        return self._handle_result(session, order_result)
+
+    async def ahandle(self, message: str, session: Dict, user_id: Optional[int] = None,
+                      db: Optional[AsyncSession] = None) -> Dict:
+        """
+        Async variant of handle() for the asyncio chat pipeline.
+        """
+        order_result = await self.aprocess(message, context=self._session_context(session, user_id), db=db)
+        return self._handle_result(session, order_result)
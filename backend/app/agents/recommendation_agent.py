@@ -1,7 +1,14 @@
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple
+import asyncio
 import re
 from sqlalchemy.orm import Session
-from app.database.models import Product, UserInteraction, Recommendation
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func
+from app.database.db import SessionLocal
+from app.database.models import Product, Recommendation
+from app.utils.logger import get_logger
+
+logger = get_logger("recommendation_agent")
 
 class RecommendationAgent:
     """
@@ -9,8 +16,18 @@ class RecommendationAgent:
     based on user preferences and behavior.
     """
 
-    def __init__(self, db: Optional[Session] = None):
-        self.db = db
+    # Most products recommended at once
+    MAX_RECOMMENDATIONS = 5
+    # Similar products scored per recommendation, leaving room for the preference filters
+    SIMILAR_CANDIDATES = 50
+
+    def __init__(self, item_similarity=None, profiles=None, session_factory: Callable = SessionLocal):
+        # Creates the sync sessions aprocess() runs its lookups on
+        self.session_factory = session_factory
+        # Optional UserProfileStore with each user's recent categories, ratings and price band
+        self.profiles = profiles
+        # Optional ItemSimilarityStore used to score products similar to a user's rated ones
+        self.item_similarity = item_similarity
 
     def _extract_preferences(self, message: str) -> Dict[str, str]:
         """
@@ -77,61 +94,51 @@ class RecommendationAgent:
 
         return preferences
 
-    def _get_user_history(self, user_id: int) -> List[Dict]:
+    def _get_user_profile(self, user_id: Optional[int], db: Session):
         """
-        Get user's purchase and interaction history.
+        Get a user's profile from the profile store.
 
         Args:
-            user_id: The user ID
+            user_id: The user ID (optional)
+            db: The database session, used if the profile has to be loaded
 
         Returns:
-            List of user's previous interactions and purchases
+            The UserProfile, or None without a user, a profile store or on error
         """
-        if not self.db:
-            # Mock history for testing without DB
-            return [
-                {'product_id': 1, 'category': 'Electronics', 'interaction_type': 'view'},
-                {'product_id': 2, 'category': 'Clothing', 'interaction_type': 'purchase'}
-            ]
-
-        # Get user's interactions from database
-        interactions = self.db.query(UserInteraction).filter(UserInteraction.user_id == user_id).all()
-
-        # Get user's recommendations from database
-        recommendations = self.db.query(Recommendation).filter(Recommendation.user_id == user_id).all()
-
-        history = []
-
-        for interaction in interactions:
-            history.append({
-                'interaction_id': interaction.interaction_id,
-                'query': interaction.query_text,
-                'intent': interaction.intent,
-                'timestamp': interaction.timestamp
-            })
-
-        for recommendation in recommendations:
-            history.append({
-                'recommendation_id': recommendation.recommendation_id,
-                'product_id': recommendation.product_id,
-                'rating': recommendation.rating,
-                'timestamp': recommendation.timestamp
-            })
-
-        return history
-
-    def _get_recommendations(self, preferences: Dict[str, str], user_id: Optional[int] = None) -> List[Dict]:
+        if not user_id or self.profiles is None:
+            return None
+        try:
+            return self.profiles.get(user_id, db=db)
+        except Exception as e:
+            logger.error("Error loading the profile of user %s: %s", user_id, e)
+            return None
+
+    def _get_rated_products(self, user_id: int, db: Session) -> Dict[int, float]:
+        """
+        Read product ID -> total rating for a user's recommendations rows.
+        """
+        rated = {}
+        for product_id, rating in (db.query(Recommendation.product_id, Recommendation.rating)
+                                   .filter(Recommendation.user_id == user_id)):
+            rated[product_id] = rated.get(product_id, 0.0) + (1.0 if rating is None else max(rating, 0.0))
+        return rated
+
+    def _get_recommendations(self, preferences: Dict[str, str], user_id: Optional[int] = None,
+                             db: Optional[Session] = None) -> List[Dict]:
         """
-        Get product recommendations based on user preferences and history.
+        Get product recommendations based on user preferences and profile.
 
         Args:
             preferences: Dictionary of user preferences
             user_id: The user ID (optional)
+            db: The database session (optional)
 
         Returns:
-            List of recommended products
+            List of recommended products; a product has a 'match_score' only
+            when there was something to score it by (similar rated products
+            or the user's profile)
         """
-        if not self.db:
+        if not db:
             # Mock recommendations for testing without DB
             return [
                 {
@@ -152,11 +159,20 @@ class RecommendationAgent:
                 }
             ]
 
-        # Build query based on preferences
-        query = self.db.query(Product)
+        profile = self._get_user_profile(user_id, db)
 
-        if 'category' in preferences:
-            query = query.filter(Product.category.ilike(f"%{preferences['category']}%"))
+        if user_id and self.item_similarity is not None:
+            rated = profile.rated_products() if profile is not None else self._get_rated_products(user_id, db)
+            recommendations = self._get_similar_products(preferences, rated, db)
+            if recommendations:
+                return recommendations
+
+        # Build query based on preferences, filling gaps from the user's profile
+        query = db.query(Product)
+
+        category = preferences.get('category') or (profile.top_category() if profile is not None else None)
+        if category:
+            query = query.filter(Product.category.ilike(f"%{category}%"))
 
         if 'min_price' in preferences:
             query = query.filter(Product.price >= preferences['min_price'])
@@ -164,14 +180,98 @@ class RecommendationAgent:
         if 'max_price' in preferences:
             query = query.filter(Product.price <= preferences['max_price'])
 
+        band = profile.price_band() if profile is not None else None
+        if band and 'min_price' not in preferences and 'max_price' not in preferences:
+            # Products closest to the prices the user usually pays come first
+            query = query.order_by(func.abs(Product.price - (band[0] + band[1]) / 2))
+
         # Get products matching the preferences
-        products = query.limit(5).all()
+        products = query.limit(self.MAX_RECOMMENDATIONS).all()
 
-        # Convert to list of dictionaries with match scores
-        # In a real system, you would calculate actual match scores based on preferences and history
+        # Score each product against the user's profile; without one there is
+        # nothing to score by, so the products are returned unscored
+        affinities = profile.category_affinities() if profile is not None else {}
         recommendations = []
-        for i, product in enumerate(products):
-            match_score = 1.0 - (i * 0.1)  # Simple decreasing score for demonstration
+        for product in products:
+            recommendation = {
+                'product_id': product.product_id,
+                'name': product.name,
+                'category': product.category,
+                'price': product.price,
+                'description': product.description
+            }
+            match_score = self._profile_score(product, affinities, band)
+            if match_score is not None:
+                recommendation['match_score'] = match_score
+            recommendations.append(recommendation)
+
+        # Stable sort: unscored products and ties keep the query's order
+        recommendations.sort(key=lambda recommendation: -recommendation.get('match_score', 0.0))
+        return recommendations
+
+    def _profile_score(self, product: Product, affinities: Dict[str, float],
+                       band: Optional[Tuple[float, float]]) -> Optional[float]:
+        """
+        Score how well a product fits a user's profile.
+
+        The score averages the user's affinity for the product's category
+        and how close its price is to the user's price band (1 inside the
+        band, falling to 0 at a distance of the band's midpoint).
+
+        Args:
+            product: The product to score
+            affinities: Category -> affinity, from UserProfile.category_affinities()
+            band: The user's price band, from UserProfile.price_band()
+
+        Returns:
+            A score between 0 and 1, or None if the profile has neither
+        """
+        parts = []
+        if affinities:
+            parts.append(affinities.get(product.category, 0.0))
+        if band and product.price is not None:
+            low, high = band
+            distance = max(low - product.price, product.price - high, 0.0)
+            parts.append(max(0.0, 1.0 - distance / max((low + high) / 2, 1.0)))
+        if not parts:
+            return None
+        return round(sum(parts) / len(parts), 4)
+
+    def _get_similar_products(self, preferences: Dict[str, str], rated: Dict[int, float], db: Session) -> List[Dict]:
+        """
+        Recommend the products most similar to the ones a user has rated.
+
+        Scores come from the precomputed item-item similarities, so the
+        request only reads the candidate products.
+
+        Args:
+            preferences: Dictionary of user preferences, applied as filters
+            rated: Product ID -> the user's rating
+            db: The database session
+
+        Returns:
+            List of recommended products with their 'match_score', best first;
+            empty if the user has no rated products with known similarities
+        """
+        scored = self.item_similarity.similar_to(rated, self.SIMILAR_CANDIDATES)
+        if not scored:
+            return []
+
+        products = {product.product_id: product for product in
+                    db.query(Product).filter(Product.product_id.in_([product_id for product_id, _ in scored]))}
+        category = preferences.get('category', '').lower()
+
+        recommendations = []
+        for product_id, match_score in scored:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            if category and category not in (product.category or '').lower():
+                continue
+            if 'min_price' in preferences and product.price < preferences['min_price']:
+                continue
+            if 'max_price' in preferences and product.price > preferences['max_price']:
+                continue
             recommendations.append({
                 'product_id': product.product_id,
                 'name': product.name,
@@ -180,6 +280,8 @@ class RecommendationAgent:
                 'description': product.description,
                 'match_score': match_score
             })
+            if len(recommendations) >= self.MAX_RECOMMENDATIONS:
+                break
 
         return recommendations
 
@@ -209,13 +311,14 @@ class RecommendationAgent:
 
         return result
 
-    def process(self, message: str, user_id: Optional[int] = None) -> Dict:
+    def process(self, message: str, user_id: Optional[int] = None, db: Optional[Session] = None) -> Dict:
         """
         Process a user message and provide personalized recommendations.
 
         Args:
             message: The user message to process
             user_id: The user ID (optional)
+            db: The database session for this request (optional)
 
         Returns:
             Dict containing:
@@ -225,16 +328,81 @@ class RecommendationAgent:
         # Extract user preferences from the message
         preferences = self._extract_preferences(message)
 
-        # Get user history if user_id is provided
-        history = self._get_user_history(user_id) if user_id else []
+        # The profile, similarity and product lookups each need the one
+        # before, so they run in order
+        try:
+            recommendations = self._get_recommendations(preferences, user_id, db)
+        except Exception as e:
+            logger.error("Error getting recommendations: %s", e)
+            if db is not None:
+                db.rollback()
+            recommendations = []
 
-        # Get recommendations based on preferences and history
-        recommendations = self._get_recommendations(preferences, user_id)
+        return self._respond(recommendations)
 
+    def _respond(self, recommendations: List[Dict]) -> Dict:
         # Format recommendations for display
         response = self._format_recommendations(recommendations)
 
         return {
             'response': response,
             'recommendations': recommendations
-        }
\ No newline at end of file
+        }
+
+    async def aprocess(self, message: str, user_id: Optional[int] = None,
+                       db: Optional[AsyncSession] = None) -> Dict:
+        """
+        Async variant of process() for the asyncio chat pipeline.
+
+        Args:
+            message: The user message to process
+            user_id: The user ID (optional)
+            db: The async database session for this request (optional); when
+                given, the lookups use a sync session of their own instead
+
+        Returns:
+            Same as process()
+        """
+        # The lookups run on a worker thread with their own sync session, so
+        # the profile loads and similarity scoring stay off the event loop
+        if db is None:
+            return await asyncio.to_thread(self.process, message, user_id)
+        return await asyncio.to_thread(self._process_on_new_session, message, user_id)
+
+    def _process_on_new_session(self, message: str, user_id: Optional[int]) -> Dict:
+        db = self.session_factory()
+        try:
+            return self.process(message, user_id, db=db)
+        finally:
+            db.close()
+
+    def _handle_result(self, recommendation_result: Dict) -> Dict:
+        return {
+            'response': recommendation_result['response'],
+            'additional_data': {
+                'recommendations': recommendation_result['recommendations']
+            }
+        }
+
+    def handle(self, message: str, session: Optional[Dict] = None, user_id: Optional[int] = None,
+               db: Optional[Session] = None) -> Dict:
+        """
+        Dispatch entry point used by QueryHandler.
+
+        Args:
+            message: The filtered user message
+            session: The session's conversation state (unused)
+            user_id: The user to recommend for
+            db: The database session for this request (optional)
+
+        Returns:
+            Dict with 'response' and 'additional_data' (recommendations)
+        """
+        return self._handle_result(self.process(message, user_id=user_id, db=db))
+
+    async def ahandle(self, message: str, session: Optional[Dict] = None, user_id: Optional[int] = None,
+                      db: Optional[AsyncSession] = None) -> Dict:
+        """
+        Async variant of handle() for the asyncio chat pipeline.
+        """
+        return self._handle_result(await self.aprocess(message, user_id=user_id, db=db))
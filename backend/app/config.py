@@ -0,0 +1,123 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables
+
+def _env_bool(name: str, default: bool) -> bool:
+    """
+    Read a boolean flag from the environment.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Write-behind writer for UserInteraction / ChatLog rows
+LOG_WRITER_ENABLED = _env_bool("LOG_WRITER_ENABLED", True)
+LOG_WRITER_QUEUE_SIZE = int(os.getenv("LOG_WRITER_QUEUE_SIZE", "10000"))
+LOG_WRITER_BATCH_SIZE = int(os.getenv("LOG_WRITER_BATCH_SIZE", "200"))
+LOG_WRITER_FLUSH_INTERVAL_MS = int(os.getenv("LOG_WRITER_FLUSH_INTERVAL_MS", "250"))
+# What to do when the queue is full: drop_newest, drop_oldest or block
+LOG_WRITER_OVERFLOW_POLICY = os.getenv("LOG_WRITER_OVERFLOW_POLICY", "drop_oldest")
+LOG_WRITER_BLOCK_TIMEOUT_MS = int(os.getenv("LOG_WRITER_BLOCK_TIMEOUT_MS", "100"))
+
+# Per-session conversation state
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")  # memory or sqlite
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "./sessions.db")
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Largest number of messages accepted by /api/chat/batch
+CHAT_BATCH_MAX_SIZE = int(os.getenv("CHAT_BATCH_MAX_SIZE", "1000"))
+# Batches processed at once per process, and batches allowed to wait for a slot
+CHAT_BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "2"))
+CHAT_BATCH_MAX_QUEUE = int(os.getenv("CHAT_BATCH_MAX_QUEUE", "4"))
+
+# Opt-in cache for deterministic (guard / details) pipeline results
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", False)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+# Add a Server-Timing header with per-stage durations to chat responses
+METRICS_SERVER_TIMING = _env_bool("METRICS_SERVER_TIMING", False)
+
+# Application logging (records are formatted and written by a background thread)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Admission control for the chat endpoints (0 disables the concurrency limit)
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "64"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "128"))
+CHAT_QUEUE_TIMEOUT_MS = int(os.getenv("CHAT_QUEUE_TIMEOUT_MS", "2000"))
+CHAT_RETRY_AFTER_SECONDS = float(os.getenv("CHAT_RETRY_AFTER_SECONDS", "1"))
+# Per-user token bucket (0 disables rate limiting)
+CHAT_RATE_LIMIT_PER_SECOND = float(os.getenv("CHAT_RATE_LIMIT_PER_SECOND", "0"))
+CHAT_RATE_LIMIT_BURST = int(os.getenv("CHAT_RATE_LIMIT_BURST", "20"))
+CHAT_RATE_LIMIT_MAX_KEYS = int(os.getenv("CHAT_RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Shared thread pool for concurrent retrieval steps (0 runs them one after the other)
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "8"))
+PIPELINE_BRANCH_TIMEOUT_MS = int(os.getenv("PIPELINE_BRANCH_TIMEOUT_MS", "1000"))
+
+# Guard Agent lexicons: one <category>.txt file per category, reloaded when changed
+GUARD_LEXICON_DIR = os.getenv("GUARD_LEXICON_DIR", os.path.join(os.path.dirname(__file__), "lexicons", "guard"))
+GUARD_LEXICON_RELOAD_SECONDS = float(os.getenv("GUARD_LEXICON_RELOAD_SECONDS", "5"))
+
+# Intent classifier: rules (count matching patterns), scored (weighted single scan)
+# or embedding (nearest intent centroid, see CLASSIFIER_CENTROIDS_PATH)
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "rules")
+
+# Embeddings of recent texts kept in memory (shared by classification and retrieval)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+# Embedding intent classifier (CLASSIFIER_MODE=embedding): per-intent centroids
+# trained from labeled UserInteraction rows and saved to CLASSIFIER_CENTROIDS_PATH
+CLASSIFIER_CENTROIDS_PATH = os.getenv("CLASSIFIER_CENTROIDS_PATH", "./intent_centroids.npz")
+CLASSIFIER_TRAINING_LIMIT = int(os.getenv("CLASSIFIER_TRAINING_LIMIT", "1000"))
+CLASSIFIER_MIN_SIMILARITY = float(os.getenv("CLASSIFIER_MIN_SIMILARITY", "0.3"))
+CLASSIFIER_TEMPERATURE = float(os.getenv("CLASSIFIER_TEMPERATURE", "0.05"))
+
+# In-memory BM25 product index used by the Details Agent
+PRODUCT_INDEX_REFRESH_SECONDS = float(os.getenv("PRODUCT_INDEX_REFRESH_SECONDS", "30"))
+PRODUCT_INDEX_MAX_POSTINGS = int(os.getenv("PRODUCT_INDEX_MAX_POSTINGS", "1000"))
+PRODUCT_SEARCH_LIMIT = int(os.getenv("PRODUCT_SEARCH_LIMIT", "5"))
+# Rendered product cards kept by the Details Agent before the least recently used are evicted
+PRODUCT_CARD_CACHE_SIZE = int(os.getenv("PRODUCT_CARD_CACHE_SIZE", "1024"))
+
+# FAQ search: auto (pg_trgm on PostgreSQL, FTS5 on SQLite), postgres, sqlite or
+# memory (in-process trigram index, also the fallback for the others)
+FAQ_SEARCH_BACKEND = os.getenv("FAQ_SEARCH_BACKEND", "auto")
+FAQ_SEARCH_LIMIT = int(os.getenv("FAQ_SEARCH_LIMIT", "3"))
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.5"))
+FAQ_INDEX_REFRESH_SECONDS = float(os.getenv("FAQ_INDEX_REFRESH_SECONDS", "30"))
+
+# Details Agent hybrid retrieval: BM25 products and FAQ lookups fused with
+# one FAISS query over products and FAQs by reciprocal-rank fusion
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+RETRIEVAL_SEMANTIC_TIMEOUT_MS = int(os.getenv("RETRIEVAL_SEMANTIC_TIMEOUT_MS", "300"))
+RETRIEVAL_LEXICAL_TIMEOUT_MS = int(os.getenv("RETRIEVAL_LEXICAL_TIMEOUT_MS", str(PIPELINE_BRANCH_TIMEOUT_MS)))
+
+# Item-item similarities built offline by build_item_similarity.py from the
+# recommendations table and memory-mapped by the Recommendation Agent
+ITEM_SIMILARITY_PATH = os.getenv("ITEM_SIMILARITY_PATH", "./item_similarity")
+ITEM_SIMILARITY_NEIGHBORS = int(os.getenv("ITEM_SIMILARITY_NEIGHBORS", "50"))
+ITEM_SIMILARITY_RELOAD_SECONDS = float(os.getenv("ITEM_SIMILARITY_RELOAD_SECONDS", "60"))
+
+# Per-user profiles (category affinities, rated products, price band) used by
+# the Recommendation Agent, built from the last PROFILE_WINDOW_DAYS of activity
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+# Profiles follow this process's writes; the TTL only bounds how long writes
+# made by other processes go unseen
+PROFILE_TTL_SECONDS = float(os.getenv("PROFILE_TTL_SECONDS", "3600"))
+PROFILE_WINDOW_DAYS = float(os.getenv("PROFILE_WINDOW_DAYS", "90"))
+PROFILE_MAX_EVENTS = int(os.getenv("PROFILE_MAX_EVENTS", "500"))
+PROFILE_RECENT_PRODUCTS = int(os.getenv("PROFILE_RECENT_PRODUCTS", "10"))
+
+# /api/recommend: per-user result cache and the most users one bulk request may ask for
+RECOMMEND_CACHE_SIZE = int(os.getenv("RECOMMEND_CACHE_SIZE", "10000"))
+RECOMMEND_CACHE_TTL_SECONDS = float(os.getenv("RECOMMEND_CACHE_TTL_SECONDS", "300"))
+RECOMMEND_BATCH_MAX_USERS = int(os.getenv("RECOMMEND_BATCH_MAX_USERS", "500"))
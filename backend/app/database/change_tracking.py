@@ -0,0 +1,70 @@
+import threading
+from typing import Any, Callable, Dict, List
+from sqlalchemy import event
+from app.database.models import Product, FAQ, Recommendation, UserInteraction
+from app.utils.logger import get_logger
+
+logger = get_logger("change_tracking")
+
+# Tables whose rows feed chatbot answers or cached per-user state
+TRACKED_MODELS = (Product, FAQ, Recommendation, UserInteraction)
+
+_versions: Dict[str, int] = {model.__tablename__: 0 for model in TRACKED_MODELS}
+_listeners: List[Callable[[str, str, Any], None]] = []
+_lock = threading.Lock()
+
+def table_version(table_name: str) -> int:
+    """
+    Get the change counter for a tracked table.
+
+    Args:
+        table_name: The table name (e.g. 'products')
+
+    Returns:
+        A number that increases whenever a row of the table changes
+    """
+    return _versions[table_name]
+
+def catalog_version() -> int:
+    """
+    Get a single version number covering the products and FAQ tables.
+
+    Returns:
+        A number that increases whenever a Product or FAQ row changes
+    """
+    return _versions[Product.__tablename__] + _versions[FAQ.__tablename__]
+
+def subscribe(callback: Callable[[str, str, Any], None]):
+    """
+    Register a callback for row changes on the tracked tables.
+
+    Args:
+        callback: Called as callback(table_name, operation, instance) where
+            operation is 'insert', 'update' or 'delete'
+    """
+    with _lock:
+        _listeners.append(callback)
+
+def _notify(table_name: str, operation: str, instance: Any):
+    with _lock:
+        _versions[table_name] += 1
+        listeners = list(_listeners)
+
+    for callback in listeners:
+        try:
+            callback(table_name, operation, instance)
+        except Exception as e:
+            logger.exception("Error in change listener for %s", table_name)
+
+def _track(model, operation: str):
+    def listener(mapper, connection, target):
+        _notify(model.__tablename__, operation, target)
+    return listener
+
+# Only changes made through the ORM in this process are seen here; caches
+# that depend on these versions also expire entries by TTL to cover writes
+# from other processes or raw SQL.
+for _model in TRACKED_MODELS:
+    event.listen(_model, 'after_insert', _track(_model, 'insert'))
+    event.listen(_model, 'after_update', _track(_model, 'update'))
+    event.listen(_model, 'after_delete', _track(_model, 'delete'))
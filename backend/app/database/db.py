@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables
@@ -23,3 +24,61 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def _to_async_url(url: str) -> str:
+    """
+    Map a sync database URL onto the matching asyncio driver.
+
+    Args:
+        url: The sync SQLAlchemy database URL
+
+    Returns:
+        The database URL using an asyncio driver
+    """
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+asyncpg:", 1)
+    return url
+
+# The async engine is created lazily so scripts like init_db.py only need the
+# sync driver installed (aiosqlite / asyncpg are only needed by the API)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL))
+
+_async_engine = None
+_AsyncSessionLocal = None
+_async_lock = threading.Lock()
+
+def get_async_engine():
+    """
+    Get the shared async engine, creating it on first use.
+
+    Returns:
+        The AsyncEngine bound to ASYNC_DATABASE_URL
+    """
+    global _async_engine, _AsyncSessionLocal
+
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+                _async_engine = create_async_engine(ASYNC_DATABASE_URL)
+                _AsyncSessionLocal = async_sessionmaker(
+                    bind=_async_engine, autoflush=False, expire_on_commit=False
+                )
+
+    return _async_engine
+
+def AsyncSessionLocal():
+    """
+    Create a new AsyncSession bound to the shared async engine.
+    """
+    get_async_engine()
+    return _AsyncSessionLocal()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
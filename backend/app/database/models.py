@@ -63,7 +63,8 @@ class Recommendation(Base):
     __tablename__ = "recommendations"
 
     recommendation_id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Existing databases get the index from RecommendationCache.ensure_index()
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False)
     rating = Column(Float, nullable=True)  # User rating (if applicable)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
@@ -13,7 +13,8 @@ class FAISSIndex:
 
     def search(self, query_embedding, k=3):
         distances, indices = self.index.search(np.array(query_embedding).astype('float32'), k)
-        results = [self.metadata[i] for i in indices[0] if i < len(self.metadata)]
+        # FAISS pads with -1 when the index holds fewer than k vectors
+        results = [self.metadata[i] for i in indices[0] if 0 <= i < len(self.metadata)]
         return results
 
     def save_index(self, filename="app/faiss/vector_store.pkl"):
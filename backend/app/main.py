@@ -2,12 +2,33 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from app.routes import chat, order, recommend, faq
+from app import config
+from app.routes import chat, order, recommend, faq, metrics
+from app.database.db import get_async_engine
+from app.services.product_index import get_product_index
+from app.services.query_handler import get_query_handler
+from app.utils.metrics import server_timing, format_server_timing
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the agent registry once at startup so requests never pay for it
+    query_handler = get_query_handler()
+    if query_handler.log_writer is not None:
+        query_handler.log_writer.start()
+    get_product_index().build_in_background()
+    yield
+    # Flush queued audit rows before the process exits
+    if query_handler.log_writer is not None:
+        await asyncio.to_thread(query_handler.log_writer.stop)
+    # Close pooled async DB connections on shutdown
+    await get_async_engine().dispose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -18,11 +39,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if config.METRICS_SERVER_TIMING:
+    @app.middleware("http")
+    async def add_server_timing(request: Request, call_next):
+        # The pipeline appends its stage durations to this per-request list
+        timings = []
+        token = server_timing.set(timings)
+        try:
+            response = await call_next(request)
+        finally:
+            server_timing.reset(token)
+        if timings:
+            response.headers["Server-Timing"] = format_server_timing(timings)
+        return response
+
 # Include different routes under /api prefix
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(order.router, prefix="/api/order", tags=["Order"])
 app.include_router(recommend.router, prefix="/api/recommend", tags=["Recommendation"])
 app.include_router(faq.router, prefix="/api/faq", tags=["FAQ"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["Metrics"])
 
 # API root endpoint
 @app.get("/api")
@@ -1,22 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
-from typing import Optional, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Optional, Dict, Any, List
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field, ValidationError
+import json
+import time
+from collections import Counter
 
-from app.database.db import get_db
-from app.services.query_handler import QueryHandler
-from app.faiss.faiss_index import FAISSIndex
+from app import config
+from app.database.db import get_db, get_async_db, AsyncSessionLocal
+from app.services.admission import (AdmissionController, AdmissionRejected, get_admission_controller,
+                                    get_batch_admission_controller)
+from app.services.query_handler import QueryHandler, get_query_handler
+from app.utils.logger import get_logger
+
+logger = get_logger("chat_router")
 
 router = APIRouter()
 
-# Initialize FAISS index
-faiss_index = None
-try:
-    faiss_index = FAISSIndex()
-    faiss_index.load_index()
-except Exception as e:
-    print(f"Warning: Could not load FAISS index: {e}")
-    # Will be initialized when needed
+async def query_handler_dependency() -> QueryHandler:
+    # Async so FastAPI resolves it on the event loop, not in the threadpool
+    return get_query_handler()
+
+async def admission_dependency() -> AdmissionController:
+    return get_admission_controller()
+
+async def batch_admission_dependency() -> AdmissionController:
+    return get_batch_admission_controller()
 
 # Pydantic models for request/response validation
 class ChatRequest(BaseModel):
@@ -32,32 +44,211 @@ class ChatResponse(BaseModel):
     agent: str
     additional_data: Dict[str, Any] = {}
 
+class BatchChatRequest(BaseModel):
+    messages: List[ChatRequest] = Field(..., max_length=config.CHAT_BATCH_MAX_SIZE)
+
+class BatchChatItem(BaseModel):
+    index: int
+    status: str
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem]
+    metadata: Dict[str, Any] = {}
+
+async def _admit(admission: AdmissionController, request: ChatRequest):
+    """
+    Take a pipeline slot for this request or fail fast with 429/503.
+    """
+    try:
+        await admission.acquire(AdmissionController.rate_key(request.user_id, request.session_id))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=f"Chat request rejected: {e.reason}", headers=e.headers)
+
 @router.post("/", response_model=ChatResponse)
-def chat(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat(request: ChatRequest, db: AsyncSession = Depends(get_async_db),
+               query_handler: QueryHandler = Depends(query_handler_dependency),
+               admission: AdmissionController = Depends(admission_dependency)):
     """
     Process a chat message through the agent pipeline.
+
+    Returns 429 when the user is over their rate limit and 503 when the
+    pipeline is saturated, both with a Retry-After header.
     """
-    print(f"\n[ChatRouter] Received chat request: {request}")
+    logger.debug("Received chat request", extra={'session_id': request.session_id, 'user_id': request.user_id})
+    await _admit(admission, request)
     try:
-        # Initialize query handler with database session
-        print(f"[ChatRouter] Initializing QueryHandler with db: {db}")
-        query_handler = QueryHandler(db=db, faiss_index=faiss_index)
-
-        # Process the query
-        print(f"[ChatRouter] Processing query: '{request.message}'")
-        result = query_handler.process_query(
+        # Process the query with the shared handler and this request's session
+        result = await query_handler.aprocess_query(
             message=request.message,
             user_id=request.user_id,
-            session_id=request.session_id
+            session_id=request.session_id,
+            db=db
         )
 
-        print(f"[ChatRouter] Query processed successfully, returning result")
         return result
     except Exception as e:
-        print(f"[ChatRouter] Error processing chat: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error processing chat", extra={'session_id': request.session_id})
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
+    finally:
+        admission.release()
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch(batch: BatchChatRequest, db: Session = Depends(get_db),
+                     query_handler: QueryHandler = Depends(query_handler_dependency),
+                     admission: AdmissionController = Depends(batch_admission_dependency)):
+    """
+    Process many chat messages (e.g. offline replays or ticket triage) in one
+    request. Each pipeline stage runs over the whole batch and all log rows
+    are written in one transaction.
+
+    Batches have their own admission slots (CHAT_BATCH_MAX_CONCURRENCY) and
+    take one rate limit token per message from each user's bucket, so they
+    get the same 429/503 responses as /api/chat/. The work is CPU-bound, so
+    it runs in the threadpool instead of blocking the event loop.
+    """
+    logger.info("Received chat batch", extra={'count': len(batch.messages)})
+
+    rate_costs = Counter(AdmissionController.rate_key(request.user_id, request.session_id)
+                         for request in batch.messages)
+    rate_costs.pop(None, None)
+    try:
+        await admission.acquire(rate_costs=rate_costs)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=f"Chat batch rejected: {e.reason}", headers=e.headers)
+
+    started = time.perf_counter()
+    try:
+        items = await run_in_threadpool(
+            query_handler.process_batch, [request.model_dump() for request in batch.messages], db=db
+        )
+    except Exception as e:
+        logger.exception("Error processing chat batch")
+        raise HTTPException(status_code=500, detail=f"Error processing chat batch: {str(e)}")
+    finally:
+        admission.release()
+
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for item in items if item['status'] == 'error')
+
+    return {
+        'results': [{'index': i, **item} for i, item in enumerate(items)],
+        'metadata': {
+            'count': len(items),
+            'succeeded': len(items) - failed,
+            'failed': failed,
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'messages_per_second': round(len(items) / elapsed, 1) if elapsed > 0 else None
+        }
+    }
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that gives back its admission slot when the response
+    ends, however it ends.
+
+    Releasing from the body generator is not enough: if the client
+    disconnects before Starlette starts iterating it, the generator's
+    cleanup never runs and the slot would be lost for good.
+    """
+
+    def __init__(self, content: Any, admission: AdmissionController, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.admission.release()
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    Encode a pipeline event as a Server-Sent Events frame.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, query_handler: QueryHandler = Depends(query_handler_dependency),
+                      admission: AdmissionController = Depends(admission_dependency)):
+    """
+    Process a chat message and stream the result as Server-Sent Events.
+
+    A 'decision' event (status, intent, agent) is sent as soon as the message
+    is classified, followed by one 'chunk' event per piece of the response
+    and a final 'done' event carrying the full ChatResponse. Admission is
+    decided before the stream starts, so rejections are plain 429/503s.
+    """
+    logger.debug("Received streaming chat request", extra={'session_id': request.session_id, 'user_id': request.user_id})
+
+    await _admit(admission, request)
+
+    async def event_stream():
+        # The DB session has to outlive this route function
+        async with AsyncSessionLocal() as db:
+            async for event, data in query_handler.astream_query(
+                message=request.message,
+                user_id=request.user_id,
+                session_id=request.session_id,
+                db=db
+            ):
+                yield _sse_event(event, data)
+
+    return AdmittedStreamingResponse(
+        event_stream(),
+        admission=admission,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket, session_id: Optional[str] = None, user_id: Optional[int] = None):
+    """
+    Persistent chat connection for one session.
+
+    Each text frame is a JSON ChatRequest; `session_id` and `user_id` default
+    to the query parameters given when connecting. Every message is answered
+    with {"event": ..., "data": ...} frames in the same order as the
+    /stream endpoint: 'decision', one or more 'chunk', then 'done'.
+    """
+    await websocket.accept()
+    query_handler = get_query_handler()
+    admission = get_admission_controller()
+    logger.info("WebSocket connected", extra={'session_id': session_id})
+
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                chat_request = ChatRequest(**{'session_id': session_id, 'user_id': user_id, **json.loads(raw)})
+            except (ValueError, TypeError, ValidationError) as e:
+                await websocket.send_json({'event': 'error', 'data': {'detail': f"Invalid chat message: {e}"}})
+                continue
+
+            try:
+                await admission.acquire(AdmissionController.rate_key(chat_request.user_id, chat_request.session_id))
+            except AdmissionRejected as e:
+                await websocket.send_json({'event': 'error', 'data': {
+                    'detail': f"Chat request rejected: {e.reason}",
+                    'status_code': e.status_code,
+                    'retry_after': e.retry_after
+                }})
+                continue
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    async for event, data in query_handler.astream_query(
+                        message=chat_request.message,
+                        user_id=chat_request.user_id,
+                        session_id=chat_request.session_id,
+                        db=db
+                    ):
+                        await websocket.send_text(json.dumps({'event': event, 'data': data}, default=str))
+            finally:
+                admission.release()
+    except WebSocketDisconnect:
+        logger.info("WebSocket disconnected", extra={'session_id': session_id})
 
 @router.get("/test")
 def test():
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
+from app import config
 from app.database.db import get_db
-from app.database.models import FAQ
+from app.services.faq_search import get_faq_search
 
 router = APIRouter()
 
 @router.get("/{question}")
-def get_faq_answer(question: str, db: Session = Depends(get_db)):
-    faq_entry = db.query(FAQ).filter(FAQ.question.ilike(f"%{question}%")).first()
-    return {"answer": faq_entry.answer if faq_entry else "No answer found"}
+def get_faq_answer(question: str, limit: int = Query(config.FAQ_SEARCH_LIMIT, ge=1, le=50),
+                   db: Session = Depends(get_db)):
+    # Ranked by similarity; "answer" is the best match, "results" the top `limit`
+    results = get_faq_search().search(question, limit=limit, db=db)
+    return {"answer": results[0]['answer'] if results else "No answer found", "results": results}
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.utils.metrics import REGISTRY
+
+router = APIRouter()
+
+@router.get("/", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Expose pipeline latency histograms and component counters in
+    Prometheus text format.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
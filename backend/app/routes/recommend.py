@@ -1,30 +1,66 @@
-from fastapi import APIRouter, Depends
+from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from app import config
 from app.database.db import get_db
 from app.database.models import Recommendation, Product
+from app.services.recommendation_cache import get_recommendation_cache
 
 router = APIRouter()
 
-@router.get("/{user_id}")
-def recommend_products(user_id: int, db: Session = Depends(get_db)):
-    # Fetch recommendations for the user from the database
-    recommendations = (
-        db.query(Recommendation.product_id)
-        .filter(Recommendation.user_id == user_id)
-        .all()
+def _get_recommendations(db: Session, user_ids: List[int]) -> Dict[int, List[str]]:
+    cache = get_recommendation_cache()
+    results, missing, generation = cache.get_many(user_ids)
+    if not missing:
+        return results
+
+    cache.ensure_index()
+    # One join over the user_id index for every user not in the cache; each
+    # product is listed once per user, in catalog order
+    fetched: Dict[int, List[str]] = {user_id: [] for user_id in missing}
+    rows = db.execute(
+        select(Recommendation.user_id, Product.product_id, Product.name)
+        .join(Product, Product.product_id == Recommendation.product_id)
+        .where(Recommendation.user_id.in_(missing))
+        .order_by(Recommendation.user_id, Product.product_id)
+        .distinct()
     )
+    for user_id, _, name in rows:
+        fetched[user_id].append(name)
 
-    # Extract product IDs from query result
-    product_ids = [rec.product_id for rec in recommendations]
+    cache.put_many(fetched, generation)
+    results.update(fetched)
+    return results
 
-    # Fetch product details for recommended products
-    recommended_products = (
-        db.query(Product.name)
-        .filter(Product.product_id.in_(product_ids))
-        .all()
-    )
+def _parse_user_ids(values: List[str]) -> List[int]:
+    # Accepts repeated parameters and comma-separated lists alike
+    user_ids = []
+    for value in values:
+        for part in value.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                user_ids.append(int(part))
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"Invalid user ID: {part!r}")
+    return list(dict.fromkeys(user_ids))
 
-    # Convert result to a list of product names
-    recommended_product_names = [product.name for product in recommended_products]
+@router.get("")
+@router.get("/", include_in_schema=False)
+def recommend_products_bulk(user_ids: List[str] = Query(..., description="User IDs, comma-separated or repeated"),
+                            db: Session = Depends(get_db)):
+    ids = _parse_user_ids(user_ids)
+    if not ids:
+        raise HTTPException(status_code=422, detail="No user IDs given")
+    if len(ids) > config.RECOMMEND_BATCH_MAX_USERS:
+        raise HTTPException(status_code=422,
+                            detail=f"At most {config.RECOMMEND_BATCH_MAX_USERS} user IDs per request")
 
-    return {"recommendations": recommended_product_names}
+    results = _get_recommendations(db, ids)
+    return {"recommendations": {str(user_id): results[user_id] for user_id in ids}}
+
+@router.get("/{user_id}")
+def recommend_products(user_id: int, db: Session = Depends(get_db)):
+    return {"recommendations": _get_recommendations(db, [user_id])[user_id]}
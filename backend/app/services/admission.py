@@ -0,0 +1,268 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app import config
+from app.utils.metrics import REGISTRY
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a chat request is turned away instead of being queued.
+
+    Attributes:
+        status_code: 429 for rate limited callers, 503 when the pipeline is saturated
+        retry_after: Seconds the client should wait before retrying
+        reason: Short machine-readable reason
+    """
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+class TokenBucketLimiter:
+    """
+    Per-key token bucket: each key may make `burst` requests at once and
+    then `rate_per_second` requests per second.
+
+    Buckets are kept in an LRU bounded by `max_keys`; an evicted key simply
+    starts again with a full bucket.
+    """
+
+    def __init__(self, rate_per_second: float = config.CHAT_RATE_LIMIT_PER_SECOND,
+                 burst: int = config.CHAT_RATE_LIMIT_BURST,
+                 max_keys: int = config.CHAT_RATE_LIMIT_MAX_KEYS):
+        self.rate_per_second = rate_per_second
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        # key -> (tokens, last refill time), least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> Optional[float]:
+        """
+        Take one token for `key`.
+
+        Args:
+            key: The caller's rate limit key (e.g. 'user:42')
+
+        Returns:
+            None if the request is allowed, otherwise the seconds until the
+            next token is available
+        """
+        return self.check_many({key: 1})
+
+    def check_many(self, costs: Dict[str, int]) -> Optional[float]:
+        """
+        Take tokens for several keys at once, all or nothing.
+
+        A cost above `burst` is allowed once the bucket is full and leaves it
+        in debt, so a large batch is admitted but the caller then waits until
+        it has been paid back.
+
+        Args:
+            costs: Rate limit key -> tokens to take (e.g. messages in a batch)
+
+        Returns:
+            None if every key had enough tokens (and they were taken),
+            otherwise the longest wait in seconds (and nothing was taken)
+        """
+        now = time.monotonic()
+        wait = None
+
+        with self._lock:
+            refilled = {}
+            for key, cost in costs.items():
+                tokens, last = self._buckets.get(key, (float(self.burst), now))
+                tokens = min(float(self.burst), tokens + (now - last) * self.rate_per_second)
+                refilled[key] = tokens
+                needed = min(float(cost), float(self.burst))
+                if tokens < needed:
+                    wait = max(wait or 0.0, (needed - tokens) / self.rate_per_second)
+
+            for key, tokens in refilled.items():
+                self._buckets[key] = (tokens if wait is not None else tokens - costs[key], now)
+                self._buckets.move_to_end(key)
+
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class AdmissionController:
+    """
+    Bounds the work admitted into the chat pipeline.
+
+    At most `max_concurrency` requests run at once and at most `max_queue`
+    more wait for a slot, each for up to `queue_timeout_ms`. Anything beyond
+    that is rejected immediately with 503 so that a slow model or database
+    degrades into fast errors instead of an ever-growing backlog. An
+    optional per-user token bucket rejects callers over their rate with 429.
+
+    The limits are per process and apply to requests on the event loop.
+    """
+
+    def __init__(self, max_concurrency: int = config.CHAT_MAX_CONCURRENCY,
+                 max_queue: int = config.CHAT_MAX_QUEUE,
+                 queue_timeout_ms: int = config.CHAT_QUEUE_TIMEOUT_MS,
+                 retry_after_seconds: float = config.CHAT_RETRY_AFTER_SECONDS,
+                 rate_limiter: Optional[TokenBucketLimiter] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout_ms / 1000.0
+        self.retry_after_seconds = retry_after_seconds
+        self.rate_limiter = rate_limiter
+
+        # Created on first use so it binds to the server's event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'admitted': 0,
+            'delayed': 0,
+            'rejected_queue_full': 0,
+            'rejected_timeout': 0,
+            'rate_limited': 0,
+        }
+
+    @staticmethod
+    def rate_key(user_id: Optional[int], session_id: Optional[str]) -> Optional[str]:
+        """
+        Build the rate limit key for a chat request, preferring the user ID.
+        """
+        if user_id is not None:
+            return f"user:{user_id}"
+        if session_id:
+            return f"session:{session_id}"
+        return None
+
+    async def acquire(self, rate_key: Optional[str] = None, rate_costs: Optional[Dict[str, int]] = None):
+        """
+        Wait for a pipeline slot. Every successful call must be paired with
+        release().
+
+        Args:
+            rate_key: Key for the per-user rate limit, if any
+            rate_costs: Tokens to take per rate limit key instead of one for
+                `rate_key` (e.g. messages per user in a batch)
+
+        Raises:
+            AdmissionRejected: If the caller is rate limited or the pipeline
+                and its queue are full
+        """
+        if rate_costs is None and rate_key is not None:
+            rate_costs = {rate_key: 1}
+        if self.rate_limiter is not None and rate_costs:
+            wait = self.rate_limiter.check_many(rate_costs)
+            if wait is not None:
+                self.stats['rate_limited'] += 1
+                raise AdmissionRejected(429, wait, 'rate_limited')
+
+        if self.max_concurrency <= 0:
+            self._in_flight += 1
+            self.stats['admitted'] += 1
+            return
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue:
+                self.stats['rejected_queue_full'] += 1
+                raise AdmissionRejected(503, self.retry_after_seconds, 'queue_full')
+
+            self.stats['delayed'] += 1
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats['rejected_timeout'] += 1
+                raise AdmissionRejected(503, self.retry_after_seconds, 'queue_timeout')
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self._in_flight += 1
+        self.stats['admitted'] += 1
+
+    def release(self):
+        """
+        Give back the slot taken by acquire().
+        """
+        self._in_flight -= 1
+        if self._semaphore is not None and self.max_concurrency > 0:
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the admission counters and current load.
+        """
+        stats = dict(self.stats)
+        stats['in_flight'] = self._in_flight
+        stats['waiting'] = self._waiting
+        if self.rate_limiter is not None:
+            stats['tracked_keys'] = len(self.rate_limiter)
+        return stats
+
+_admission_controller: Optional[AdmissionController] = None
+_admission_controller_lock = threading.Lock()
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Get the process-wide AdmissionController, creating it on first use.
+
+    Returns:
+        The shared AdmissionController instance
+    """
+    global _admission_controller
+
+    if _admission_controller is None:
+        with _admission_controller_lock:
+            if _admission_controller is None:
+                rate_limiter = TokenBucketLimiter() if config.CHAT_RATE_LIMIT_PER_SECOND > 0 else None
+                _admission_controller = AdmissionController(rate_limiter=rate_limiter)
+                REGISTRY.register_collector('chatbot_admission', _admission_controller.get_stats)
+
+    return _admission_controller
+
+_batch_admission_controller: Optional[AdmissionController] = None
+
+def get_batch_admission_controller() -> AdmissionController:
+    """
+    Get the process-wide AdmissionController for /api/chat/batch, creating
+    it on first use.
+
+    Batches get their own, smaller pool of slots so that a few large batches
+    cannot take every chat slot, and share the chat rate limiter, charged
+    one token per message.
+
+    Returns:
+        The shared batch AdmissionController instance
+    """
+    global _batch_admission_controller
+
+    if _batch_admission_controller is None:
+        rate_limiter = get_admission_controller().rate_limiter
+        with _admission_controller_lock:
+            if _batch_admission_controller is None:
+                _batch_admission_controller = AdmissionController(
+                    max_concurrency=config.CHAT_BATCH_MAX_CONCURRENCY,
+                    max_queue=config.CHAT_BATCH_MAX_QUEUE,
+                    rate_limiter=rate_limiter
+                )
+                REGISTRY.register_collector('chatbot_batch_admission', _batch_admission_controller.get_stats)
+
+    return _batch_admission_controller
@@ -0,0 +1,167 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from app.agents.guard_agent import GuardAgent
+from app.agents.classification_agent import ClassificationAgent
+from app.agents.order_agent import OrderAgent
+from app.agents.details_agent import DetailsAgent
+from app.agents.recommendation_agent import RecommendationAgent
+from app.faiss.faiss_index import FAISSIndex
+from app.services.pipeline_executor import get_pipeline_executor
+from app.services.faq_search import get_faq_search
+from app.services.item_similarity import get_item_similarity
+from app.services.product_cards import get_product_card_cache
+from app.services.product_index import get_product_index
+from app.services.user_profiles import get_profile_store
+from app.utils.logger import get_logger
+
+logger = get_logger("agent_registry")
+
+class AgentRegistry:
+    """
+    Process-wide registry of the chatbot's agents, keyed by the names the
+    Classification Agent routes to (e.g. 'order_agent').
+
+    Each agent is registered with a factory and built on first use, then
+    shared by all worker threads: agents keep no per-request state, the DB
+    session and conversation state are passed in on every call. Agents that
+    are rarely routed to cost nothing until a message needs them.
+
+    Agents that answer messages implement:
+        handle(message, session, user_id=None, db=None) -> {'response', 'additional_data'}
+        async ahandle(message, session, user_id=None, db=None) -> same, with an AsyncSession
+    and optionally:
+        handle_batch(messages, db=None) -> [handle() results] for stateless agents
+        async astream(message, session, user_id=None, db=None) yielding text
+            chunks, then the ahandle() result
+        CACHEABLE = True when the answer depends only on the message; a
+            result with 'degraded': True (e.g. a search timed out) is not cached
+    `session` is the session's conversation state; agents may update it.
+    """
+
+    def __init__(self, faiss_index: Optional[FAISSIndex] = None):
+        self.faiss_index = faiss_index
+        self._factories: Dict[str, Callable[['AgentRegistry'], Any]] = {}
+        self._agents: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+        self.register('guard_agent', lambda registry: GuardAgent())
+        self.register('classification_agent', lambda registry: ClassificationAgent())
+        self.register('order_agent', lambda registry: OrderAgent())
+        self.register('details_agent', lambda registry: DetailsAgent(
+            faiss_index=registry.get_faiss_index(), executor=get_pipeline_executor(),
+            product_index=get_product_index(), card_cache=get_product_card_cache(),
+            faq_search=get_faq_search()
+        ))
+        self.register('recommendation_agent', lambda registry: RecommendationAgent(
+            item_similarity=get_item_similarity(), profiles=get_profile_store()
+        ))
+
+    def register(self, name: str, factory: Callable[['AgentRegistry'], Any]):
+        """
+        Register (or replace) the factory for an agent.
+
+        Args:
+            name: The agent name, as returned in classification results
+            factory: Called with this registry to build the agent on first use
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._agents.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """
+        Get an agent by name, building it on first use.
+
+        Args:
+            name: The agent name
+
+        Returns:
+            The shared agent instance
+
+        Raises:
+            KeyError: If no agent is registered under `name`
+        """
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+
+        with self._lock:
+            # Re-check under the lock so only one thread builds the agent
+            agent = self._agents.get(name)
+            if agent is None:
+                agent = self._factories[name](self)
+                self._agents[name] = agent
+        return agent
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+    def loaded(self) -> List[str]:
+        """
+        Get the names of the agents built so far.
+        """
+        return sorted(self._agents)
+
+    def get_faiss_index(self) -> Optional[FAISSIndex]:
+        """
+        Get the FAISS index, loading it from disk on first use.
+        """
+        with self._lock:
+            if self.faiss_index is None:
+                self.faiss_index = load_faiss_index()
+            return self.faiss_index
+
+    @property
+    def guard_agent(self) -> GuardAgent:
+        return self.get('guard_agent')
+
+    @property
+    def classification_agent(self) -> ClassificationAgent:
+        return self.get('classification_agent')
+
+    @property
+    def order_agent(self) -> OrderAgent:
+        return self.get('order_agent')
+
+    @property
+    def details_agent(self) -> DetailsAgent:
+        return self.get('details_agent')
+
+    @property
+    def recommendation_agent(self) -> RecommendationAgent:
+        return self.get('recommendation_agent')
+
+def load_faiss_index() -> Optional[FAISSIndex]:
+    """
+    Load the FAISS index from disk.
+
+    Returns:
+        The loaded index, or None if it could not be loaded
+    """
+    try:
+        faiss_index = FAISSIndex()
+        faiss_index.load_index()
+        return faiss_index
+    except Exception as e:
+        logger.warning("Could not load FAISS index: %s", e)
+        return None
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_agent_registry() -> AgentRegistry:
+    """
+    Get the process-wide agent registry, building it on first use.
+
+    Returns:
+        The shared AgentRegistry instance
+    """
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            # Re-check under the lock so only one thread builds the registry
+            if _registry is None:
+                _registry = AgentRegistry()
+
+    return _registry
@@ -0,0 +1,400 @@
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app import config
+from app.database.change_tracking import subscribe
+from app.database.db import SessionLocal, engine as default_engine
+from app.database.models import FAQ
+from app.services.product_index import STOPWORDS
+from app.utils.logger import get_logger
+from app.utils.metrics import REGISTRY
+
+logger = get_logger("faq_search")
+
+_WORD_RE = re.compile(r"\w+")
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Split a text into the trigrams pg_trgm would use.
+
+    Each lowercased word is padded with two spaces in front and one behind,
+    so short words and word starts still produce trigrams.
+
+    Args:
+        text: The text to split
+
+    Returns:
+        The set of distinct trigrams
+    """
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def trigram_score(query_grams: Set[str], text: str) -> float:
+    """
+    Score a text by the share of the query's trigrams it contains, the
+    scale all FAQ search backends report (like pg_trgm's word_similarity).
+
+    Args:
+        query_grams: trigrams() of the query
+        text: The text to score
+
+    Returns:
+        A score between 0 and 1
+    """
+    if not query_grams:
+        return 0.0
+    return len(query_grams & trigrams(text)) / len(query_grams)
+
+class TrigramIndex:
+    """
+    In-process trigram index over FAQ questions.
+
+    Used when the database has no trigram or full-text support. A question
+    scores the share of the query's trigrams it contains (like pg_trgm's
+    word_similarity), so a short query matches a longer question that
+    contains it.
+    """
+
+    def __init__(self, refresh_interval: float = config.FAQ_INDEX_REFRESH_SECONDS,
+                 min_score: float = config.FAQ_MIN_SCORE):
+        """
+        Args:
+            refresh_interval: Seconds after which the FAQs are read again, to
+                pick up changes made by other processes (0 disables it)
+            min_score: Lowest score returned
+        """
+        self.refresh_interval = refresh_interval
+        self.min_score = min_score
+        self._faqs: List[Tuple[int, str, str]] = []
+        # trigram -> positions in _faqs of the questions containing it
+        self._postings: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._stale = True
+        self._expires_at = 0.0
+
+    def invalidate(self):
+        """
+        Rebuild the index on the next search.
+        """
+        self._stale = True
+
+    def _build(self, db: Session):
+        faqs = db.execute(select(FAQ.faq_id, FAQ.question, FAQ.answer).order_by(FAQ.faq_id)).all()
+        postings: Dict[str, List[int]] = {}
+        for position, (_, question, _) in enumerate(faqs):
+            for gram in trigrams(question):
+                postings.setdefault(gram, []).append(position)
+        self._faqs = [tuple(faq) for faq in faqs]
+        self._postings = postings
+
+    def search(self, db: Session, question: str, limit: int) -> List[Dict]:
+        """
+        Find the FAQs whose questions best match a query.
+
+        Args:
+            db: Session used when the index has to be (re)built
+            question: The search text
+            limit: Most FAQs returned
+
+        Returns:
+            FAQ dicts, best match first, each with its 'score'
+        """
+        with self._lock:
+            if self._stale or (self.refresh_interval and time.monotonic() >= self._expires_at):
+                # Cleared first so a change made during the build triggers another one
+                self._stale = False
+                self._build(db)
+                self._expires_at = time.monotonic() + self.refresh_interval
+            faqs, postings = self._faqs, self._postings
+
+        grams = trigrams(question)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(postings.get(gram, ()))
+
+        results = []
+        # Ties go to the shorter, more specific question
+        for position, count in sorted(shared.items(), key=lambda item: (-item[1], len(faqs[item[0]][1]))):
+            score = count / len(grams)
+            if score < self.min_score or len(results) >= limit:
+                break
+            faq_id, faq_question, answer = faqs[position]
+            results.append({'faq_id': faq_id, 'question': faq_question, 'answer': answer,
+                            'score': round(score, 4)})
+        return results
+
+    def __len__(self) -> int:
+        return len(self._faqs)
+
+class FAQSearch:
+    """
+    Ranked FAQ lookup on the fastest backend the database supports.
+
+    Backends:
+        postgres: pg_trgm GIN index on faqs.question, ranked by word_similarity
+        sqlite: FTS5 table with the trigram tokenizer, kept in sync with faqs
+            by triggers and ranked by bm25
+        memory: TrigramIndex in this process
+
+    The backend is chosen (and its index created) on the first search. If a
+    database backend cannot be set up, or a query on it fails, the in-process
+    index answers instead. Every backend scores a match by the share of the
+    query's trigrams found in the question (0 to 1) and drops matches below
+    `min_score`, so results do not depend on the backend.
+    """
+
+    BACKENDS = ('auto', 'postgres', 'sqlite', 'memory')
+
+    # FTS5 candidates scored per result returned, since bm25 and trigram order differ
+    SQLITE_CANDIDATES = 5
+
+    def __init__(self, engine: Engine = default_engine, session_factory: Callable = SessionLocal,
+                 backend: str = config.FAQ_SEARCH_BACKEND, min_score: float = config.FAQ_MIN_SCORE):
+        """
+        Args:
+            engine: Engine of the database holding the faqs table
+            session_factory: Creates sessions for searches made without one
+            backend: One of BACKENDS; 'auto' picks by database dialect
+            min_score: Lowest score returned, on every backend
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown FAQ search backend '{backend}', expected one of {self.BACKENDS}")
+        self.engine = engine
+        self.session_factory = session_factory
+        self.requested_backend = backend
+        self.min_score = min_score
+        self.backend: Optional[str] = None
+        self.memory_index = TrigramIndex(min_score=min_score)
+        self._setup_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # Whether faqs has no rows: read with the backend set up, then again
+        # only after FAQ changes or every FAQ_INDEX_REFRESH_SECONDS
+        self._empty: Optional[bool] = None
+        self._empty_expires_at = 0.0
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'searches': 0,
+            'fallbacks': 0,
+        }
+
+    def _setup(self) -> str:
+        dialect = self.engine.dialect.name
+        backend = self.requested_backend
+        if backend == 'auto':
+            backend = {'postgresql': 'postgres', 'sqlite': 'sqlite'}.get(dialect, 'memory')
+
+        try:
+            if backend == 'postgres':
+                self._setup_postgres()
+            elif backend == 'sqlite':
+                self._setup_sqlite()
+        except Exception as e:
+            logger.warning("Could not set up the %s FAQ index, using the in-process index: %s", backend, e)
+            backend = 'memory'
+
+        logger.info("FAQ search backend: %s", backend)
+        return backend
+
+    def _setup_postgres(self):
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_faqs_question_trgm ON faqs USING gin (question gin_trgm_ops)"
+            ))
+
+    # FTS5 table and the triggers that keep it in sync with faqs
+    SQLITE_SCHEMA = {
+        # External-content table: the text stays in faqs, only the index is stored
+        'faqs_fts': "CREATE VIRTUAL TABLE faqs_fts USING fts5("
+                    "question, content='faqs', content_rowid='faq_id', tokenize='trigram')",
+        'faqs_fts_insert': "CREATE TRIGGER faqs_fts_insert AFTER INSERT ON faqs BEGIN "
+                           "INSERT INTO faqs_fts(rowid, question) VALUES (new.faq_id, new.question); END",
+        'faqs_fts_delete': "CREATE TRIGGER faqs_fts_delete AFTER DELETE ON faqs BEGIN "
+                           "INSERT INTO faqs_fts(faqs_fts, rowid, question) "
+                           "VALUES ('delete', old.faq_id, old.question); END",
+        'faqs_fts_update': "CREATE TRIGGER faqs_fts_update AFTER UPDATE ON faqs BEGIN "
+                           "INSERT INTO faqs_fts(faqs_fts, rowid, question) "
+                           "VALUES ('delete', old.faq_id, old.question); "
+                           "INSERT INTO faqs_fts(rowid, question) VALUES (new.faq_id, new.question); END",
+    }
+
+    def _setup_sqlite(self):
+        with self.engine.begin() as connection:
+            existing = {name for (name,) in connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE name LIKE 'faqs_fts%'"
+            ))}
+            missing = [name for name in self.SQLITE_SCHEMA if name not in existing]
+            for name in missing:
+                connection.execute(text(self.SQLITE_SCHEMA[name]))
+            # Triggers are dropped with the faqs table, so anything missing
+            # means faqs may have changed without the index seeing it
+            if missing:
+                connection.execute(text("INSERT INTO faqs_fts(faqs_fts) VALUES ('rebuild')"))
+
+    def _search_postgres(self, db: Session, question: str, limit: int) -> List[Dict]:
+        # <% uses the GIN index and keeps questions above pg_trgm.word_similarity_threshold,
+        # set to min_score for this transaction
+        db.execute(text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+                   {'threshold': str(self.min_score)})
+        rows = db.execute(text(
+            "SELECT faq_id, question, answer, word_similarity(:q, question) AS score "
+            "FROM faqs WHERE :q <% question ORDER BY score DESC, faq_id LIMIT :limit"
+        ), {'q': question, 'limit': limit})
+        return [{'faq_id': faq_id, 'question': faq_question, 'answer': answer, 'score': round(float(score), 4)}
+                for faq_id, faq_question, answer, score in rows]
+
+    def _search_sqlite(self, db: Session, question: str, limit: int) -> List[Dict]:
+        # The trigram tokenizer matches substrings of three or more characters;
+        # stopwords are left out unless the query has nothing else
+        words = [word for word in _WORD_RE.findall(question.lower()) if len(word) >= 3]
+        words = [word for word in words if word not in STOPWORDS] or words
+        if not words:
+            return []
+        match = " OR ".join(f'"{word}"' for word in dict.fromkeys(words))
+        # bm25 picks the candidates; raw bm25 values depend on the table size,
+        # so they are scored on the same trigram scale as the other backends
+        rows = db.execute(text(
+            "SELECT faqs.faq_id, faqs.question, faqs.answer "
+            "FROM faqs_fts JOIN faqs ON faqs.faq_id = faqs_fts.rowid "
+            "WHERE faqs_fts MATCH :match ORDER BY bm25(faqs_fts) LIMIT :limit"
+        ), {'match': match, 'limit': limit * self.SQLITE_CANDIDATES})
+
+        grams = trigrams(question)
+        results = []
+        for faq_id, faq_question, answer in rows:
+            score = trigram_score(grams, faq_question)
+            if score >= self.min_score:
+                results.append({'faq_id': faq_id, 'question': faq_question, 'answer': answer,
+                                'score': round(score, 4)})
+        # Stable sort: equal scores keep their bm25 order
+        results.sort(key=lambda result: -result['score'])
+        return results[:limit]
+
+    def search(self, question: str, limit: int = config.FAQ_SEARCH_LIMIT,
+               db: Optional[Session] = None) -> List[Dict]:
+        """
+        Find the FAQs that best match a question.
+
+        Args:
+            question: The search text
+            limit: Most FAQs returned
+            db: Session to query with (a new one is opened if None)
+
+        Returns:
+            FAQ dicts (faq_id, question, answer, score), best match first
+        """
+        if self.backend is None:
+            with self._setup_lock:
+                if self.backend is None:
+                    self.backend = self._setup()
+                    self.is_empty(db)
+
+        with self._stats_lock:
+            self.stats['searches'] += 1
+
+        question = question.strip()
+        if not question or limit <= 0:
+            return []
+
+        own_session = db is None
+        if own_session:
+            db = self.session_factory()
+        try:
+            if self.backend != 'memory':
+                try:
+                    search = self._search_postgres if self.backend == 'postgres' else self._search_sqlite
+                    return search(db, question, limit)
+                except Exception as e:
+                    logger.error("FAQ search on %s failed, using the in-process index: %s", self.backend, e)
+                    db.rollback()
+                    with self._stats_lock:
+                        self.stats['fallbacks'] += 1
+            return self.memory_index.search(db, question, limit)
+        finally:
+            if own_session:
+                db.close()
+
+    def is_empty(self, db: Optional[Session] = None) -> bool:
+        """
+        Check whether the faqs table has no rows.
+
+        The answer is cached; the table is only read again after an FAQ
+        change or once the refresh interval has passed.
+
+        Args:
+            db: Session to query with if the table has to be read (a new one
+                is opened if None)
+        """
+        empty = self._empty
+        refresh_interval = self.memory_index.refresh_interval
+        if empty is not None and not (refresh_interval and time.monotonic() >= self._empty_expires_at):
+            return empty
+
+        own_session = db is None
+        if own_session:
+            db = self.session_factory()
+        try:
+            empty = db.execute(select(FAQ.faq_id).limit(1)).first() is None
+        finally:
+            if own_session:
+                db.close()
+        self._empty = empty
+        self._empty_expires_at = time.monotonic() + refresh_interval
+        return empty
+
+    def on_change(self, table_name: str, operation: str, instance: Any):
+        """
+        change_tracking listener: rebuild the in-process index and recheck
+        is_empty() after FAQ changes.
+
+        The database backends need nothing here; their indexes are
+        maintained by the database.
+        """
+        if table_name == FAQ.__tablename__:
+            self.memory_index.invalidate()
+            # An insert means rows exist; after a delete the table is read again
+            if operation == 'insert':
+                self._empty = False
+            elif operation == 'delete':
+                self._empty = None
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the search counters.
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['entries'] = len(self.memory_index)
+        return stats
+
+_faq_search: Optional[FAQSearch] = None
+_faq_search_lock = threading.Lock()
+
+def get_faq_search() -> FAQSearch:
+    """
+    Get the process-wide FAQSearch, creating it on first use.
+
+    Returns:
+        The shared FAQSearch instance (its backend is set up on the first search)
+    """
+    global _faq_search
+
+    if _faq_search is None:
+        with _faq_search_lock:
+            if _faq_search is None:
+                _faq_search = FAQSearch()
+                subscribe(_faq_search.on_change)
+                REGISTRY.register_collector('chatbot_faq_search', _faq_search.get_stats)
+
+    return _faq_search
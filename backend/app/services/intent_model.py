@@ -0,0 +1,232 @@
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import config
+from app.database.db import SessionLocal
+from app.database.models import UserInteraction
+from app.utils.logger import get_logger
+
+logger = get_logger("intent_model")
+
+# Labels in UserInteraction.intent that name the same intent
+INTENT_ALIASES = {
+    'faq': 'details',
+}
+
+class CentroidIntentModel:
+    """
+    Nearest-centroid intent classifier over sentence embeddings.
+
+    Each intent is represented by the normalized mean embedding of its
+    labeled examples, so scoring a batch of messages is one matrix product
+    of their embeddings with the centroid matrix. Confidences are a softmax
+    over the cosine similarities.
+    """
+
+    # Intents need at least this many labeled examples to get a centroid
+    MIN_EXAMPLES = 5
+
+    def __init__(self, intents: Sequence[str], centroids: np.ndarray,
+                 temperature: float = config.CLASSIFIER_TEMPERATURE,
+                 min_similarity: float = config.CLASSIFIER_MIN_SIMILARITY):
+        """
+        Args:
+            intents: Intent names, one per centroid row
+            centroids: Array of shape (len(intents), dimension)
+            temperature: Softmax temperature applied to the similarities
+            min_similarity: Below this best similarity a message is not classified
+        """
+        self.intents = list(intents)
+        self.centroids = _normalize(np.asarray(centroids, dtype=np.float32))
+        self.temperature = temperature
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, labels: Sequence[str], **kwargs) -> "CentroidIntentModel":
+        """
+        Build the model from embeddings of labeled examples.
+
+        Args:
+            vectors: Array of shape (examples, dimension)
+            labels: The intent of each example
+
+        Returns:
+            The fitted model
+
+        Raises:
+            ValueError: If fewer than two intents have enough examples
+        """
+        labels = np.asarray(labels)
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+
+        intents, centroids = [], []
+        for intent in sorted(set(labels.tolist())):
+            rows = vectors[labels == intent]
+            if len(rows) < cls.MIN_EXAMPLES:
+                logger.warning("Skipping intent '%s': only %d labeled examples", intent, len(rows))
+                continue
+            intents.append(intent)
+            centroids.append(rows.mean(axis=0))
+
+        if len(intents) < 2:
+            raise ValueError("Need labeled examples for at least two intents")
+        return cls(intents, np.stack(centroids), **kwargs)
+
+    def similarities(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of each vector to each intent centroid.
+
+        Args:
+            vectors: Array of shape (n, dimension)
+
+        Returns:
+            Array of shape (n, intents)
+        """
+        return _normalize(np.asarray(vectors, dtype=np.float32)) @ self.centroids.T
+
+    def predict(self, vectors: np.ndarray) -> List[Tuple[Optional[str], float, Optional[str]]]:
+        """
+        Classify a batch of embeddings.
+
+        Args:
+            vectors: Array of shape (n, dimension)
+
+        Returns:
+            One (intent, confidence, runner-up intent) per vector; the intent
+            is None when no centroid is similar enough
+        """
+        similarities = self.similarities(vectors)
+        scaled = similarities / self.temperature
+        scaled -= scaled.max(axis=1, keepdims=True)
+        probabilities = np.exp(scaled)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+        ranked = np.argsort(-similarities, axis=1)
+        predictions = []
+        for row, order in enumerate(ranked):
+            best = order[0]
+            if similarities[row, best] < self.min_similarity:
+                predictions.append((None, 0.0, None))
+                continue
+            runner_up = self.intents[order[1]] if len(order) > 1 else None
+            predictions.append((self.intents[best], round(float(probabilities[row, best]), 4), runner_up))
+        return predictions
+
+    def save(self, path: str):
+        """
+        Save the centroids to a .npz file.
+        """
+        np.savez(path, intents=np.array(self.intents), centroids=self.centroids)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "CentroidIntentModel":
+        """
+        Load centroids saved by save().
+        """
+        with np.load(path) as data:
+            return cls(data['intents'].tolist(), data['centroids'], **kwargs)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+def load_training_examples(db: Session, intents: Sequence[str],
+                           limit_per_intent: int = config.CLASSIFIER_TRAINING_LIMIT) -> Tuple[List[str], List[str]]:
+    """
+    Read labeled messages from UserInteraction, newest first.
+
+    Args:
+        db: The database session
+        intents: Intents to keep; other labels (e.g. 'unknown') are skipped
+        limit_per_intent: Most examples kept per intent
+
+    Returns:
+        Tuple of (texts, labels)
+    """
+    counts: Dict[str, int] = {intent: 0 for intent in intents}
+    texts, labels = [], []
+
+    query = (select(UserInteraction.query_text, UserInteraction.intent)
+             .order_by(UserInteraction.interaction_id.desc()))
+    for text, label in db.execute(query.execution_options(yield_per=1000)):
+        label = (label or '').strip().lower()
+        label = INTENT_ALIASES.get(label, label)
+        if label not in counts or counts[label] >= limit_per_intent or not text:
+            continue
+        counts[label] += 1
+        texts.append(text)
+        labels.append(label)
+        if all(count >= limit_per_intent for count in counts.values()):
+            break
+
+    return texts, labels
+
+def train_intent_model(db: Session, intents: Sequence[str]) -> CentroidIntentModel:
+    """
+    Train a CentroidIntentModel from the labeled interactions in the database.
+
+    Args:
+        db: The database session
+        intents: Intents to train
+
+    Returns:
+        The fitted model
+    """
+    from app.utils.embeddings import get_embedding_matrix
+
+    texts, labels = load_training_examples(db, intents)
+    logger.info("Training intent centroids on %d labeled messages", len(texts))
+    return CentroidIntentModel.fit(get_embedding_matrix(texts), labels)
+
+_intent_model: Optional[CentroidIntentModel] = None
+_intent_model_loaded = False
+_intent_model_lock = threading.Lock()
+
+def get_intent_model(intents: Sequence[str]) -> Optional[CentroidIntentModel]:
+    """
+    Get the process-wide intent model, creating it on first use.
+
+    The centroids are loaded from CLASSIFIER_CENTROIDS_PATH, or trained from
+    the database and saved there when the file does not exist yet.
+
+    Args:
+        intents: Intents to train if the model has to be trained
+
+    Returns:
+        The model, or None if the embedding model or training data is unavailable
+    """
+    global _intent_model, _intent_model_loaded
+
+    if not _intent_model_loaded:
+        with _intent_model_lock:
+            if not _intent_model_loaded:
+                _intent_model = _load_or_train(intents)
+                _intent_model_loaded = True
+
+    return _intent_model
+
+def _load_or_train(intents: Sequence[str]) -> Optional[CentroidIntentModel]:
+    try:
+        from app.utils.embeddings import is_model_available
+        if not is_model_available():
+            logger.warning("Embedding model not available, intent model disabled")
+            return None
+
+        path = config.CLASSIFIER_CENTROIDS_PATH
+        if os.path.exists(path):
+            return CentroidIntentModel.load(path)
+
+        db = SessionLocal()
+        try:
+            model = train_intent_model(db, intents)
+        finally:
+            db.close()
+        model.save(path)
+        logger.info("Saved intent centroids for %s to %s", model.intents, path)
+        return model
+    except Exception as e:
+        logger.warning("Could not load or train the intent model: %s", e)
+        return None
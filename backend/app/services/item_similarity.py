@@ -0,0 +1,355 @@
+import json
+import os
+import shutil
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import config
+from app.database.models import Recommendation
+from app.utils.logger import get_logger
+from app.utils.metrics import REGISTRY
+
+logger = get_logger("item_similarity")
+
+class ItemSimilarityModel:
+    """
+    Item-item cosine similarities between products, pruned to each product's
+    nearest neighbors.
+
+    Stored like a CSR matrix: the neighbors of the product at position i of
+    `product_ids` are neighbors[indptr[i]:indptr[i + 1]] (positions into
+    `product_ids`), best first, with their similarities in `scores`. Saved
+    as one .npy file per array so a loaded model is memory-mapped instead of
+    read into memory.
+
+    Each save() writes a new version directory under `versions/` and then
+    points the CURRENT file at it, so files a running process has mapped
+    are never replaced.
+    """
+
+    ARRAYS = ('product_ids', 'indptr', 'neighbors', 'scores')
+    META_FILE = 'meta.json'
+    CURRENT_FILE = 'CURRENT'
+    VERSIONS_DIR = 'versions'
+
+    def __init__(self, product_ids: np.ndarray, indptr: np.ndarray, neighbors: np.ndarray,
+                 scores: np.ndarray, meta: Optional[Dict] = None):
+        """
+        Args:
+            product_ids: Sorted product IDs, shape (items,)
+            indptr: Neighbor list offsets, shape (items + 1,)
+            neighbors: Neighbor positions, shape (indptr[-1],)
+            scores: Neighbor similarities, shape (indptr[-1],)
+            meta: Build details saved alongside the arrays
+        """
+        self.product_ids = product_ids
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, user_ids: np.ndarray, product_ids: np.ndarray, ratings: np.ndarray,
+              neighbors: int = config.ITEM_SIMILARITY_NEIGHBORS, block_size: int = 1024) -> "ItemSimilarityModel":
+        """
+        Compute the model from (user, product, rating) triples.
+
+        Each product is a vector of its ratings by user; two products score
+        the cosine of their vectors, so products rated highly by the same
+        users are similar. Repeated ratings of a product by a user add up.
+
+        Args:
+            user_ids: User of each rating
+            product_ids: Product of each rating
+            ratings: Rating values (positive)
+            neighbors: Most neighbors kept per product
+            block_size: Products whose similarities are computed at once,
+                which bounds the memory used by the build
+
+        Returns:
+            The built model
+        """
+        from scipy import sparse
+
+        items, columns = np.unique(product_ids, return_inverse=True)
+        users, rows = np.unique(user_ids, return_inverse=True)
+        matrix = sparse.csr_matrix((ratings.astype(np.float32), (rows, columns)), shape=(len(users), len(items)))
+        matrix.sum_duplicates()
+
+        # Scale every product column to unit length, so dot products are cosines
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        matrix = (matrix @ sparse.diags(1.0 / np.maximum(norms, 1e-9))).tocsc()
+        by_item = matrix.T.tocsr()
+
+        indptr = np.zeros(len(items) + 1, dtype=np.int64)
+        neighbor_parts, score_parts = [], []
+        for start in range(0, len(items), block_size):
+            block = (by_item[start:start + block_size] @ matrix).tocsr()
+            for offset in range(block.shape[0]):
+                lo, hi = block.indptr[offset], block.indptr[offset + 1]
+                cols, sims = block.indices[lo:hi], block.data[lo:hi]
+                keep = (cols != start + offset) & (sims > 0)
+                cols, sims = cols[keep], sims[keep]
+                if len(sims) > neighbors:
+                    top = np.argpartition(-sims, neighbors - 1)[:neighbors]
+                    cols, sims = cols[top], sims[top]
+                order = np.argsort(-sims, kind='stable')
+                neighbor_parts.append(cols[order].astype(np.int32))
+                score_parts.append(sims[order].astype(np.float32))
+                indptr[start + offset + 1] = indptr[start + offset] + len(order)
+
+        empty_int, empty_float = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        meta = {
+            'items': int(len(items)),
+            'users': int(len(users)),
+            'ratings': int(matrix.nnz),
+            'neighbors': neighbors,
+            'built_at': time.time(),
+        }
+        return cls(items.astype(np.int64), indptr,
+                   np.concatenate(neighbor_parts) if neighbor_parts else empty_int,
+                   np.concatenate(score_parts) if score_parts else empty_float, meta)
+
+    def save(self, path: str, keep: int = 2) -> str:
+        """
+        Save the model as a new version directory of .npy files under `path`.
+
+        The version is written in full before CURRENT is atomically replaced
+        to name it, so a process loading the model never sees a partial
+        build. Older versions are then removed, except the `keep` newest:
+        processes that have not reloaded yet may still map the previous one.
+
+        Args:
+            path: Model directory
+            keep: Versions kept, including the new one
+
+        Returns:
+            The new version's name
+        """
+        versions = os.path.join(path, self.VERSIONS_DIR)
+        now = time.time()
+        version = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now % 1 * 1000):03d}-{os.getpid()}"
+        staging = os.path.join(versions, f".{version}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name in self.ARRAYS:
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(staging, self.META_FILE), "w") as f:
+            json.dump(self.meta, f)
+        os.rename(staging, os.path.join(versions, version))
+
+        current = os.path.join(path, self.CURRENT_FILE)
+        with open(f"{current}.{os.getpid()}.tmp", "w") as f:
+            f.write(version)
+        os.replace(f"{current}.{os.getpid()}.tmp", current)
+
+        # Names sort by build time; removal fails harmlessly where mapped
+        # files cannot be deleted (Windows)
+        saved = sorted(name for name in os.listdir(versions) if not name.startswith('.'))
+        for name in saved[:-keep]:
+            if name != version:
+                shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+        return version
+
+    @classmethod
+    def current_version(cls, path: str) -> Optional[str]:
+        """
+        Get the name of the version CURRENT points to, or None if no model
+        has been saved to `path`.
+        """
+        try:
+            with open(os.path.join(path, cls.CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, path: str, version: Optional[str] = None) -> "ItemSimilarityModel":
+        """
+        Memory-map a model saved by save().
+
+        Args:
+            path: Model directory
+            version: Version to load (the current one if None)
+        """
+        version = version or cls.current_version(path)
+        if version is None:
+            raise FileNotFoundError(f"No item similarity model saved in {path}")
+        directory = os.path.join(path, cls.VERSIONS_DIR, version)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in cls.ARRAYS}
+        with open(os.path.join(directory, cls.META_FILE)) as f:
+            meta = json.load(f)
+        meta['version'] = version
+        return cls(meta=meta, **arrays)
+
+    def similar_to(self, history: Dict[int, float], k: int) -> List[Tuple[int, float]]:
+        """
+        Score the products similar to a user's rated products.
+
+        A candidate scores the rating-weighted average of its similarity to
+        each product in the history, so scores lie between 0 and 1.
+
+        Args:
+            history: Product ID -> the user's rating (or 1.0 if unrated)
+            k: Most products returned
+
+        Returns:
+            (product_id, score) pairs, best first; products in the history
+            are left out
+        """
+        if not history or not len(self.product_ids) or k <= 0:
+            return []
+
+        ids = np.fromiter(history.keys(), dtype=np.int64, count=len(history))
+        weights = np.fromiter(history.values(), dtype=np.float64, count=len(history))
+        positions = np.searchsorted(self.product_ids, ids)
+        known = positions < len(self.product_ids)
+        known[known] = self.product_ids[positions[known]] == ids[known]
+        positions, weights = positions[known], weights[known]
+        if not len(positions):
+            return []
+
+        # Gather every neighbor list in one indexing operation
+        starts = self.indptr[positions]
+        lengths = self.indptr[positions + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return []
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        candidates = self.neighbors[offsets]
+        similarities = self.scores[offsets] * np.repeat(weights, lengths)
+
+        candidates, inverse = np.unique(candidates, return_inverse=True)
+        totals = np.bincount(inverse, weights=similarities) / weights.sum()
+        totals[np.isin(candidates, positions)] = 0.0
+
+        count = min(k, int(np.count_nonzero(totals)))
+        if not count:
+            return []
+        top = np.argpartition(-totals, count - 1)[:count]
+        top = top[np.argsort(-totals[top], kind='stable')]
+        return [(int(self.product_ids[candidates[i]]), round(float(totals[i]), 4)) for i in top]
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+def load_ratings(db: Session) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Read every (user, product, rating) triple from the recommendations table.
+
+    Unrated rows count as a rating of 1.0; rows rated 0 or below are skipped.
+
+    Returns:
+        Arrays of user IDs, product IDs and ratings
+    """
+    user_ids, product_ids, ratings = array('q'), array('q'), array('d')
+    query = select(Recommendation.user_id, Recommendation.product_id, Recommendation.rating)
+    for user_id, product_id, rating in db.execute(query.execution_options(yield_per=10000)):
+        rating = 1.0 if rating is None else rating
+        if rating <= 0:
+            continue
+        user_ids.append(user_id)
+        product_ids.append(product_id)
+        ratings.append(rating)
+
+    return (np.frombuffer(user_ids, dtype=np.int64), np.frombuffer(product_ids, dtype=np.int64),
+            np.frombuffer(ratings, dtype=np.float64))
+
+class ItemSimilarityStore:
+    """
+    Serves the latest saved ItemSimilarityModel.
+
+    The model directory's CURRENT file is checked at most every
+    `reload_interval` seconds, and the version it names is loaded when it
+    changes, so the offline job can run while the app is up.
+    """
+
+    def __init__(self, path: str = config.ITEM_SIMILARITY_PATH,
+                 reload_interval: float = config.ITEM_SIMILARITY_RELOAD_SECONDS):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._model: Optional[ItemSimilarityModel] = None
+        self._loaded_version: Optional[str] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'requests': 0,
+            'reloads': 0,
+        }
+
+    def get_model(self) -> Optional[ItemSimilarityModel]:
+        """
+        Get the current model, loading a newer build if there is one.
+
+        Returns:
+            The model, or None if none has been built yet
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._model
+
+        with self._lock:
+            if now < self._next_check:
+                return self._model
+            self._next_check = now + self.reload_interval
+            try:
+                version = ItemSimilarityModel.current_version(self.path)
+            except OSError:
+                return self._model
+            if version is not None and version != self._loaded_version:
+                try:
+                    self._model = ItemSimilarityModel.load(self.path, version)
+                    self._loaded_version = version
+                    self.stats['reloads'] += 1
+                    logger.info("Loaded item similarities for %d products from %s (version %s)",
+                                len(self._model), self.path, version)
+                except Exception as e:
+                    logger.warning("Could not load item similarities from %s: %s", self.path, e)
+            return self._model
+
+    def similar_to(self, history: Dict[int, float], k: int) -> List[Tuple[int, float]]:
+        """
+        Score the products similar to a user's rated products.
+
+        Returns:
+            (product_id, score) pairs, best first; empty if there is no model
+        """
+        model = self.get_model()
+        with self._lock:
+            self.stats['requests'] += 1
+        return model.similar_to(history, k) if model is not None else []
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the store counters and model size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._model) if self._model is not None else 0
+        return stats
+
+_item_similarity: Optional[ItemSimilarityStore] = None
+_item_similarity_lock = threading.Lock()
+
+def get_item_similarity() -> ItemSimilarityStore:
+    """
+    Get the process-wide ItemSimilarityStore, creating it on first use.
+
+    Returns:
+        The shared ItemSimilarityStore instance
+    """
+    global _item_similarity
+
+    if _item_similarity is None:
+        with _item_similarity_lock:
+            if _item_similarity is None:
+                _item_similarity = ItemSimilarityStore()
+                REGISTRY.register_collector('chatbot_item_similarity', _item_similarity.get_stats)
+
+    return _item_similarity
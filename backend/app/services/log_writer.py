@@ -0,0 +1,228 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app import config
+from app.database.db import SessionLocal
+from app.utils.logger import get_logger
+
+logger = get_logger("log_writer")
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+class LogWriter:
+    """
+    Write-behind writer for audit rows (UserInteraction, ChatLog).
+
+    Request handlers submit ORM objects to a bounded queue and return
+    immediately. A background thread drains the queue and writes the rows in
+    group commits, either every `batch_size` records or every
+    `flush_interval_ms` milliseconds, whichever comes first.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal,
+                 max_queue_size: int = config.LOG_WRITER_QUEUE_SIZE,
+                 batch_size: int = config.LOG_WRITER_BATCH_SIZE,
+                 flush_interval_ms: int = config.LOG_WRITER_FLUSH_INTERVAL_MS,
+                 overflow_policy: str = config.LOG_WRITER_OVERFLOW_POLICY,
+                 block_timeout_ms: int = config.LOG_WRITER_BLOCK_TIMEOUT_MS):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout_ms / 1000.0
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def start(self):
+        """
+        Start the background flush thread if it is not already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, record: Any) -> bool:
+        """
+        Queue an ORM object to be written by the background thread.
+
+        Args:
+            record: A transient ORM instance (e.g. ChatLog)
+
+        Returns:
+            True if the record was queued, False if it was dropped
+        """
+        if self._thread is None:
+            self.start()
+
+        try:
+            if self.overflow_policy == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow_policy != 'drop_oldest':
+                self._count('dropped')
+                return False
+
+            # Make room by discarding the oldest queued record
+            try:
+                self._queue.get_nowait()
+                self._count('dropped')
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self._count('dropped')
+                return False
+
+        self._count('submitted')
+        return True
+
+    def _drain(self, first: Any) -> List[Any]:
+        """
+        Collect a batch starting with `first` until the batch is full or the
+        flush interval has elapsed.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _write(self, batch: List[Any]):
+        """
+        Write a batch of records in a single transaction.
+
+        If the group commit fails, the records are retried one by one so a
+        single bad row does not discard the whole batch.
+        """
+        db = self.session_factory()
+        try:
+            db.add_all(batch)
+            db.commit()
+            self._count('written', len(batch))
+            self._count('batches')
+            return
+        except Exception as e:
+            db.rollback()
+            logger.warning("Error writing log batch of %d records, retrying one by one: %s", len(batch), e)
+        finally:
+            db.close()
+
+        for record in batch:
+            db = self.session_factory()
+            try:
+                db.add(record)
+                db.commit()
+                self._count('written')
+            except Exception as e:
+                db.rollback()
+                self._count('failed')
+                logger.error("Error writing log record: %s", e)
+            finally:
+                db.close()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+        # Shutdown: write whatever is still queued
+        self.flush()
+
+    def flush(self):
+        """
+        Synchronously write every record currently in the queue.
+        """
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stop the background thread, flushing any queued records first.
+
+        Args:
+            timeout: Seconds to wait for the background thread to finish
+        """
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+        # Records submitted after the thread exited (or with no thread at all)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the writer counters, including the queue depth.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+_log_writer: Optional[LogWriter] = None
+_log_writer_lock = threading.Lock()
+
+def get_log_writer() -> LogWriter:
+    """
+    Get the process-wide LogWriter, creating it on first use.
+
+    Returns:
+        The shared LogWriter instance
+    """
+    global _log_writer
+
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                _log_writer = LogWriter()
+                # Scripts that never run the FastAPI lifespan still get their rows written
+                atexit.register(_log_writer.stop)
+
+    return _log_writer
@@ -0,0 +1,213 @@
+import asyncio
+import atexit
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+from app import config
+from app.database.db import SessionLocal
+from app.utils.logger import get_logger
+from app.utils.metrics import REGISTRY
+
+logger = get_logger("pipeline_executor")
+
+class BranchResults(dict):
+    """
+    Branch name -> result, as returned by PipelineExecutor.run() / arun().
+
+    `fallbacks` names the branches that failed or timed out and hold their
+    default instead of a real result.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fallbacks: List[str] = []
+
+    @property
+    def degraded(self) -> bool:
+        """
+        True when at least one branch fell back to its default.
+        """
+        return bool(self.fallbacks)
+
+class PipelineExecutor:
+    """
+    Runs independent retrieval steps of one request concurrently on a shared
+    thread pool, so the request waits for the slowest step rather than the
+    sum of all of them.
+
+    Each step ("branch") is a callable without arguments. A branch that
+    fails or does not finish within its timeout is replaced by its default,
+    so callers always get a full set of (possibly partial) results; the
+    names of the branches that fell back are in the results' `fallbacks`.
+    Branches must not fan out again on the same executor.
+
+    SQLAlchemy sessions cannot be shared between threads: branches that need
+    the database should be wrapped with with_session(), which gives each
+    branch its own session.
+    """
+
+    def __init__(self, max_workers: int = config.PIPELINE_MAX_WORKERS,
+                 timeout_ms: int = config.PIPELINE_BRANCH_TIMEOUT_MS,
+                 session_factory: Callable = SessionLocal):
+        self.max_workers = max_workers
+        self.timeout = timeout_ms / 1000.0
+        self.session_factory = session_factory
+        # With no workers every branch runs inline, one after the other
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") if max_workers > 0 else None
+        self._lock = threading.Lock()
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'runs': 0,
+            'branches': 0,
+            'timeouts': 0,
+            'errors': 0,
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def with_session(self, func: Callable, *args, **kwargs) -> Callable[[], Any]:
+        """
+        Wrap a DB-bound call as a branch that runs on its own session.
+
+        Args:
+            func: Called as func(*args, db=session, **kwargs)
+
+        Returns:
+            A branch callable for run() / arun()
+        """
+        def branch():
+            db = self.session_factory()
+            try:
+                return func(*args, db=db, **kwargs)
+            finally:
+                db.close()
+        return branch
+
+    def _fallback(self, results: BranchResults, name: str, defaults: Dict[str, Any],
+                  error: Optional[BaseException] = None) -> Any:
+        # error is None for a timeout
+        results.fallbacks.append(name)
+        if error is None:
+            self._count('timeouts')
+            logger.warning("Pipeline branch '%s' timed out, continuing without it", name)
+        else:
+            self._count('errors')
+            logger.error("Pipeline branch '%s' failed: %s", name, error)
+        return defaults.get(name)
+
+    def run(self, branches: Dict[str, Callable[[], Any]], defaults: Optional[Dict[str, Any]] = None,
+            timeouts: Optional[Dict[str, float]] = None) -> BranchResults:
+        """
+        Run branches concurrently and wait for all of them, up to their timeouts.
+
+        Args:
+            branches: Branch name -> callable
+            defaults: Branch name -> value used when the branch fails or times out (default None)
+            timeouts: Branch name -> timeout in seconds, overriding the executor default
+
+        Returns:
+            Branch name -> result, with the names of the branches that fell
+            back to their default in `fallbacks`
+        """
+        defaults = defaults or {}
+        timeouts = timeouts or {}
+        self._count('runs')
+        self._count('branches', len(branches))
+
+        results = BranchResults()
+        if self._pool is None:
+            for name, branch in branches.items():
+                try:
+                    results[name] = branch()
+                except Exception as e:
+                    results[name] = self._fallback(results, name, defaults, e)
+            return results
+
+        started = time.monotonic()
+        # Branches see the caller's context variables (e.g. request-scoped state)
+        futures = {name: self._pool.submit(contextvars.copy_context().run, branch) for name, branch in branches.items()}
+        for name, future in futures.items():
+            # Every timeout counts from the start, so branches overlap fully
+            remaining = max(0.0, started + timeouts.get(name, self.timeout) - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                results[name] = self._fallback(results, name, defaults)
+            except Exception as e:
+                results[name] = self._fallback(results, name, defaults, e)
+
+        return results
+
+    async def arun(self, branches: Dict[str, Callable[[], Any]], defaults: Optional[Dict[str, Any]] = None,
+                   timeouts: Optional[Dict[str, float]] = None) -> BranchResults:
+        """
+        Async variant of run(): the branches run on the thread pool while the
+        event loop keeps serving other requests.
+        """
+        defaults = defaults or {}
+        timeouts = timeouts or {}
+        self._count('runs')
+        self._count('branches', len(branches))
+
+        loop = asyncio.get_running_loop()
+
+        async def run_branch(name: str, branch: Callable[[], Any]) -> Any:
+            if self._pool is None:
+                return branch()
+            future = loop.run_in_executor(self._pool, contextvars.copy_context().run, branch)
+            return await asyncio.wait_for(future, timeout=timeouts.get(name, self.timeout))
+
+        names = list(branches)
+        outcomes = await asyncio.gather(*(run_branch(name, branches[name]) for name in names),
+                                        return_exceptions=True)
+
+        results = BranchResults()
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                results[name] = self._fallback(results, name, defaults)
+            elif isinstance(outcome, Exception):
+                results[name] = self._fallback(results, name, defaults, outcome)
+            else:
+                results[name] = outcome
+        return results
+
+    def shutdown(self):
+        """
+        Stop the worker threads once running branches finish.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the run/timeout/error counters.
+        """
+        with self._lock:
+            return dict(self.stats)
+
+_pipeline_executor: Optional[PipelineExecutor] = None
+_pipeline_executor_lock = threading.Lock()
+
+def get_pipeline_executor() -> PipelineExecutor:
+    """
+    Get the process-wide PipelineExecutor, creating it on first use.
+
+    Returns:
+        The shared PipelineExecutor instance
+    """
+    global _pipeline_executor
+
+    if _pipeline_executor is None:
+        with _pipeline_executor_lock:
+            if _pipeline_executor is None:
+                _pipeline_executor = PipelineExecutor()
+                atexit.register(_pipeline_executor.shutdown)
+                REGISTRY.register_collector('chatbot_pipeline', _pipeline_executor.get_stats)
+
+    return _pipeline_executor
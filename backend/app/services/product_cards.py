@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+from app import config
+from app.database.change_tracking import subscribe
+from app.database.models import Product
+from app.utils.metrics import REGISTRY
+
+# Product fields shown on a card; a card is re-rendered when any of them changes
+CARD_FIELDS = ('name', 'category', 'price', 'stock', 'description', 'features')
+
+_card_version = itemgetter(*CARD_FIELDS)
+
+def render_product_card(product: Dict) -> str:
+    """
+    Render the markdown block shown for a single product.
+
+    Args:
+        product: Product information dictionary
+
+    Returns:
+        Formatted product information string
+    """
+    parts = [
+        f"**{product['name']}**\n\n",
+        f"**Category:** {product['category']}\n",
+        f"**Price:** ${product['price']:.2f}\n",
+        f"**Availability:** {'In Stock' if product['stock'] > 0 else 'Out of Stock'}\n\n",
+        f"**Description:**\n{product['description']}\n\n",
+    ]
+
+    if product.get('features') and isinstance(product['features'], dict):
+        parts.append("**Features:**\n")
+        parts.extend(f"- {key.capitalize()}: {value}\n" for key, value in product['features'].items())
+
+    return "".join(parts)
+
+def render_listing_line(product: Dict) -> str:
+    """
+    Render a product's line in a multi-product listing, without its number.
+    """
+    return f"**{product['name']}** - ${product['price']:.2f}\n"
+
+def render_listing(lines: List[str]) -> str:
+    """
+    Number and join listing lines from render_listing_line().
+    """
+    return "".join([f"{i}. {line}" for i, line in enumerate(lines, 1)])
+
+class ProductCardCache:
+    """
+    Size-bounded LRU cache of rendered product cards and listing lines.
+
+    Entries are keyed by product ID and dropped when the Product row changes
+    through the ORM. Each entry also keeps the field values it was rendered
+    from, so products changed by other processes (and picked up by the
+    product index) are re-rendered instead of shown stale.
+    """
+
+    def __init__(self, max_entries: int = config.PRODUCT_CARD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Tuple[Tuple, str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def _entry(self, product: Dict) -> Tuple[Tuple, str, str]:
+        product_id = product.get('product_id')
+        version = _card_version(product)
+
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(product_id)
+                self.stats['hits'] += 1
+                return entry
+            self.stats['misses'] += 1
+
+        entry = (version, render_product_card(product), render_listing_line(product))
+        if product_id is None:
+            return entry
+
+        with self._lock:
+            self._entries[product_id] = entry
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return entry
+
+    def card(self, product: Dict) -> str:
+        """
+        Get the rendered card for a product.
+
+        Args:
+            product: Product information dictionary
+
+        Returns:
+            Formatted product information string
+        """
+        return self._entry(product)[1]
+
+    def listing(self, products: List[Dict]) -> str:
+        """
+        Get a numbered listing of several products.
+
+        Args:
+            products: Product information dictionaries, in display order
+
+        Returns:
+            One numbered line per product
+        """
+        return render_listing([self._entry(product)[2] for product in products])
+
+    def on_change(self, table_name: str, operation: str, instance: Any):
+        """
+        change_tracking listener: drop the card of a changed product.
+        """
+        if table_name != Product.__tablename__:
+            return
+        product_id = instance.__dict__.get('product_id')
+        with self._lock:
+            if self._entries.pop(product_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def clear(self):
+        """
+        Drop every cached card.
+        """
+        with self._lock:
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the cache counters and current size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+_product_card_cache: Optional[ProductCardCache] = None
+_product_card_cache_lock = threading.Lock()
+
+def get_product_card_cache() -> ProductCardCache:
+    """
+    Get the process-wide ProductCardCache, creating it on first use.
+
+    Returns:
+        The shared ProductCardCache instance
+    """
+    global _product_card_cache
+
+    if _product_card_cache is None:
+        with _product_card_cache_lock:
+            if _product_card_cache is None:
+                _product_card_cache = ProductCardCache()
+                subscribe(_product_card_cache.on_change)
+                REGISTRY.register_collector('chatbot_product_cards', _product_card_cache.get_stats)
+
+    return _product_card_cache
@@ -0,0 +1,541 @@
+import heapq
+import json
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from app import config
+from app.database.change_tracking import subscribe
+from app.database.db import SessionLocal
+from app.database.models import Product
+from app.utils.logger import get_logger
+from app.utils.metrics import REGISTRY
+
+logger = get_logger("product_index")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Words that say nothing about which product is meant
+STOPWORDS = frozenset("""
+    a about all an and any are as at be can could do does for from have how i
+    in is it me my of on or please show that the this to what which with you
+    your tell want would like know there
+""".split())
+
+# Term frequency multiplier per field (a name match counts most)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'description': 1.0,
+    'features': 1.0,
+}
+
+# Marks a changed product whose values have to be read from the database
+_RELOAD = object()
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms, dropping stopwords.
+    """
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def product_to_dict(product: Any) -> Dict:
+    """
+    Convert a Product row (or anything with its attributes) into the dict
+    the agents work with, with `features` parsed from its JSON text.
+    """
+    features = product.features
+    if isinstance(features, str):
+        try:
+            features = json.loads(features)
+        except ValueError:
+            features = {}
+    return {
+        'product_id': product.product_id,
+        'name': product.name,
+        'category': product.category,
+        'price': product.price,
+        'stock': product.stock,
+        'description': product.description,
+        'features': features or {},
+    }
+
+class ProductIndex:
+    """
+    In-memory inverted index over the products table with BM25 ranking.
+
+    The name, category, description and feature keys/values of every product
+    are tokenized into postings that store each product's precomputed BM25
+    term impact. A query sums its terms' impacts with NumPy over per-term
+    arrays of those postings, and very common terms only contribute their
+    `max_postings` highest impacts, which bounds the cost of a query
+    whatever the catalog size.
+
+    The index is built from the database on first use and then kept up to
+    date incrementally rather than rebuilt:
+        - Product changes made through the ORM in this process are applied
+          on the next search once their session commits; changes that are
+          rolled back are dropped (see app/database/change_tracking.py)
+        - every `refresh_interval` seconds, products with an ID above the
+          highest one indexed are loaded, which picks up rows inserted by
+          other processes
+    Updates and deletes made outside this process's ORM are picked up by
+    rebuild().
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    # Terms with more postings than this get their arrays built ahead of searches
+    WARM_POSTINGS = 1000
+    # Changed postings overlaid on a term's arrays before they are rebuilt
+    MAX_DELTA = 256
+
+    # Columns read to index a product
+    COLUMNS = (Product.product_id, Product.name, Product.category, Product.price,
+               Product.stock, Product.description, Product.features)
+
+    def __init__(self, session_factory: Callable = SessionLocal,
+                 refresh_interval: float = config.PRODUCT_INDEX_REFRESH_SECONDS,
+                 max_postings: int = config.PRODUCT_INDEX_MAX_POSTINGS):
+        """
+        Args:
+            session_factory: Creates the sessions used to read products
+            refresh_interval: Seconds between checks for new products (0 disables them)
+            max_postings: Most postings scored per query term
+        """
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self.max_postings = max_postings
+
+        # Products are stored in rows; rows of deleted products are reused
+        self._row_of: Dict[int, int] = {}
+        self._products: List[Optional[Dict]] = []
+        self._doc_terms: List[Optional[Dict[str, float]]] = []
+        self._doc_lengths: List[float] = []
+        self._free_rows: List[int] = []
+        self._total_length = 0.0
+        # Average length the stored impacts were computed with
+        self._impact_avgdl = 0.0
+
+        # term -> {row: impact}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # term -> (rows, impacts) arrays of its (truncated) postings, built on demand
+        self._term_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # term -> {row: new impact, or 0.0 if removed} since its arrays were built
+        self._term_deltas: Dict[str, Dict[int, float]] = {}
+
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._built = False
+        self._watermark = 0
+        self._next_refresh = 0.0
+        # product_id -> product dict, _RELOAD, or None for a delete
+        self._pending: Dict[int, Any] = {}
+        # Session.info key of the changes flushed by a session and not yet committed
+        self._session_key = ('product_index', id(self))
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'searches': 0,
+            'refreshes': 0,
+            'updates': 0,
+            'rebuilds': 0,
+        }
+
+    # Building and updating
+
+    def _load(self, query, bulk: bool = False) -> int:
+        count = 0
+        db = self.session_factory()
+        try:
+            for row in db.execute(query.execution_options(yield_per=1000)):
+                self._index(product_to_dict(row), bulk=bulk)
+                count += 1
+        finally:
+            db.close()
+        return count
+
+    def rebuild(self):
+        """
+        Rebuild the index from the products table.
+        """
+        started = time.monotonic()
+        with self._lock:
+            self._row_of.clear()
+            self._products.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._free_rows.clear()
+            self._total_length = 0.0
+            self._impact_avgdl = 0.0
+            self._postings.clear()
+            self._term_arrays.clear()
+            self._term_deltas.clear()
+            self._watermark = 0
+            self._pending.clear()
+
+            count = self._load(select(*self.COLUMNS).order_by(Product.product_id), bulk=True)
+            self._recompute_impacts()
+            self._warm_terms(self._postings)
+            self._built = True
+            self.stats['rebuilds'] += 1
+        logger.info("Indexed %d products in %.0f ms", count, (time.monotonic() - started) * 1000)
+
+    def _avgdl(self) -> float:
+        return self._total_length / len(self._row_of) if self._row_of else 0.0
+
+    def _impact(self, frequency: float, length: float, avgdl: float) -> float:
+        norm = self.K1 * (1 - self.B + self.B * length / avgdl) if avgdl else self.K1
+        return frequency * (self.K1 + 1) / (frequency + norm)
+
+    def _recompute_impacts(self):
+        avgdl = self._avgdl()
+        k1, postings = self.K1, self._postings
+        for row in self._row_of.values():
+            # Same as _impact(), inlined because this runs for every posting
+            norm = k1 * (1 - self.B + self.B * self._doc_lengths[row] / avgdl) if avgdl else k1
+            for term, frequency in self._doc_terms[row].items():
+                postings[term][row] = frequency * (k1 + 1) / (frequency + norm)
+        self._term_arrays.clear()
+        self._term_deltas.clear()
+        self._impact_avgdl = avgdl
+
+    def _warm_terms(self, terms):
+        # Build the arrays of common terms now rather than in the first
+        # search that needs them
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None and len(postings) > self.WARM_POSTINGS:
+                self._term_array(term, postings)
+
+    def _index(self, product: Dict, bulk: bool = False):
+        product_id = product['product_id']
+        if product_id in self._row_of:
+            self._remove(product_id)
+
+        terms: Dict[str, float] = {}
+        features = product.get('features') or {}
+        fields = {
+            'name': product.get('name') or '',
+            'category': product.get('category') or '',
+            'description': product.get('description') or '',
+            'features': " ".join(f"{key} {value}" for key, value in features.items())
+                        if isinstance(features, dict) else str(features),
+        }
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                terms[token] = terms.get(token, 0.0) + weight
+        length = sum(terms.values())
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._products[row] = product
+            self._doc_terms[row] = terms
+            self._doc_lengths[row] = length
+        else:
+            row = len(self._products)
+            self._products.append(product)
+            self._doc_terms.append(terms)
+            self._doc_lengths.append(length)
+        self._row_of[product_id] = row
+        self._total_length += length
+        self._watermark = max(self._watermark, product_id)
+
+        if bulk:
+            # Impacts are computed for all products once loading finishes
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[row] = frequency
+            return
+
+        avgdl = self._impact_avgdl or self._avgdl()
+        for term, frequency in terms.items():
+            impact = self._impact(frequency, length, avgdl)
+            self._postings.setdefault(term, {})[row] = impact
+            self._add_delta(term, row, impact)
+
+    def _remove(self, product_id: int):
+        row = self._row_of.pop(product_id, None)
+        if row is None:
+            return
+        for term in self._doc_terms[row]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._postings[term]
+            self._add_delta(term, row, 0.0)
+        self._total_length -= self._doc_lengths[row]
+        self._products[row] = None
+        self._doc_terms[row] = None
+        self._doc_lengths[row] = 0.0
+        self._free_rows.append(row)
+
+    def on_change(self, table_name: str, operation: str, instance: Any):
+        """
+        change_tracking listener: record a changed product for the next search.
+
+        Runs inside the session's flush, so it only records the change; the
+        values are taken from the instance when they are all loaded and
+        read from the database otherwise. The change is kept on the session
+        until it commits (see on_commit()), so a rolled-back change is never
+        indexed.
+        """
+        if table_name != Product.__tablename__:
+            return
+        product_id = instance.__dict__.get('product_id')
+        if product_id is None:
+            return
+
+        if operation == 'delete':
+            change = None
+        else:
+            loaded = instance.__dict__
+            columns = ('name', 'category', 'price', 'stock', 'description', 'features')
+            change = product_to_dict(instance) if all(column in loaded for column in columns) else _RELOAD
+
+        session = object_session(instance)
+        if session is None:
+            with self._lock:
+                self._pending[product_id] = change
+            return
+        session.info.setdefault(self._session_key, {})[product_id] = change
+
+    def on_commit(self, session: Session):
+        """
+        Session after_commit hook: queue the session's product changes for the next search.
+        """
+        changes = session.info.pop(self._session_key, None)
+        if changes:
+            with self._lock:
+                self._pending.update(changes)
+
+    def on_rollback(self, session: Session):
+        """
+        Session after_rollback hook: forget the session's uncommitted product changes.
+        """
+        session.info.pop(self._session_key, None)
+
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        reload_ids = [product_id for product_id, change in pending.items() if change is _RELOAD]
+        reloaded = {}
+        if reload_ids:
+            db = self.session_factory()
+            try:
+                for row in db.execute(select(*self.COLUMNS).where(Product.product_id.in_(reload_ids))):
+                    reloaded[row.product_id] = product_to_dict(row)
+            finally:
+                db.close()
+
+        with self._lock:
+            for product_id, change in pending.items():
+                if change is _RELOAD:
+                    change = reloaded.get(product_id)
+                if change is None:
+                    self._remove(product_id)
+                else:
+                    self._index(change)
+                self.stats['updates'] += 1
+            self._check_drift()
+
+    def _load_new(self):
+        with self._lock:
+            query = select(*self.COLUMNS).where(Product.product_id > self._watermark).order_by(Product.product_id)
+            count = self._load(query)
+            if count:
+                logger.info("Indexed %d new products", count)
+                self._check_drift()
+            self.stats['refreshes'] += 1
+
+    def _check_drift(self):
+        # Stored impacts assume the average length at the time; recompute
+        # them once the catalog has drifted noticeably from it
+        if not self._impact_avgdl or abs(self._avgdl() - self._impact_avgdl) > 0.1 * self._impact_avgdl:
+            self._recompute_impacts()
+            self._warm_terms(self._postings)
+
+    def refresh(self):
+        """
+        Apply queued product changes and, when due, load newly inserted
+        products. Builds the index on first use.
+        """
+        if not self._built:
+            with self._refresh_lock:
+                if not self._built:
+                    self.rebuild()
+                    self._next_refresh = time.monotonic() + self.refresh_interval
+            return
+
+        if self._pending:
+            self._apply_pending()
+
+        if self.refresh_interval > 0 and time.monotonic() >= self._next_refresh:
+            # Only one thread checks; the others search the current index
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._next_refresh = time.monotonic() + self.refresh_interval
+                    self._load_new()
+                except Exception as e:
+                    logger.error("Error refreshing the product index: %s", e)
+                finally:
+                    self._refresh_lock.release()
+
+    def build_in_background(self):
+        """
+        Start building the index on a background thread, so the first
+        search does not have to wait for a large catalog to be indexed.
+        """
+        def build():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Error building the product index: %s", e)
+
+        threading.Thread(target=build, name="product-index", daemon=True).start()
+
+    # Searching
+
+    def _add_delta(self, term: str, row: int, impact: float):
+        # Changes to a term with built arrays are overlaid on them at search
+        # time, so an update does not rebuild arrays of common terms
+        if term in self._term_arrays:
+            self._term_deltas.setdefault(term, {})[row] = impact
+
+    def _term_array(self, term: str, postings: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._term_arrays.get(term)
+        delta = self._term_deltas.get(term)
+        if arrays is None or (delta and len(delta) > self.MAX_DELTA):
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            impacts = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            if len(rows) > self.max_postings:
+                top = np.argpartition(impacts, -self.max_postings)[-self.max_postings:]
+                rows, impacts = rows[top], impacts[top]
+            arrays = (rows, impacts)
+            self._term_arrays[term] = arrays
+            self._term_deltas.pop(term, None)
+            return arrays
+
+        if not delta:
+            return arrays
+        rows, impacts = arrays
+        delta_rows = np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))
+        delta_impacts = np.fromiter(delta.values(), dtype=np.float64, count=len(delta))
+        keep = ~np.isin(rows, delta_rows)
+        added = delta_impacts > 0
+        return (np.concatenate((rows[keep], delta_rows[added])),
+                np.concatenate((impacts[keep], delta_impacts[added])))
+
+    def search(self, query: str, limit: int = config.PRODUCT_SEARCH_LIMIT) -> List[Dict]:
+        """
+        Find the products that best match a query.
+
+        Args:
+            query: The search text
+            limit: Most products returned
+
+        Returns:
+            Product dicts, best match first, each with its 'score'
+        """
+        self.refresh()
+        terms = set(tokenize(query))
+
+        with self._lock:
+            self.stats['searches'] += 1
+            count = len(self._row_of)
+            all_rows, all_weights = [], []
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                rows, impacts = self._term_array(term, postings)
+                all_rows.append(rows)
+                all_weights.append(impacts * idf)
+            if not all_rows or limit <= 0:
+                return []
+
+            rows = np.concatenate(all_rows)
+            scores = np.bincount(rows, weights=np.concatenate(all_weights), minlength=len(self._products))
+
+            # A product appears at most once per term, so the best
+            # limit * terms entries hold at least `limit` distinct products
+            candidates = scores[rows]
+            keep = min(len(rows), limit * len(all_rows))
+            if keep < len(rows):
+                rows = rows[np.argpartition(-candidates, keep - 1)[:keep]]
+            best = sorted(set(rows.tolist()), key=lambda row: (-scores[row], row))[:limit]
+            return [dict(self._products[row], score=round(float(scores[row]), 4)) for row in best]
+
+    def get(self, product_id: int, refresh: bool = True) -> Optional[Dict]:
+        """
+        Get an indexed product by ID.
+
+        Args:
+            product_id: The product ID
+            refresh: Build the index or apply pending changes first if
+                needed; pass False where no query may run, e.g. in a flush
+
+        Returns:
+            The product dict, or None if the product is not indexed
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            row = self._row_of.get(product_id)
+            return dict(self._products[row]) if row is not None else None
+
+    def first(self, limit: int) -> List[Dict]:
+        """
+        Get the products with the lowest IDs, e.g. to show a few on a greeting.
+        """
+        self.refresh()
+        with self._lock:
+            return [dict(self._products[self._row_of[product_id]])
+                    for product_id in heapq.nsmallest(limit, self._row_of)]
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the index counters and size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['documents'] = len(self._row_of)
+            stats['terms'] = len(self._postings)
+            return stats
+
+_product_index: Optional[ProductIndex] = None
+_product_index_lock = threading.Lock()
+
+def get_product_index() -> ProductIndex:
+    """
+    Get the process-wide ProductIndex, creating it on first use.
+
+    Returns:
+        The shared ProductIndex instance (built on its first search)
+    """
+    global _product_index
+
+    if _product_index is None:
+        with _product_index_lock:
+            if _product_index is None:
+                _product_index = ProductIndex()
+                subscribe(_product_index.on_change)
+                event.listen(Session, 'after_commit', _product_index.on_commit)
+                event.listen(Session, 'after_rollback', _product_index.on_rollback)
+                REGISTRY.register_collector('chatbot_product_index', _product_index.get_stats)
+
+    return _product_index
@@ -1,85 +1,286 @@
-from typing import Dict, Optional, Any
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import ChatLog, UserInteraction
-from app.agents.guard_agent import GuardAgent
-from app.agents.classification_agent import ClassificationAgent
-from app.agents.order_agent import OrderAgent
-from app.agents.details_agent import DetailsAgent
-from app.agents.recommendation_agent import RecommendationAgent
+from app.database.change_tracking import catalog_version
+from app import config
+from app.services.agent_registry import AgentRegistry, get_agent_registry
+from app.services.log_writer import LogWriter, get_log_writer
+from app.services.session_store import SessionStore, InMemorySessionStore, create_session_store
+from app.services.response_cache import ResponseCache
+from app.utils.logger import get_logger, get_stats as get_logger_stats
+from app.utils.metrics import REGISTRY, StageTimer
+
+logger = get_logger("query_handler")
 
 class QueryHandler:
     """
     Main handler for processing user queries through the agent pipeline.
+
+    A single QueryHandler is shared by all requests. The agents come from the
+    process-wide AgentRegistry and the DB session is passed to each call.
+    Audit rows go through `log_writer` when one is given, otherwise they are
+    committed on the request's own session. Conversation state lives in
+    `session_store`, keyed by session ID.
     """
     
-    def __init__(self, db: Optional[Session] = None, faiss_index=None):
-        self.db = db
+    def __init__(self, registry: Optional[AgentRegistry] = None, log_writer: Optional[LogWriter] = None,
+                 session_store: Optional[SessionStore] = None, response_cache: Optional[ResponseCache] = None):
+        self.registry = registry or get_agent_registry()
+        self.log_writer = log_writer
+        
+        # Conversation state (e.g. an order in progress) keyed by session ID
+        self.session_store = session_store or InMemorySessionStore()
+        
+        # Opt-in cache for answers that do not depend on the session
+        self.response_cache = response_cache
+        
+        # Every message goes through these two; the agent that answers is
+        # looked up in the registry per message (see _agent_for)
+        self.guard_agent = self.registry.guard_agent
+        self.classification_agent = self.registry.classification_agent
+    
+    def _write_log(self, db: Session, record: Any, label: str):
+        """
+        Persist an audit row, via the write-behind writer when one is configured.
+        
+        Args:
+            db: The database session
+            record: The ORM object to persist
+            label: What is being logged (for error messages)
+        """
+        if self.log_writer is not None:
+            # Group-committed by the background writer, off the request path
+            self.log_writer.submit(record)
+            return
         
-        # Initialize agents
-        self.guard_agent = GuardAgent()
-        self.classification_agent = ClassificationAgent()
-        self.order_agent = OrderAgent(db=self.db)
-        self.details_agent = DetailsAgent(db=self.db)
-        self.recommendation_agent = RecommendationAgent(db=self.db)
+        try:
+            db.add(record)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error("Error logging %s: %s", label, e)
+    
+    async def _awrite_log(self, db: AsyncSession, record: Any, label: str):
+        """
+        Async variant of _write_log() for the asyncio pipeline.
+        """
+        if self.log_writer is not None:
+            self.log_writer.submit(record)
+            return
         
-        # Store conversation context
-        self.contexts = {}
+        try:
+            db.add(record)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error("Error logging %s: %s", label, e)
     
-    def _log_interaction(self, user_id: int, message: str, intent: str, response: str):
+    def _log_interaction(self, db: Optional[Session], user_id: int, message: str, intent: str, response: str):
         """
         Log user interaction in the database.
         
         Args:
+            db: The database session
             user_id: The user ID
             message: The user message
             intent: The classified intent
             response: The agent response
         """
-        if not self.db:
+        if not db:
             return
         
-        try:
-            # Log to UserInteraction table
-            interaction = UserInteraction(
-                user_id=user_id,
-                query_text=message,
-                intent=intent,
-                response=response
-            )
-            self.db.add(interaction)
-            self.db.commit()
-        except Exception as e:
-            self.db.rollback()
-            print(f"Error logging interaction: {e}")
+        # Log to UserInteraction table
+        interaction = UserInteraction(
+            user_id=user_id,
+            query_text=message,
+            intent=intent,
+            response=response
+        )
+        self._write_log(db, interaction, 'interaction')
     
-    def _log_chat(self, user_id: int, agent_name: str, message: str, response: str):
+    def _log_chat(self, db: Optional[Session], user_id: int, agent_name: str, message: str, response: str):
         """
         Log chat message in the database.
         
         Args:
+            db: The database session
             user_id: The user ID
             agent_name: The name of the agent that processed the message
             message: The user message
             response: The agent response
         """
-        if not self.db:
+        if not db:
             return
         
-        try:
-            # Log to ChatLog table
-            chat_log = ChatLog(
-                user_id=user_id,
-                agent_name=agent_name,
-                message=message,
-                response=response
-            )
-            self.db.add(chat_log)
-            self.db.commit()
-        except Exception as e:
-            self.db.rollback()
-            print(f"Error logging chat: {e}")
+        # Log to ChatLog table
+        chat_log = ChatLog(
+            user_id=user_id,
+            agent_name=agent_name,
+            message=message,
+            response=response
+        )
+        self._write_log(db, chat_log, 'chat')
+    
+    async def _alog_interaction(self, db: Optional[AsyncSession], user_id: int, message: str, intent: str, response: str):
+        """
+        Async variant of _log_interaction() for the asyncio pipeline.
+        """
+        if not db:
+            return
+        
+        interaction = UserInteraction(
+            user_id=user_id,
+            query_text=message,
+            intent=intent,
+            response=response
+        )
+        await self._awrite_log(db, interaction, 'interaction')
+    
+    async def _alog_chat(self, db: Optional[AsyncSession], user_id: int, agent_name: str, message: str, response: str):
+        """
+        Async variant of _log_chat() for the asyncio pipeline.
+        """
+        if not db:
+            return
+        
+        chat_log = ChatLog(
+            user_id=user_id,
+            agent_name=agent_name,
+            message=message,
+            response=response
+        )
+        await self._awrite_log(db, chat_log, 'chat')
     
-    def process_query(self, message: str, user_id: Optional[int] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    def _new_result(self, message: str) -> Dict[str, Any]:
+        """
+        Build the default result dictionary for a message.
+        """
+        return {
+            'status': 'success',
+            'message': message,
+            'response': '',
+            'intent': 'unknown',
+            'agent': 'details_agent',  # Default to details agent
+            'additional_data': {}
+        }
+    
+    def _apply_rejection(self, result: Dict[str, Any], guard_result: Dict) -> Dict[str, Any]:
+        """
+        Fill in the result for a message rejected by the Guard Agent.
+        """
+        result['status'] = 'rejected'
+        result['response'] = guard_result['message']
+        result['agent'] = 'guard_agent'
+        result['additional_data'] = {'reason': guard_result.get('reason')}
+        return result
+    
+    def _apply_classification(self, result: Dict[str, Any], classification_result: Dict) -> Dict[str, Any]:
+        """
+        Copy the classified intent and agent onto the result.
+        """
+        result['intent'] = classification_result['intent']
+        result['agent'] = classification_result['agent']
+        return result
+    
+    def _apply_agent(self, result: Dict[str, Any], agent_name: str, agent_result: Dict) -> Dict[str, Any]:
+        """
+        Copy the answering agent's response onto the result.
+        """
+        result['agent'] = agent_name
+        result['response'] = agent_result['response']
+        result['additional_data'] = agent_result.get('additional_data', {})
+        return result
+    
+    def _order_in_progress(self, session: Dict) -> bool:
+        """
+        Check whether the session is part-way through an order.
+        """
+        state = session.get('order', {}).get('state', 'init')
+        return state not in ('init', 'complete')
+    
+    def _agent_for(self, result: Dict[str, Any], session: Dict) -> str:
+        """
+        Pick the agent that answers a classified message.
+
+        Follow-up answers such as a quantity or an address do not classify as
+        'order', so a session with an order in progress keeps going to the
+        Order Agent until the order completes or is canceled. Otherwise the
+        classified agent answers, falling back to the Details Agent when no
+        agent is registered under that name.
+        """
+        if self._order_in_progress(session):
+            return 'order_agent'
+        agent_name = result['agent']
+        if agent_name not in self.registry:
+            logger.warning("No agent registered as '%s', using details_agent", agent_name)
+            return 'details_agent'
+        return agent_name
+    
+    def _response_cache_key(self, message: str, session: Dict) -> Optional[Tuple]:
+        """
+        Build the response cache key for a message.
+
+        Guard rejections and answers from CACHEABLE agents depend only on
+        the stripped message (and on whether the raw message is over the
+        length limit), so that is the key. Returns None when the cache is
+        disabled or the answer depends on the session's order in progress.
+        """
+        if self.response_cache is None or self._order_in_progress(session):
+            return None
+        return (message.strip(), len(message) > self.guard_agent.MAX_MESSAGE_LENGTH)
+    
+    def _cacheable(self, agent: Any, agent_result: Dict) -> bool:
+        """
+        Check whether an agent's answer may be stored in the response cache.
+
+        Degraded answers (e.g. built after a search timed out) are served
+        but not cached, so the next identical message tries again.
+        """
+        return getattr(agent, 'CACHEABLE', False) and not agent_result.get('degraded', False)
+    
+    def _remember(self, cache_key: Optional[Tuple], cache_version: int, result: Dict[str, Any]):
+        """
+        Store a guard rejection or a CACHEABLE agent's result in the response cache.
+
+        `cache_version` is the catalog version read before the result was
+        computed, so a result built from a catalog that has since changed is
+        not stored.
+        """
+        if cache_key is None:
+            return
+        self.response_cache.set(cache_key, version=cache_version, value={
+            'status': result['status'],
+            'response': result['response'],
+            'intent': result['intent'],
+            'agent': result['agent'],
+            'additional_data': result['additional_data']
+        })
+    
+    def _agent_error_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Turn the result into an error response after an agent failure.
+        """
+        result['status'] = 'error'
+        result['response'] = "I'm sorry, but I encountered an error while processing your request. Please try again."
+        return result
+    
+    def _unhandled_error_result(self, message: str) -> Dict[str, Any]:
+        """
+        Build the response returned when the pipeline fails unexpectedly.
+        """
+        return {
+            'status': 'error',
+            'message': message,
+            'response': "I'm sorry, but I encountered an unexpected error. Please try again later.",
+            'intent': 'error',
+            'agent': 'error',
+            'additional_data': {}
+        }
+    
+    def process_query(self, message: str, user_id: Optional[int] = None, session_id: Optional[str] = None,
+                      db: Optional[Session] = None) -> Dict[str, Any]:
         """
         Process a user query through the agent pipeline.
 
@@ -87,11 +288,22 @@ class QueryHandler:
             message: The user message
             user_id: The user ID (optional)
             session_id: The session ID for maintaining context (optional)
+            db: The database session for this request (optional)
             
         Returns:
             Dict containing the response and additional information
         """
-        print(f"\n[QueryHandler] Processing message: '{message}'")
+        timer = StageTimer()
+        result = self._run_query(message, user_id, session_id, db, timer)
+        timer.record(result['agent'], result['intent'], result['status'])
+        return result
+    
+    def _run_query(self, message: str, user_id: Optional[int], session_id: Optional[str],
+                   db: Optional[Session], timer: StageTimer) -> Dict[str, Any]:
+        """
+        Body of process_query(), charging each stage to `timer`.
+        """
+        logger.debug("Processing message", extra={'session_id': session_id, 'chars': len(message)})
         
         try:
             # Use a default user ID if not provided
@@ -102,29 +314,45 @@ class QueryHandler:
             if session_id is None:
                 session_id = str(user_id)
 
+            # Load this session's conversation state
+            session = self.session_store.get(session_id) or {}
+            timer.mark('session_load')
+
             # Initialize result dictionary
-            result = {
-                'status': 'success',
-                'message': message,
-                'response': '',
-                'intent': 'unknown',
-                'agent': 'details_agent',  # Default to details agent
-                'additional_data': {}
-            }
+            result = self._new_result(message)
+            
+            # Serve deterministic answers from the response cache; the
+            # interaction is still logged like any other
+            cache_key = self._response_cache_key(message, session)
+            cache_version = catalog_version()
+            cached = self.response_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                timer.mark('cache')
+                result.update(cached)
+                if result['status'] == 'rejected':
+                    self._log_chat(db, user_id, 'guard_agent', message, result['response'])
+                else:
+                    session['last_intent'] = result['intent']
+                    self.session_store.set(session_id, session)
+                    self._log_interaction(db, user_id, message, result['intent'], result['response'])
+                    self._log_chat(db, user_id, result['agent'], message, result['response'])
+                timer.mark('logging')
+                return result
             
             # Step 1: Guard Agent - Filter inappropriate content
             guard_result = self.guard_agent.process(message)
+            timer.mark('guard')
 
             if guard_result['status'] == 'rejected':
-                result['status'] = 'rejected'
-                result['response'] = guard_result['message']
-                result['agent'] = 'guard_agent'
+                self._apply_rejection(result, guard_result)
+                self._remember(cache_key, cache_version, result)
                 
                 # Log the rejected interaction
                 try:
-                    self._log_chat(user_id, 'guard_agent', message, guard_result['message'])
+                    self._log_chat(db, user_id, 'guard_agent', message, guard_result['message'])
                 except Exception as e:
-                    print(f"Error logging rejected message: {e}")
+                    logger.error("Error logging rejected message: %s", e)
+                timer.mark('logging')
                 
                 return result
 
@@ -133,47 +361,361 @@ class QueryHandler:
 
             # Step 2: Classification Agent - Determine intent
             classification_result = self.classification_agent.process(filtered_message)
+            self._apply_classification(result, classification_result)
+            intent = result['intent']
+            timer.mark('classification')
 
-            intent = classification_result['intent']
-            agent_name = classification_result['agent']
-
-            result['intent'] = intent
-            result['agent'] = agent_name
-
-            # Step 3: Route to appropriate agent based on intent
+            # Step 3: Route to the agent for this intent
             try:
-                # For simplicity, we'll just use the Details Agent for now
-                details_result = self.details_agent.process(filtered_message)
+                handled_by = self._agent_for(result, session)
+                agent = self.registry.get(handled_by)
+                agent_result = agent.handle(filtered_message, session, user_id=user_id, db=db)
+                self._apply_agent(result, handled_by, agent_result)
+                if self._cacheable(agent, agent_result):
+                    self._remember(cache_key, cache_version, result)
+                timer.mark('agent')
                 
-                # Set response
-                result['response'] = details_result['response']
-                result['additional_data'] = {
-                    'products': details_result['products'],
-                    'faqs': details_result['faqs']
-                }
+                # Save the updated conversation state
+                session['last_intent'] = intent
+                self.session_store.set(session_id, session)
+                timer.mark('session_save')
                 
                 # Log the interaction
                 try:
-                    self._log_interaction(user_id, message, intent, result['response'])
-                    self._log_chat(user_id, 'details_agent', message, result['response'])
+                    self._log_interaction(db, user_id, message, intent, result['response'])
+                    self._log_chat(db, user_id, handled_by, message, result['response'])
                 except Exception as e:
-                    print(f"Error logging interaction: {e}")
+                    logger.error("Error logging interaction: %s", e)
+                timer.mark('logging')
                 
                 return result
                 
             except Exception as e:
-                print(f"Error in agent processing: {e}")
-                result['status'] = 'error'
-                result['response'] = "I'm sorry, but I encountered an error while processing your request. Please try again."
-                return result
+                logger.exception("Error in agent processing")
+                return self._agent_error_result(result)
+                
+        except Exception as e:
+            logger.exception("Unhandled error")
+            return self._unhandled_error_result(message)
+    
+    def process_batch(self, requests: List[Dict[str, Any]], db: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Process many chat messages through the agent pipeline stage by stage.
+
+        Each stage (guard, classification, and the answering agents that have
+        a handle_batch() path) runs once over the whole batch instead of once
+        per message, and every log row is written in a single transaction.
+        Other agents, such as the Order Agent whose steps depend on the
+        previous one, handle their messages one at a time, in order.
+
+        Args:
+            requests: Dicts with 'message' and optional 'user_id' / 'session_id'
+            db: The database session (optional)
+
+        Returns:
+            One dict per request, in order, with:
+                - 'status': 'ok' or 'error'
+                - 'result': The process_query() style result (if ok)
+                - 'error': The error message (if error)
+        """
+        items: List[Dict[str, Any]] = []
+        for request in requests:
+            user_id = request.get('user_id')
+            if user_id is None:
+                user_id = 1  # Anonymous user
+            session_id = request.get('session_id')
+            if session_id is None:
+                session_id = str(user_id)
+            items.append({
+                'message': request['message'],
+                'user_id': user_id,
+                'session_id': session_id,
+                'result': self._new_result(request['message']),
+                'error': None
+            })
+
+        log_rows = []
+        sessions: Dict[str, Dict] = {}
+
+        # Step 1: Guard Agent over the whole batch
+        guard_results = self.guard_agent.process_batch([item['message'] for item in items])
+        accepted = []
+        for item, guard_result in zip(items, guard_results):
+            if guard_result['status'] == 'rejected':
+                self._apply_rejection(item['result'], guard_result)
+                log_rows.append(ChatLog(user_id=item['user_id'], agent_name='guard_agent',
+                                        message=item['message'], response=guard_result['message']))
+            else:
+                item['filtered_message'] = guard_result['filtered_message']
+                accepted.append(item)
+
+        # Step 2: Classification Agent over the accepted messages
+        classification_results = self.classification_agent.process_batch(
+            [item['filtered_message'] for item in accepted]
+        )
+        batched: Dict[str, List[Dict[str, Any]]] = {}
+        for item, classification_result in zip(accepted, classification_results):
+            self._apply_classification(item['result'], classification_result)
+            session_id = item['session_id']
+            if session_id not in sessions:
+                sessions[session_id] = self.session_store.get(session_id) or {}
+            session = sessions[session_id]
+
+            agent_name = self._agent_for(item['result'], session)
+            agent = self.registry.get(agent_name)
+            if hasattr(agent, 'handle_batch'):
+                batched.setdefault(agent_name, []).append(item)
+                continue
+
+            # Step 3a: Agents without a batch path run in message order, since
+            # e.g. each order step decides where the session's next message goes
+            try:
+                agent_result = agent.handle(item['filtered_message'], session, user_id=item['user_id'], db=db)
+                self._apply_agent(item['result'], agent_name, agent_result)
+                item['handled_by'] = agent_name
+            except Exception as e:
+                item['error'] = str(e)
+
+        # Step 3b: One call per batch-capable agent for the rest of the batch
+        for agent_name, agent_items in batched.items():
+            try:
+                agent_results = self.registry.get(agent_name).handle_batch(
+                    [item['filtered_message'] for item in agent_items], db=db
+                )
+                for item, agent_result in zip(agent_items, agent_results):
+                    self._apply_agent(item['result'], agent_name, agent_result)
+                    item['handled_by'] = agent_name
+            except Exception as e:
+                for item in agent_items:
+                    item['error'] = str(e)
+
+        # Save session state and collect the log rows for every answered message
+        for item in accepted:
+            if item['error'] is not None:
+                continue
+            session = sessions[item['session_id']]
+            session['last_intent'] = item['result']['intent']
+            result = item['result']
+            log_rows.append(UserInteraction(user_id=item['user_id'], query_text=item['message'],
+                                            intent=result['intent'], response=result['response']))
+            log_rows.append(ChatLog(user_id=item['user_id'], agent_name=item['handled_by'],
+                                    message=item['message'], response=result['response']))
+        for session_id, session in sessions.items():
+            self.session_store.set(session_id, session)
+
+        # Step 4: All log rows in one transaction
+        if db and log_rows:
+            try:
+                db.add_all(log_rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error("Error logging batch of %d rows: %s", len(log_rows), e)
+
+        return [
+            {'status': 'error', 'result': None, 'error': item['error']} if item['error'] is not None
+            else {'status': 'ok', 'result': item['result'], 'error': None}
+            for item in items
+        ]
+    
+    def _decision(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract the routing decision that is streamed before the response.
+        """
+        return {
+            'status': result['status'],
+            'intent': result['intent'],
+            'agent': result['agent']
+        }
+    
+    async def astream_query(self, message: str, user_id: Optional[int] = None, session_id: Optional[str] = None,
+                            db: Optional[AsyncSession] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Process a user query through the agent pipeline, yielding events as
+        soon as each stage produces them. DB I/O is awaited instead of
+        blocking a worker thread.
+
+        Args:
+            message: The user message
+            user_id: The user ID (optional)
+            session_id: The session ID for maintaining context (optional)
+            db: The async database session for this request (optional)
+            
+        Yields:
+            (event, data) tuples:
+                - ('decision', {'status', 'intent', 'agent'}) once the message is screened and classified
+                - ('chunk', {'text': ...}) for each piece of the response, in order
+                - ('done', result) last, with the same result dictionary as process_query()
+        """
+        timer = StageTimer()
+        async for event, data in self._astream(message, user_id, session_id, db, timer):
+            if event == 'done':
+                timer.record(data['agent'], data['intent'], data['status'])
+            yield event, data
+    
+    async def _astream(self, message: str, user_id: Optional[int], session_id: Optional[str],
+                       db: Optional[AsyncSession], timer: StageTimer) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Body of astream_query(), charging each stage to `timer`.
+        """
+        logger.debug("Processing message", extra={'session_id': session_id, 'chars': len(message)})
+        
+        try:
+            if user_id is None:
+                user_id = 1  # Anonymous user
+
+            if session_id is None:
+                session_id = str(user_id)
+
+            session = await self.session_store.aget(session_id) or {}
+            timer.mark('session_load')
+
+            result = self._new_result(message)
+            
+            cache_key = self._response_cache_key(message, session)
+            cache_version = catalog_version()
+            cached = self.response_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                timer.mark('cache')
+                result.update(cached)
+                yield 'decision', self._decision(result)
+                yield 'chunk', {'text': result['response']}
+                if result['status'] == 'rejected':
+                    await self._alog_chat(db, user_id, 'guard_agent', message, result['response'])
+                else:
+                    session['last_intent'] = result['intent']
+                    await self.session_store.aset(session_id, session)
+                    await self._alog_interaction(db, user_id, message, result['intent'], result['response'])
+                    await self._alog_chat(db, user_id, result['agent'], message, result['response'])
+                timer.mark('logging')
+                yield 'done', result
+                return
+            
+            # Step 1: Guard Agent - Filter inappropriate content
+            guard_result = await self.guard_agent.aprocess(message)
+            timer.mark('guard')
+
+            if guard_result['status'] == 'rejected':
+                self._apply_rejection(result, guard_result)
+                self._remember(cache_key, cache_version, result)
+                yield 'decision', self._decision(result)
+                yield 'chunk', {'text': result['response']}
+                await self._alog_chat(db, user_id, 'guard_agent', message, guard_result['message'])
+                timer.mark('logging')
+                yield 'done', result
+                return
+
+            filtered_message = guard_result['filtered_message']
+
+            # Step 2: Classification Agent - Determine intent
+            classification_result = await self.classification_agent.aprocess(filtered_message)
+            self._apply_classification(result, classification_result)
+            intent = result['intent']
+            timer.mark('classification')
+
+            handled_by = self._agent_for(result, session)
+            result['agent'] = handled_by
+
+            # Tell the client who is answering before the answer is ready
+            yield 'decision', self._decision(result)
+
+            # Step 3: Route to the agent for this intent
+            try:
+                agent = self.registry.get(handled_by)
+                if hasattr(agent, 'astream'):
+                    # Stream the response while it is being formatted
+                    agent_result = None
+                    first = True
+                    async for item in agent.astream(filtered_message, session, user_id=user_id, db=db):
+                        if isinstance(item, dict):
+                            agent_result = item
+                            continue
+                        if first:
+                            timer.mark('agent')
+                            first = False
+                        yield 'chunk', {'text': item}
+                    self._apply_agent(result, handled_by, agent_result)
+                    timer.mark('streaming')
+                else:
+                    agent_result = await agent.ahandle(filtered_message, session, user_id=user_id, db=db)
+                    self._apply_agent(result, handled_by, agent_result)
+                    timer.mark('agent')
+                    yield 'chunk', {'text': result['response']}
+                
+                if self._cacheable(agent, agent_result):
+                    self._remember(cache_key, cache_version, result)
+                
+                session['last_intent'] = intent
+                await self.session_store.aset(session_id, session)
+                timer.mark('session_save')
+                
+                await self._alog_interaction(db, user_id, message, intent, result['response'])
+                await self._alog_chat(db, user_id, handled_by, message, result['response'])
+                timer.mark('logging')
+                
+                yield 'done', result
+                
+            except Exception as e:
+                logger.exception("Error in agent processing")
+                yield 'done', self._agent_error_result(result)
                 
         except Exception as e:
-            print(f"Unhandled error: {e}")
-            return {
-                'status': 'error',
-                'message': message,
-                'response': "I'm sorry, but I encountered an unexpected error. Please try again later.",
-                'intent': 'error',
-                'agent': 'error',
-                'additional_data': {}
-            }
+            logger.exception("Unhandled error")
+            yield 'done', self._unhandled_error_result(message)
+    
+    async def aprocess_query(self, message: str, user_id: Optional[int] = None, session_id: Optional[str] = None,
+                             db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+        """
+        Async variant of process_query() that awaits DB I/O instead of
+        blocking a worker thread.
+
+        Args:
+            message: The user message
+            user_id: The user ID (optional)
+            session_id: The session ID for maintaining context (optional)
+            db: The async database session for this request (optional)
+            
+        Returns:
+            Dict containing the response and additional information
+        """
+        result = None
+        async for event, data in self.astream_query(message, user_id=user_id, session_id=session_id, db=db):
+            if event == 'done':
+                result = data
+        return result
+
+_query_handler: Optional[QueryHandler] = None
+_query_handler_lock = threading.Lock()
+
+def _register_metrics(handler: QueryHandler):
+    """
+    Expose the handler's component counters on /api/metrics.
+    """
+    if handler.log_writer is not None:
+        REGISTRY.register_collector('chatbot_log_writer', handler.log_writer.get_stats)
+    REGISTRY.register_collector('chatbot_session_store', handler.session_store.get_stats)
+    if handler.response_cache is not None:
+        REGISTRY.register_collector('chatbot_response_cache', handler.response_cache.get_stats)
+    REGISTRY.register_collector('chatbot_logger', get_logger_stats)
+
+def get_query_handler() -> QueryHandler:
+    """
+    Get the process-wide QueryHandler, building it on first use.
+
+    Returns:
+        The shared QueryHandler instance
+    """
+    global _query_handler
+
+    if _query_handler is None:
+        with _query_handler_lock:
+            if _query_handler is None:
+                _query_handler = QueryHandler(
+                    registry=get_agent_registry(),
+                    log_writer=get_log_writer() if config.LOG_WRITER_ENABLED else None,
+                    session_store=create_session_store(),
+                    response_cache=ResponseCache() if config.RESPONSE_CACHE_ENABLED else None
+                )
+                _register_metrics(_query_handler)
+
+    return _query_handler
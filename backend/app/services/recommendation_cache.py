@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from app import config
+from app.database.change_tracking import subscribe
+from app.database.db import engine as default_engine
+from app.database.models import Product, Recommendation
+from app.utils.logger import get_logger
+from app.utils.metrics import REGISTRY
+
+logger = get_logger("recommendation_cache")
+
+class RecommendationCache:
+    """
+    Size-bounded LRU cache of each user's recommended product names, as
+    served by /api/recommend.
+
+    A user's entry is dropped when one of their Recommendation rows changes
+    through the ORM, and the whole cache when a product is renamed or
+    deleted (its name may be in any entry). Entries also expire after
+    `ttl_seconds` to pick up rows written by other processes.
+
+    Misses are read over the recommendations.user_id index, which
+    ensure_index() creates on databases made before it existed.
+    """
+
+    def __init__(self, max_users: int = config.RECOMMEND_CACHE_SIZE,
+                 ttl_seconds: float = config.RECOMMEND_CACHE_TTL_SECONDS,
+                 engine: Engine = default_engine):
+        """
+        Args:
+            max_users: Users kept before the least recently used are evicted
+            ttl_seconds: Lifetime of a cached entry
+            engine: Engine of the database holding the recommendations table
+        """
+        self.engine = engine
+        self._index_ready = False
+        self._index_lock = threading.Lock()
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[List[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so a result read from the database
+        # before a change is not stored after it
+        self._generation = 0
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def ensure_index(self):
+        """
+        Create the recommendations.user_id index if the table was created
+        without it (create_all() does not add indexes to existing tables).
+
+        Runs once per process; a failure is logged and not retried.
+        """
+        if self._index_ready:
+            return
+        with self._index_lock:
+            if self._index_ready:
+                return
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_recommendations_user_id ON recommendations (user_id)"
+                    ))
+            except Exception as e:
+                logger.warning("Could not create the recommendations.user_id index: %s", e)
+            self._index_ready = True
+
+    def get_many(self, user_ids: Iterable[int]) -> Tuple[Dict[int, List[str]], List[int], int]:
+        """
+        Look up several users at once.
+
+        Args:
+            user_ids: The user IDs
+
+        Returns:
+            (cached, missing, generation): the cached product names by user,
+            the users to read from the database, and the token to pass to
+            put_many() with their results
+        """
+        now = time.monotonic()
+        cached, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None and now < entry[1]:
+                    self._entries.move_to_end(user_id)
+                    cached[user_id] = entry[0]
+                else:
+                    missing.append(user_id)
+            self.stats['hits'] += len(cached)
+            self.stats['misses'] += len(missing)
+            return cached, missing, self._generation
+
+    def put_many(self, results: Dict[int, List[str]], generation: int):
+        """
+        Store the product names read for several users.
+
+        Nothing is stored if the cache was invalidated since `generation`
+        was handed out by get_many().
+        """
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            if generation != self._generation:
+                return
+            for user_id, names in results.items():
+                self._entries[user_id] = (names, expires_at)
+                self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def on_change(self, table_name: str, operation: str, instance: Any):
+        """
+        change_tracking listener: drop the entries a changed row affects.
+        """
+        if table_name == Recommendation.__tablename__:
+            user_id = instance.__dict__.get('user_id')
+            with self._lock:
+                self._generation += 1
+                if self._entries.pop(user_id, None) is not None:
+                    self.stats['invalidations'] += 1
+        elif table_name == Product.__tablename__:
+            # Other product fields are not part of an entry
+            if operation == 'delete' or (operation == 'update' and inspect(instance).attrs.name.history.has_changes()):
+                self.clear()
+
+    def clear(self):
+        """
+        Drop every cached entry.
+        """
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the cache counters and current size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+_recommendation_cache: Optional[RecommendationCache] = None
+_recommendation_cache_lock = threading.Lock()
+
+def get_recommendation_cache() -> RecommendationCache:
+    """
+    Get the process-wide RecommendationCache, creating it on first use.
+
+    Returns:
+        The shared RecommendationCache instance
+    """
+    global _recommendation_cache
+
+    if _recommendation_cache is None:
+        with _recommendation_cache_lock:
+            if _recommendation_cache is None:
+                _recommendation_cache = RecommendationCache()
+                subscribe(_recommendation_cache.on_change)
+                REGISTRY.register_collector('chatbot_recommendation_cache', _recommendation_cache.get_stats)
+
+    return _recommendation_cache
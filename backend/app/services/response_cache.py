@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from app import config
+from app.database.change_tracking import catalog_version
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache with TTL for deterministic pipeline results.
+
+    Keys are combined with the current catalog version, so any Product or FAQ
+    change made through the ORM drops every older entry. The TTL covers
+    changes made by other processes or raw SQL.
+
+    Values are stored JSON-encoded, so every hit gets its own copy and
+    callers may change what they are given without touching the cache.
+    """
+
+    def __init__(self, max_entries: int = config.RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = config.RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_version = catalog_version()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'stale_writes': 0,
+        }
+
+    def _versioned(self, key: Hashable) -> Tuple:
+        version = catalog_version()
+        if version != self._last_version:
+            # Entries from older catalog versions can never be hit again
+            self._last_version = version
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+        return (key, version)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Args:
+            key: The normalized message key
+
+        Returns:
+            A fresh copy of the cached result, or None on a miss
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            versioned_key = self._versioned(key)
+            entry = self._entries.get(versioned_key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            value, expires_at = entry
+            if now >= expires_at:
+                del self._entries[versioned_key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(versioned_key)
+            self.stats['hits'] += 1
+
+        return json.loads(value)
+
+    def set(self, key: Hashable, value: Dict[str, Any], version: Optional[int] = None):
+        """
+        Cache a result, evicting the least recently used entries if full.
+
+        Args:
+            key: The normalized message key
+            value: The JSON-serializable result to cache
+            version: catalog_version() read before the result was computed;
+                the result is not stored if the catalog changed since then
+                (None stores it under the current version)
+        """
+        encoded = json.dumps(value, separators=(',', ':'), default=str)
+        with self._lock:
+            versioned_key = self._versioned(key)
+            if version is not None and version != versioned_key[1]:
+                self.stats['stale_writes'] += 1
+                return
+            self._entries[versioned_key] = (encoded, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(versioned_key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        """
+        Drop every cached result.
+        """
+        with self._lock:
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the cache counters and current size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        return stats
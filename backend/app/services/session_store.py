@@ -0,0 +1,302 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app import config
+
+def _encode(state: Dict) -> str:
+    # Compact JSON keeps per-session memory small and hands callers a copy
+    return json.dumps(state, separators=(',', ':'), default=str)
+
+class SessionStore(ABC):
+    """
+    Base class for per-session conversation state keyed by `session_id`.
+
+    Entries are evicted least-recently-used first once the store holds more
+    than `max_sessions` entries or `max_bytes` of encoded state, and expire
+    after `ttl_seconds` without being read or written.
+    """
+
+    def __init__(self, max_sessions: int = config.SESSION_MAX_ENTRIES,
+                 ttl_seconds: float = config.SESSION_TTL_SECONDS,
+                 max_bytes: int = config.SESSION_MAX_BYTES):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict]:
+        """
+        Get the state stored for a session.
+
+        Args:
+            session_id: The session ID
+
+        Returns:
+            A copy of the session state, or None if unknown or expired
+        """
+
+    @abstractmethod
+    def set(self, session_id: str, state: Dict):
+        """
+        Store the state for a session, evicting old sessions if needed.
+
+        Args:
+            session_id: The session ID
+            state: JSON-serializable session state
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """
+        Remove a session from the store.
+
+        Args:
+            session_id: The session ID
+        """
+
+    async def aget(self, session_id: str) -> Optional[Dict]:
+        """
+        Async variant of get() for the asyncio pipeline.
+        """
+        return self.get(session_id)
+
+    async def aset(self, session_id: str, state: Dict):
+        """
+        Async variant of set() for the asyncio pipeline.
+        """
+        self.set(session_id, state)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the hit/miss/eviction counters and current size.
+        """
+        with self._stats_lock:
+            return dict(self.stats)
+
+class InMemorySessionStore(SessionStore):
+    """
+    Session store kept in this process, for single-worker deployments.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # session_id -> (encoded state, last access time), oldest first
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, session_id: str):
+        encoded, _ = self._entries.pop(session_id)
+        self._bytes -= len(encoded)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self._count('misses')
+                return None
+
+            encoded, last_access = entry
+            if now - last_access > self.ttl_seconds:
+                self._remove(session_id)
+                self._count('expirations')
+                self._count('misses')
+                return None
+
+            self._entries[session_id] = (encoded, now)
+            self._entries.move_to_end(session_id)
+
+        self._count('hits')
+        return json.loads(encoded)
+
+    def set(self, session_id: str, state: Dict):
+        encoded = _encode(state)
+        now = time.monotonic()
+
+        with self._lock:
+            if session_id in self._entries:
+                self._remove(session_id)
+            self._entries[session_id] = (encoded, now)
+            self._bytes += len(encoded)
+
+            # Drop expired sessions from the cold end first
+            while self._entries:
+                oldest_id, (_, last_access) = next(iter(self._entries.items()))
+                if now - last_access <= self.ttl_seconds:
+                    break
+                self._remove(oldest_id)
+                self._count('expirations')
+
+            # Then enforce the entry and memory caps, least recently used first
+            while len(self._entries) > 1 and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._count('evictions')
+
+    def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._entries:
+                self._remove(session_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = super().get_stats()
+        with self._lock:
+            stats['sessions'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        return stats
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store backed by a SQLite file so that several worker processes
+    on one host share session state.
+
+    Hit/miss/eviction counters are per process.
+    """
+
+    # Enforce the caps every N writes rather than on every write
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str = config.SESSION_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS ix_chat_sessions_last_access ON chat_sessions (last_access)")
+        db.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        db = self._connection()
+        now = time.time()
+
+        row = db.execute(
+            "SELECT state, last_access FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+
+        encoded, last_access = row
+        if now - last_access > self.ttl_seconds:
+            db.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+            db.commit()
+            self._count('expirations')
+            self._count('misses')
+            return None
+
+        db.execute("UPDATE chat_sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+        db.commit()
+        self._count('hits')
+        return json.loads(encoded)
+
+    def set(self, session_id: str, state: Dict):
+        db = self._connection()
+        db.execute(
+            "INSERT OR REPLACE INTO chat_sessions (session_id, state, last_access) VALUES (?, ?, ?)",
+            (session_id, _encode(state), time.time())
+        )
+        db.commit()
+
+        with self._stats_lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def delete(self, session_id: str):
+        db = self._connection()
+        db.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+        db.commit()
+
+    def prune(self):
+        """
+        Remove expired sessions and enforce the entry and memory caps.
+        """
+        db = self._connection()
+
+        cursor = db.execute("DELETE FROM chat_sessions WHERE last_access < ?", (time.time() - self.ttl_seconds,))
+        self._count('expirations', cursor.rowcount)
+
+        count, total_bytes = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(state)), 0) FROM chat_sessions"
+        ).fetchone()
+
+        if count > self.max_sessions or total_bytes > self.max_bytes:
+            # Walk sessions least recently used first until both caps hold
+            doomed = []
+            rows = db.execute("SELECT session_id, LENGTH(state) FROM chat_sessions ORDER BY last_access ASC")
+            for session_id, size in rows:
+                if count <= self.max_sessions and total_bytes <= self.max_bytes:
+                    break
+                doomed.append((session_id,))
+                count -= 1
+                total_bytes -= size
+            db.executemany("DELETE FROM chat_sessions WHERE session_id = ?", doomed)
+            self._count('evictions', len(doomed))
+
+        db.commit()
+
+    async def aget(self, session_id: str) -> Optional[Dict]:
+        # Keep file I/O off the event loop
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def aset(self, session_id: str, state: Dict):
+        await asyncio.to_thread(self.set, session_id, state)
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = super().get_stats()
+        count, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(state)), 0) FROM chat_sessions"
+        ).fetchone()
+        stats['sessions'] = count
+        stats['bytes'] = total_bytes
+        return stats
+
+def create_session_store(backend: str = config.SESSION_STORE_BACKEND) -> SessionStore:
+    """
+    Create a session store for the configured backend.
+
+    Args:
+        backend: 'memory' or 'sqlite'
+
+    Returns:
+        A new SessionStore
+    """
+    if backend == 'memory':
+        return InMemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session store backend '{backend}', expected 'memory' or 'sqlite'")
@@ -0,0 +1,412 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import config
+from app.database.change_tracking import subscribe
+from app.database.db import SessionLocal
+from app.database.models import Product, Recommendation, UserInteraction
+from app.services.product_index import STOPWORDS, ProductIndex, get_product_index
+from app.utils.metrics import REGISTRY
+
+_WORD_RE = re.compile(r"\w+")
+
+# One profile event: (timestamp, product_id, category, price, weight, intent);
+# rated products carry a product, category and price, logged messages an
+# intent and the category they mention (if any)
+Event = Tuple[float, Optional[int], Optional[str], Optional[float], float, Optional[str]]
+
+def _epoch(timestamp: Optional[datetime]) -> float:
+    if timestamp is None:
+        return time.time()
+    # SQLite returns naive datetimes in UTC
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+class UserProfile:
+    """
+    Summary of one user's recent activity.
+
+    Keeps the user's events from the last `window_seconds`, at most
+    `max_events` rated products and `max_events` messages, and running
+    totals over those events, so adding an event or reading the profile never
+    scans the user's history.
+    """
+
+    def __init__(self, user_id: int, window_seconds: float, max_events: int):
+        self.user_id = user_id
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        # Rated products and messages are capped separately, so a chatty
+        # user's messages do not push their ratings out
+        self._ratings: Deque[Event] = deque()
+        self._messages: Deque[Event] = deque()
+        # Totals over the events in the deque
+        self.category_weights: Dict[str, float] = {}
+        self.ratings: Dict[int, float] = {}
+        self.intents: Dict[str, int] = {}
+        self._price_count = 0
+        self._price_sum = 0.0
+        self._price_squares = 0.0
+        self._lock = threading.Lock()
+
+    def _apply(self, event: Event, sign: int):
+        _, product_id, category, price, weight, intent = event
+        if category:
+            total = self.category_weights.get(category, 0.0) + sign * weight
+            if total > 1e-9:
+                self.category_weights[category] = total
+            else:
+                self.category_weights.pop(category, None)
+        if product_id is not None:
+            total = self.ratings.get(product_id, 0.0) + sign * weight
+            if total > 1e-9:
+                self.ratings[product_id] = total
+            else:
+                self.ratings.pop(product_id, None)
+        if price is not None:
+            self._price_count += sign
+            self._price_sum += sign * price
+            self._price_squares += sign * price * price
+        if intent:
+            count = self.intents.get(intent, 0) + sign
+            if count > 0:
+                self.intents[intent] = count
+            else:
+                self.intents.pop(intent, None)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        for events in (self._ratings, self._messages):
+            while events and (len(events) > self.max_events or events[0][0] < cutoff):
+                self._apply(events.popleft(), -1)
+
+    def add(self, event: Event):
+        """
+        Add an event, dropping the ones that fall out of the window or cap.
+
+        Events are expected roughly in time order; older ones still count
+        until they expire.
+        """
+        with self._lock:
+            (self._ratings if event[1] is not None else self._messages).append(event)
+            self._apply(event, 1)
+            self._expire(time.time())
+
+    def top_category(self) -> Optional[str]:
+        """
+        Get the category the user has shown the most interest in.
+        """
+        with self._lock:
+            self._expire(time.time())
+            if not self.category_weights:
+                return None
+            return max(self.category_weights, key=self.category_weights.get)
+
+    def category_affinities(self) -> Dict[str, float]:
+        """
+        Get category -> the user's interest in it relative to their top category (0 to 1].
+        """
+        with self._lock:
+            self._expire(time.time())
+            if not self.category_weights:
+                return {}
+            top = max(self.category_weights.values())
+            return {category: weight / top for category, weight in self.category_weights.items()}
+
+    def price_band(self) -> Optional[Tuple[float, float]]:
+        """
+        Get the price range of the products the user rated: mean +/- one standard deviation.
+        """
+        with self._lock:
+            self._expire(time.time())
+            if not self._price_count:
+                return None
+            mean = self._price_sum / self._price_count
+            spread = math.sqrt(max(0.0, self._price_squares / self._price_count - mean * mean))
+            return (round(max(0.0, mean - spread), 2), round(mean + spread, 2))
+
+    def recent_products(self, limit: int = config.PROFILE_RECENT_PRODUCTS) -> List[int]:
+        """
+        Get the products the user rated most recently, newest first.
+        """
+        with self._lock:
+            self._expire(time.time())
+            recent = []
+            for event in reversed(self._ratings):
+                product_id = event[1]
+                if product_id not in recent:
+                    recent.append(product_id)
+                    if len(recent) >= limit:
+                        break
+            return recent
+
+    def rated_products(self) -> Dict[int, float]:
+        """
+        Get product ID -> the user's total rating within the window.
+        """
+        with self._lock:
+            self._expire(time.time())
+            return dict(self.ratings)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the profile as a JSON-serializable dict.
+        """
+        band = self.price_band()
+        with self._lock:
+            categories = sorted(self.category_weights.items(), key=lambda item: -item[1])
+            intents = dict(self.intents)
+            events = len(self._ratings) + len(self._messages)
+        return {
+            'user_id': self.user_id,
+            'categories': {category: round(weight, 4) for category, weight in categories},
+            'recent_products': self.recent_products(),
+            'price_band': list(band) if band else None,
+            'intents': intents,
+            'events': events,
+        }
+
+class UserProfileStore:
+    """
+    Size-bounded LRU cache of UserProfile objects.
+
+    A profile is built from the database the first time it is read, from the
+    user's newest rated products and logged messages within the window. After
+    that it is kept current incrementally: each UserInteraction and
+    Recommendation inserted through the ORM is added to the cached profile.
+    An updated or deleted Recommendation row drops it so the ratings are
+    read again.
+
+    Changes made by other processes are not seen by the listeners; profiles
+    expire after `ttl_seconds` so they are eventually picked up.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal,
+                 product_index: Optional[ProductIndex] = None,
+                 max_users: int = config.PROFILE_CACHE_SIZE,
+                 ttl_seconds: float = config.PROFILE_TTL_SECONDS,
+                 window_days: float = config.PROFILE_WINDOW_DAYS,
+                 max_events: int = config.PROFILE_MAX_EVENTS):
+        """
+        Args:
+            session_factory: Creates sessions for loads made without one
+            product_index: Gives the category and price of newly rated
+                products (without it, a new rating drops the profile)
+            max_users: Profiles kept before the least recently used are evicted
+            ttl_seconds: Lifetime of a cached profile, which bounds how long
+                changes made by other processes go unseen
+            window_days: Oldest activity that counts towards a profile
+            max_events: Most rated products, and most messages, kept per profile
+        """
+        self.session_factory = session_factory
+        self.product_index = product_index
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.window_seconds = window_days * 86400
+        self.max_events = max_events
+        self._profiles: "OrderedDict[int, Tuple[UserProfile, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Lowercased category name or word -> category, for spotting categories in messages
+        self._category_terms: Optional[Dict[str, str]] = None
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+            'updates': 0,
+        }
+
+    def get(self, user_id: int, db: Optional[Session] = None) -> UserProfile:
+        """
+        Get a user's profile, loading it from the database on a miss.
+
+        Args:
+            user_id: The user ID
+            db: Session used for a load (a new one is opened if None)
+
+        Returns:
+            The user's profile
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if entry is not None and now < entry[1]:
+                self._profiles.move_to_end(user_id)
+                self.stats['hits'] += 1
+                return entry[0]
+            self.stats['misses'] += 1
+
+        own_session = db is None
+        if own_session:
+            db = self.session_factory()
+        try:
+            profile = self._load(user_id, db)
+        finally:
+            if own_session:
+                db.close()
+
+        with self._lock:
+            self._profiles[user_id] = (profile, time.monotonic() + self.ttl_seconds)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+                self.stats['evictions'] += 1
+        return profile
+
+    def _load(self, user_id: int, db: Session) -> UserProfile:
+        profile = UserProfile(user_id, self.window_seconds, self.max_events)
+        cutoff = datetime.fromtimestamp(time.time() - self.window_seconds, tz=timezone.utc)
+
+        # Newest first, so the cap keeps the most recent activity
+        ratings = db.execute(
+            select(Recommendation.product_id, Recommendation.rating, Recommendation.timestamp,
+                   Product.category, Product.price)
+            .join(Product, Product.product_id == Recommendation.product_id)
+            .where(Recommendation.user_id == user_id, Recommendation.timestamp >= cutoff)
+            .order_by(Recommendation.timestamp.desc())
+            .limit(self.max_events)
+        ).all()
+        messages = db.execute(
+            select(UserInteraction.query_text, UserInteraction.intent, UserInteraction.timestamp)
+            .where(UserInteraction.user_id == user_id, UserInteraction.timestamp >= cutoff)
+            .order_by(UserInteraction.timestamp.desc())
+            .limit(self.max_events)
+        ).all()
+
+        events: List[Event] = []
+        for product_id, rating, timestamp, category, price in ratings:
+            weight = 1.0 if rating is None else max(rating, 0.0)
+            events.append((_epoch(timestamp), product_id, category, price, weight, None))
+        category_terms = self._get_category_terms(db)
+        for text, intent, timestamp in messages:
+            events.append(self._message_event(text, intent, _epoch(timestamp), category_terms))
+
+        for event in sorted(events, key=lambda event: event[0]):
+            profile.add(event)
+        return profile
+
+    def _get_category_terms(self, db: Optional[Session] = None) -> Dict[str, str]:
+        terms = self._category_terms
+        if terms is not None:
+            return terms
+
+        own_session = db is None
+        if own_session:
+            db = self.session_factory()
+        try:
+            categories = [category for (category,) in db.execute(select(Product.category).distinct())
+                          if category]
+        finally:
+            if own_session:
+                db.close()
+
+        terms = {}
+        for category in categories:
+            for word in _WORD_RE.findall(category.lower()):
+                if len(word) >= 4 and word not in STOPWORDS:
+                    terms.setdefault(word, category)
+        self._category_terms = terms
+        return terms
+
+    def _message_event(self, text: Optional[str], intent: Optional[str], timestamp: float,
+                       category_terms: Dict[str, str]) -> Event:
+        category = None
+        for word in _WORD_RE.findall((text or '').lower()):
+            category = category_terms.get(word)
+            if category:
+                break
+        # A mentioned category counts for less than a rated product in it
+        return (timestamp, None, category, None, 0.5 if category else 0.0, (intent or '').lower() or None)
+
+    def on_change(self, table_name: str, operation: str, instance: Any):
+        """
+        change_tracking listener: keep cached profiles current.
+
+        Runs inside the session's flush (e.g. in the log writer thread), so it
+        only touches profiles that are already cached.
+        """
+        if table_name == Product.__tablename__:
+            # Categories may have been added or renamed
+            self._category_terms = None
+            return
+
+        user_id = instance.__dict__.get('user_id')
+        if user_id is None:
+            return
+
+        if table_name == Recommendation.__tablename__:
+            if operation == 'insert' and self._add_rating(user_id, instance):
+                return
+            # The old rating cannot be taken out of the totals, so reload
+            with self._lock:
+                if self._profiles.pop(user_id, None) is not None:
+                    self.stats['invalidations'] += 1
+        elif table_name == UserInteraction.__tablename__ and operation == 'insert':
+            with self._lock:
+                entry = self._profiles.get(user_id)
+            if entry is None:
+                return
+            # No queries inside the flush: categories come from the last profile load
+            entry[0].add(self._message_event(instance.__dict__.get('query_text'), instance.__dict__.get('intent'),
+                                             time.time(), self._category_terms or {}))
+            with self._lock:
+                self.stats['updates'] += 1
+
+    def _add_rating(self, user_id: int, instance: Any) -> bool:
+        # Returns False if the profile has to be dropped instead
+        with self._lock:
+            entry = self._profiles.get(user_id)
+        if entry is None:
+            return True
+        if self.product_index is None:
+            return False
+        # No queries inside the flush: category and price come from the index as it is
+        product = self.product_index.get(instance.__dict__.get('product_id'), refresh=False)
+        if product is None:
+            return False
+        rating = instance.__dict__.get('rating')
+        weight = 1.0 if rating is None else max(rating, 0.0)
+        entry[0].add((_epoch(instance.__dict__.get('timestamp')), product['product_id'],
+                      product['category'], product['price'], weight, None))
+        with self._lock:
+            self.stats['updates'] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the store counters and current size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._profiles)
+        return stats
+
+_profile_store: Optional[UserProfileStore] = None
+_profile_store_lock = threading.Lock()
+
+def get_profile_store() -> UserProfileStore:
+    """
+    Get the process-wide UserProfileStore, creating it on first use.
+
+    Returns:
+        The shared UserProfileStore instance
+    """
+    global _profile_store
+
+    if _profile_store is None:
+        with _profile_store_lock:
+            if _profile_store is None:
+                _profile_store = UserProfileStore(product_index=get_product_index())
+                subscribe(_profile_store.on_change)
+                REGISTRY.register_collector('chatbot_user_profiles', _profile_store.get_stats)
+
+    return _profile_store
@@ -1,7 +1,17 @@
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModel
+from app import config
+from app.utils.logger import get_logger
+from app.utils.metrics import REGISTRY
+
+logger = get_logger("embeddings")
+
+# Texts encoded per forward pass by get_embeddings()
+EMBEDDING_BATCH_SIZE = 32
 
 # Load model from HuggingFace
 tokenizer = None
@@ -20,11 +30,67 @@ def _load_model():
             tokenizer = AutoTokenizer.from_pretrained(model_name)
             model = AutoModel.from_pretrained(model_name)
         except Exception as e:
-            print(f"Error loading embedding model: {e}")
+            logger.error("Error loading embedding model: %s", e)
             # Fallback to random embeddings for testing
             tokenizer = "dummy"
             model = "dummy"
 
+def is_model_available() -> bool:
+    """
+    Check whether the embedding model loaded, i.e. whether embeddings are
+    real rather than the random vectors returned when loading failed.
+    """
+    _load_model()
+    return model != "dummy" and tokenizer != "dummy"
+
+class EmbeddingCache:
+    """
+    Bounded LRU of text -> embedding, so a message embedded once (e.g. to
+    classify it) is not encoded again when retrieval needs the same vector.
+    """
+
+    def __init__(self, max_entries: int = config.EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters exposed for monitoring
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+        }
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(text)
+            if vector is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(text)
+            self.stats['hits'] += 1
+            return vector
+
+    def set(self, text: str, vector: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[text] = vector
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the hit/miss counters and current size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            return stats
+
+embedding_cache = EmbeddingCache()
+REGISTRY.register_collector('chatbot_embedding_cache', embedding_cache.get_stats)
+
 def _mean_pooling(model_output, attention_mask):
     """
     Mean pooling to get sentence embeddings.
@@ -40,40 +106,104 @@ def _mean_pooling(model_output, attention_mask):
     input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
     return torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
 
-def get_embedding(text: str) -> List[float]:
+def _encode(texts: List[str]) -> np.ndarray:
     """
-    Get embedding vector for a text string.
+    Encode texts with one forward pass of the model.
+
+    Returns:
+        Normalized embeddings, one row per text
+    """
+    # Tokenize and get model output
+    encoded_input = tokenizer(texts, padding=True, truncation=True, return_tensors='pt')
+    with torch.no_grad():
+        model_output = model(**encoded_input)
+
+    # Pool the embeddings
+    embeddings = _mean_pooling(model_output, encoded_input['attention_mask'])
+
+    # Normalize the embeddings
+    embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+    return embeddings.numpy().astype(np.float32)
+
+def get_embedding_matrix(texts: List[str], random_fallback: bool = True) -> np.ndarray:
+    """
+    Get embeddings for many texts as one array.
+
+    Cached texts are not encoded again; the others are encoded in batches of
+    EMBEDDING_BATCH_SIZE, which is much faster than one text at a time.
 
     Args:
-        text: The text to embed
+        texts: The texts to embed
+        random_fallback: Return random vectors when the model is missing or
+            encoding fails (for testing); if False, raise RuntimeError instead
 
     Returns:
-        Embedding vector as a list of floats
+        Array of shape (len(texts), dimension)
     """
     _load_model()
 
     # If model loading failed, return random embeddings for testing
     if model == "dummy" or tokenizer == "dummy":
-        return np.random.rand(768).astype(np.float32).tolist()
+        if not random_fallback:
+            raise RuntimeError("The embedding model is not available")
+        return np.random.rand(len(texts), 768).astype(np.float32)
+
+    vectors: Dict[str, np.ndarray] = {}
+    missing = []
+    for text in texts:
+        if text in vectors:
+            continue
+        cached = embedding_cache.get(text)
+        if cached is None:
+            missing.append(text)
+            vectors[text] = None
+        else:
+            vectors[text] = cached
+
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+        try:
+            encoded = _encode(batch)
+        except Exception as e:
+            logger.error("Error generating embeddings: %s", e)
+            if not random_fallback:
+                raise RuntimeError(f"Error generating embeddings: {e}") from e
+            # Return random embeddings as fallback (not cached)
+            for text in batch:
+                vectors[text] = np.random.rand(768).astype(np.float32)
+            continue
+        for text, vector in zip(batch, encoded):
+            vectors[text] = vector
+            embedding_cache.set(text, vector)
+
+    if not texts:
+        return np.zeros((0, 768), dtype=np.float32)
+    return np.stack([vectors[text] for text in texts])
+
+def get_embedding_vector(text: str, random_fallback: bool = True) -> np.ndarray:
+    """
+    Get the embedding for a text as a NumPy vector (cached).
 
-    try:
-        # Tokenize and get model output
-        encoded_input = tokenizer(text, padding=True, truncation=True, return_tensors='pt')
-        with torch.no_grad():
-            model_output = model(**encoded_input)
+    Args:
+        text: The text to embed
+        random_fallback: See get_embedding_matrix()
 
-        # Pool the embeddings
-        embeddings = _mean_pooling(model_output, encoded_input['attention_mask'])
+    Returns:
+        Normalized embedding vector
+    """
+    return get_embedding_matrix([text], random_fallback=random_fallback)[0]
 
-        # Normalize the embeddings
-        embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+def get_embedding(text: str) -> List[float]:
+    """
+    Get embedding vector for a text string.
 
-        # Convert to list and return
-        return embeddings[0].numpy().tolist()
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        # Return random embeddings as fallback
-        return np.random.rand(768).astype(np.float32).tolist()
+    Args:
+        text: The text to embed
+
+    Returns:
+        Embedding vector as a list of floats
+    """
+    return get_embedding_vector(text).tolist()
 
 def get_embeddings(texts: List[str]) -> List[List[float]]:
     """
@@ -85,7 +215,7 @@ def get_embeddings(texts: List[str]) -> List[List[float]]:
     Returns:
         List of embedding vectors
     """
-    return [get_embedding(text) for text in texts]
+    return get_embedding_matrix(texts).tolist()
 
 def build_faiss_index(texts: List[str], metadata: List[Dict[str, Any]], index_path: Optional[str] = None):
     """
@@ -102,7 +232,7 @@ def build_faiss_index(texts: List[str], metadata: List[Dict[str, Any]], index_pa
     embeddings = get_embeddings(texts)
 
     # Create and populate the index
-    index = FAISSIndex()
+    index = FAISSIndex(vector_size=len(embeddings[0]))
     index.add_data(embeddings, metadata)
 
     # Save the index if a path is provided
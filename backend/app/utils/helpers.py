@@ -0,0 +1,32 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Any]], key: Callable[[Any], Hashable],
+                           k: int = 60, limit: Optional[int] = None) -> List[Any]:
+    """
+    Merge ranked result lists with reciprocal-rank fusion.
+
+    Every item scores sum(1 / (k + rank)) over the lists it appears in, so
+    items ranked well by several sources rise to the top without having to
+    compare the sources' raw scores.
+
+    Args:
+        rankings: Result lists, best first
+        key: Identifies the same item across lists
+        k: Damping constant; larger values flatten the rank differences
+        limit: Most items returned (all if None)
+
+    Returns:
+        The fused items, best first; an item found by several sources is
+        returned as it appears in the earliest list
+    """
+    scores: Dict[Hashable, float] = {}
+    items: Dict[Hashable, Any] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item_key, item)
+
+    # sorted() is stable, so ties keep the order the items were first seen in
+    ordered = sorted(scores, key=lambda item_key: -scores[item_key])
+    return [items[item_key] for item_key in ordered[:limit]]
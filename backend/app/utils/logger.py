@@ -0,0 +1,142 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from app import config
+
+# Every application logger lives under this namespace
+ROOT_LOGGER_NAME = "chatbot"
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+
+    Fields passed through `extra` (e.g. session_id, intent) are included as
+    top-level keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SampledDebugFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG records; other levels always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks or formats on the calling thread.
+
+    The stock handler formats the message in prepare(); here the record is
+    queued as is and the listener thread does all formatting and I/O. When
+    the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+_configure_lock = threading.Lock()
+
+def configure_logging(level: str = config.LOG_LEVEL, fmt: str = config.LOG_FORMAT,
+                      debug_sample_rate: float = config.LOG_DEBUG_SAMPLE_RATE,
+                      max_queue_size: int = config.LOG_QUEUE_SIZE):
+    """
+    Route the application's loggers through a background queue listener.
+
+    Safe to call more than once; only the first call has an effect.
+
+    Args:
+        level: Minimum level name (e.g. 'INFO')
+        fmt: 'json' for structured output, 'text' for plain lines
+        debug_sample_rate: Fraction of DEBUG records that are kept
+        max_queue_size: Records buffered before new ones are dropped
+    """
+    global _listener, _handler
+
+    if _listener is not None:
+        return
+
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if fmt == 'json':
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=max_queue_size))
+        _handler.addFilter(SampledDebugFilter(debug_sample_rate))
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(level.upper())
+        root.addHandler(_handler)
+        root.propagate = False
+
+        _listener = QueueListener(_handler.queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get an application logger, configuring logging on first use.
+
+    Args:
+        name: Component name (e.g. 'query_handler'); it is placed under the
+            'chatbot' namespace
+
+    Returns:
+        A standard library Logger
+    """
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+def get_stats() -> Dict[str, int]:
+    """
+    Get the logger queue depth and the number of dropped records.
+    """
+    if _handler is None:
+        return {'queued': 0, 'dropped': 0}
+    return {'queued': _handler.queue.qsize(), 'dropped': _handler.dropped}
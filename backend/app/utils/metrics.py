@@ -0,0 +1,207 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from app.utils.logger import get_logger
+
+logger = get_logger("metrics")
+
+# Latency buckets in seconds, from 100µs to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stage durations of the current request, used for the Server-Timing header
+server_timing: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar('server_timing', default=None)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed buckets, one series per label set.
+
+    Observing is a bisect plus a few additions under a lock, cheap enough to
+    leave on for every request.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        """
+        Record one observation.
+
+        Args:
+            value: The observed value (seconds)
+            label_values: One value per label name, in order
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        """
+        Render the histogram in Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.label_names, labels, 'le="+Inf"')
+            series_labels = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{series_labels} {total}")
+            lines.append(f"{self.name}_count{series_labels} {count}")
+
+        return lines
+
+class MetricsRegistry:
+    """
+    Holds the process's histograms and the collectors that expose other
+    components' counters (log writer, session store, caches, ...).
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Get the histogram with this name, creating it on first use.
+        """
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, help_text, label_names, buckets)
+            return self._histograms[name]
+
+    def register_collector(self, prefix: str, collect: Callable[[], Dict[str, float]]):
+        """
+        Expose a component's stats dictionary as metrics.
+
+        Keys become `<prefix>_<key>`. Cumulative counters are rendered as
+        Prometheus counters (`_total`); keys listed in GAUGE_KEYS are
+        rendered as gauges.
+
+        Args:
+            prefix: Metric name prefix (e.g. 'chatbot_log_writer')
+            collect: Returns the current stats, e.g. LogWriter.get_stats
+        """
+        with self._lock:
+            self._collectors[prefix] = collect
+
+    # Stats keys that describe a current level rather than a running count
+    GAUGE_KEYS = {'queued', 'sessions', 'bytes', 'entries', 'in_flight', 'waiting', 'tracked_keys',
+                  'documents', 'terms'}
+
+    def render(self) -> str:
+        """
+        Render every metric in Prometheus text exposition format.
+        """
+        lines: List[str] = []
+
+        with self._lock:
+            histograms = list(self._histograms.values())
+            collectors = list(self._collectors.items())
+
+        for histogram in histograms:
+            lines.extend(histogram.render())
+
+        for prefix, collect in collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.error("Error collecting metrics for %s: %s", prefix, e)
+                continue
+            for key, value in sorted(stats.items()):
+                if key in self.GAUGE_KEYS:
+                    name = f"{prefix}_{key}"
+                    lines.append(f"# TYPE {name} gauge")
+                else:
+                    name = f"{prefix}_{key}_total"
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    'chatbot_stage_duration_seconds',
+    'Time spent in each chat pipeline stage (session_load, cache, guard, classification, agent, streaming, session_save, logging).',
+    ('stage', 'agent', 'intent')
+)
+REQUEST_DURATION = REGISTRY.histogram(
+    'chatbot_request_duration_seconds',
+    'Total time to process a chat message through the pipeline.',
+    ('agent', 'intent', 'status')
+)
+
+class StageTimer:
+    """
+    Measures consecutive pipeline stages of one request.
+
+    Call mark(stage) at the end of each stage; the stage is charged the time
+    since the previous mark. Labels are applied in record() once the final
+    agent and intent are known.
+    """
+
+    __slots__ = ('stages', '_start', '_last')
+
+    def __init__(self):
+        self._start = self._last = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def record(self, agent: str, intent: str, status: str):
+        """
+        Feed the measured stages into the latency histograms and, when
+        enabled for this request, the Server-Timing header.
+        """
+        total = time.perf_counter() - self._start
+        for stage, duration in self.stages:
+            STAGE_DURATION.observe(duration, stage, agent, intent)
+        REQUEST_DURATION.observe(total, agent, intent, status)
+
+        timings = server_timing.get()
+        if timings is not None:
+            timings.extend(self.stages)
+            timings.append(('total', total))
+
+def format_server_timing(timings: List[Tuple[str, float]]) -> str:
+    """
+    Format stage durations as a Server-Timing header value (milliseconds).
+    """
+    return ', '.join(f"{stage};dur={duration * 1000:.3f}" for stage, duration in timings)
@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.utils.logger import get_logger
+
+logger = get_logger("pattern_matcher")
+
+# One hit: the lexicon category, the entry that matched and its span in the text
+Match = namedtuple('Match', ['category', 'term', 'start', 'end'])
+
+# Lexicon lines starting with this prefix are regular expressions
+REGEX_PREFIX = "re:"
+
+_TOKEN_RE = re.compile(r"\w+")
+
+class MultiPatternMatcher:
+    """
+    Finds every lexicon entry in a text with a single scan.
+
+    Plain entries (words and phrases, matched case-insensitively on word
+    boundaries) are indexed by their first word, so each word of the text
+    costs one dictionary lookup however large the lexicon is. Regex entries
+    (prefixed with 're:') are compiled into one alternation with a named
+    group per entry and run once over the text; keep those few, since the
+    alternation grows with them.
+    """
+
+    def __init__(self, lexicons: Dict[str, Iterable[str]]):
+        """
+        Args:
+            lexicons: Category name -> entries (terms, or 're:<pattern>')
+        """
+        # first word -> [(remaining words, category, term)]
+        self._phrases: Dict[str, List[Tuple[Tuple[str, ...], str, str]]] = {}
+        # regex group name -> (category, pattern)
+        self._groups: Dict[str, Tuple[str, str]] = {}
+        alternatives = []
+        self.size = 0
+
+        for category, entries in lexicons.items():
+            for entry in entries:
+                entry = entry.strip()
+                if not entry or entry.startswith('#'):
+                    continue
+                self.size += 1
+
+                if entry.startswith(REGEX_PREFIX):
+                    pattern = entry[len(REGEX_PREFIX):].strip()
+                    name = f"g{len(self._groups)}"
+                    self._groups[name] = (category, pattern)
+                    alternatives.append(f"(?P<{name}>{pattern})")
+                    continue
+
+                words = tuple(word.lower() for word in _TOKEN_RE.findall(entry))
+                if words:
+                    self._phrases.setdefault(words[0], []).append((words[1:], category, entry))
+
+        self._regex = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        self.categories = sorted(lexicons)
+
+    def scan(self, text: str) -> List[Match]:
+        """
+        Find every lexicon entry in the text.
+
+        Args:
+            text: The text to scan
+
+        Returns:
+            Matches in order of position
+        """
+        matches = []
+
+        if self._phrases:
+            lowered = text.lower()
+            if len(lowered) != len(text):
+                # Case folding changed the length; match word by word to keep offsets right
+                words = [m.group().lower() for m in _TOKEN_RE.finditer(text)]
+                lowered = text
+            else:
+                words = _TOKEN_RE.findall(lowered)
+            spans = None
+            phrases = self._phrases
+            for i, word in enumerate(words):
+                candidates = phrases.get(word)
+                if not candidates:
+                    continue
+                for rest, category, term in candidates:
+                    end_index = i + len(rest)
+                    if end_index >= len(words):
+                        continue
+                    if all(words[i + 1 + j] == rest_word for j, rest_word in enumerate(rest)):
+                        # Offsets are only needed once something matched
+                        if spans is None:
+                            spans = [m.span() for m in _TOKEN_RE.finditer(lowered)]
+                        matches.append(Match(category, term, spans[i][0], spans[end_index][1]))
+
+        if self._regex is not None:
+            for m in self._regex.finditer(text):
+                category, pattern = self._groups[m.lastgroup]
+                matches.append(Match(category, pattern, m.start(), m.end()))
+
+        matches.sort(key=lambda match: match.start)
+        return matches
+
+    def categories_in(self, text: str) -> Set[str]:
+        """
+        Get the categories with at least one entry in the text.
+        """
+        return {match.category for match in self.scan(text)}
+
+def load_lexicon_dir(path: str) -> Dict[str, List[str]]:
+    """
+    Read every `<category>.txt` file in a directory.
+
+    Files hold one entry per line; blank lines and lines starting with '#'
+    are ignored.
+
+    Args:
+        path: The lexicon directory
+
+    Returns:
+        Category name -> entries
+    """
+    lexicons = {}
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(path, filename), encoding="utf-8") as f:
+            lexicons[filename[:-len(".txt")]] = [line.rstrip("\n") for line in f]
+    return lexicons
+
+class LexiconMatcher:
+    """
+    MultiPatternMatcher built from a lexicon directory and rebuilt when the
+    files change, so lexicon updates reach running workers without a restart.
+
+    The directory's modification times are checked at most every
+    `reload_interval` seconds. The new matcher is built before it replaces
+    the old one, so scans never wait for a rebuild or see a partial lexicon.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0,
+                 fallback: Optional[Dict[str, Iterable[str]]] = None):
+        """
+        Args:
+            path: The lexicon directory
+            reload_interval: Seconds between checks for changed files (0 disables reloading)
+            fallback: Lexicons to use when the directory cannot be read
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self.fallback = fallback or {}
+        self._lock = threading.Lock()
+        self._signature = None
+        self._next_check = 0.0
+        self._matcher = self._build()
+
+    def _dir_signature(self) -> Optional[Tuple]:
+        try:
+            return tuple(sorted(
+                (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in os.scandir(self.path) if entry.name.endswith(".txt")
+            ))
+        except OSError:
+            return None
+
+    def _build(self) -> MultiPatternMatcher:
+        self._signature = self._dir_signature()
+        if self._signature is None:
+            logger.warning("Lexicon directory %s not readable, using built-in lexicons", self.path)
+            return MultiPatternMatcher(self.fallback)
+
+        matcher = MultiPatternMatcher(load_lexicon_dir(self.path))
+        logger.info("Loaded %d lexicon entries from %s", matcher.size, self.path)
+        return matcher
+
+    @property
+    def matcher(self) -> MultiPatternMatcher:
+        """
+        The current matcher, rebuilt first if the lexicon files changed.
+        """
+        if self.reload_interval > 0 and time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._matcher
+
+    def _maybe_reload(self):
+        # Only one thread checks; the others keep using the current matcher
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.reload_interval
+            if self._dir_signature() != self._signature:
+                try:
+                    self._matcher = self._build()
+                except Exception as e:
+                    logger.error("Error reloading lexicons from %s, keeping the previous ones: %s", self.path, e)
+        finally:
+            self._lock.release()
+
+    def scan(self, text: str) -> List[Match]:
+        return self.matcher.scan(text)
@@ -0,0 +1,343 @@
+"""
+Load and latency benchmark for app.main:app.
+
+Runs a fixed, seeded mix of requests against the app in-process (httpx
+ASGI transport, no network) on a throwaway SQLite database and reports
+throughput, p50/p95/p99 latency, DB statements and allocations per
+endpoint. Results are saved as JSON for comparing commits.
+
+Usage (from the backend directory):
+    python benchmarks/bench_app.py --requests 2000 --concurrency 16
+    python benchmarks/bench_app.py --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import BACKEND_DIR, compare_results, latency_summary, write_results
+
+# Messages per chat category; the order flow continues across a worker's session
+CHAT_MESSAGES = {
+    'guard_rejected': [
+        "click here for a limited time offer",
+        "visit www.cheap-stuff.example now",
+        "this shit is broken",
+        "x",
+    ],
+    'order': [
+        "I want to buy a Smart Watch",
+        "I'd like to order 2 Wireless Headphones",
+        "2",
+        "221B Baker Street, London",
+        "credit card",
+        "yes",
+    ],
+    'details': [
+        "Tell me about the Wireless Headphones",
+        "What is your return policy?",
+        "How long does shipping take?",
+        "What features does the Smart Watch have?",
+        "Do you have any laptops in stock?",
+    ],
+    'recommendation': [
+        "Can you recommend a good gift?",
+        "What are your most popular products?",
+        "Suggest something for running",
+    ],
+}
+CHAT_MIX = (('guard_rejected', 0.15), ('order', 0.2), ('details', 0.4), ('recommendation', 0.25))
+ENDPOINT_MIX = (('chat', 0.7), ('faq', 0.15), ('recommend', 0.15))
+FAQ_QUERIES = ["return", "shipping", "payment", "warranty", "track", "cancel"]
+
+# Which endpoint the statement being executed belongs to
+_current_endpoint: ContextVar[str] = ContextVar('current_endpoint', default='background')
+
+def seed_database(num_users: int):
+    """
+    Fill the benchmark database with init_db.py's data set, or a small
+    built-in catalog when the ../data JSON files are not available.
+    """
+    from app.database.db import Base, SessionLocal, engine
+    from app.database.models import FAQ, Product, Recommendation, User
+
+    Base.metadata.create_all(bind=engine)
+
+    if os.path.exists(os.path.join(BACKEND_DIR, "..", "data", "product_data.json")):
+        # init_db.py resolves ../data relative to the working directory
+        cwd = os.getcwd()
+        os.chdir(BACKEND_DIR)
+        try:
+            import init_db
+            init_db.main()
+        finally:
+            os.chdir(cwd)
+        return
+
+    print("../data not found, seeding a built-in catalog")
+    rng = random.Random(0)
+    categories = ["Electronics", "Clothing", "Home", "Sports", "Books"]
+    names = ["Smart Watch", "Wireless Headphones", "Laptop", "T-Shirt", "Running Shoes",
+             "Coffee Maker", "Yoga Mat", "Desk Lamp", "Backpack", "Novel"]
+
+    db = SessionLocal()
+    try:
+        db.add_all(User(name=f"User {i}", email=f"user{i}@example.com", password_hash="x")
+                   for i in range(1, num_users + 1))
+        products = [
+            Product(
+                name=name if i < len(names) else f"{name} {i}",
+                category=categories[i % len(categories)],
+                price=round(rng.uniform(5, 500), 2),
+                stock=rng.randint(0, 100),
+                description=f"A {name.lower()} for everyday use.",
+                features='["durable", "lightweight"]',
+                rating=round(rng.uniform(3, 5), 1),
+                reviews_count=rng.randint(0, 500)
+            )
+            for i, name in enumerate(names * 20)
+        ]
+        db.add_all(products)
+        db.add_all([
+            FAQ(question="What is your return policy?", answer="Items can be returned within 30 days."),
+            FAQ(question="How long does shipping take?", answer="Standard shipping takes 3-5 business days."),
+            FAQ(question="Which payment methods do you accept?", answer="Credit card, debit card, PayPal and cash on delivery."),
+            FAQ(question="Do products come with a warranty?", answer="Electronics have a one year warranty."),
+            FAQ(question="How can I track my order?", answer="Use the tracking link in your confirmation email."),
+            FAQ(question="Can I cancel my order?", answer="Orders can be cancelled until they ship."),
+        ])
+        db.flush()
+        db.add_all(
+            Recommendation(user_id=user_id, product_id=rng.choice(products).product_id, rating=rng.uniform(1, 5))
+            for user_id in range(1, num_users + 1) for _ in range(5)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def build_workload(num_requests: int, num_users: int, seed: int) -> List[Tuple[str, str, Dict]]:
+    """
+    Build the request list: (label, method path, JSON body or None).
+
+    The same seed always produces the same requests.
+    """
+    rng = random.Random(seed)
+    endpoints, endpoint_weights = zip(*ENDPOINT_MIX)
+    kinds, kind_weights = zip(*CHAT_MIX)
+    order_step: Dict[int, int] = {}
+    workload = []
+
+    for _ in range(num_requests):
+        user_id = rng.randint(1, num_users)
+        endpoint = rng.choices(endpoints, endpoint_weights)[0]
+
+        if endpoint == 'faq':
+            workload.append(('faq', f"/api/faq/{rng.choice(FAQ_QUERIES)}", None))
+        elif endpoint == 'recommend':
+            workload.append(('recommend', f"/api/recommend/{user_id}", None))
+        else:
+            kind = rng.choices(kinds, kind_weights)[0]
+            if kind == 'order':
+                # Walk each user's session through the order flow in sequence
+                step = order_step.get(user_id, 0)
+                message = CHAT_MESSAGES['order'][step]
+                order_step[user_id] = (step + 1) % len(CHAT_MESSAGES['order'])
+            else:
+                message = rng.choice(CHAT_MESSAGES[kind])
+            body = {'message': message, 'user_id': user_id, 'session_id': f"bench-{user_id}"}
+            workload.append((f"chat:{kind}", "/api/chat/", body))
+
+    return workload
+
+def endpoint_of(label: str) -> str:
+    return {'faq': '/api/faq/{q}', 'recommend': '/api/recommend/{user_id}'}.get(label, '/api/chat/')
+
+async def send(client, path: str, body: Optional[Dict]):
+    if body is None:
+        return await client.get(path)
+    return await client.post(path, json=body)
+
+async def run_load(app, workload, concurrency: int, statements: Dict[str, int]):
+    """
+    Send the workload with `concurrency` requests in flight.
+
+    Returns:
+        (per-label latencies in ms, per-label error counts, wall time in seconds)
+    """
+    import httpx
+
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    pending = iter(workload)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            for label, path, body in pending:
+                token = _current_endpoint.set(label)
+                started = time.perf_counter()
+                try:
+                    response = await send(client, path, body)
+                    failed = response.status_code >= 400
+                except Exception:
+                    failed = True
+                finally:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    _current_endpoint.reset(token)
+                latencies.setdefault(label, []).append(elapsed)
+                if failed:
+                    errors[label] = errors.get(label, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return latencies, errors, wall
+
+async def measure_allocations(app, workload, per_label: int) -> Dict[str, int]:
+    """
+    Replay requests one at a time under tracemalloc and record the median
+    peak allocation per request for each label.
+    """
+    import httpx
+
+    samples: Dict[str, List[int]] = {}
+    tracemalloc.start()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for label, path, body in workload:
+                if len(samples.setdefault(label, [])) >= per_label:
+                    continue
+                baseline, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await send(client, path, body)
+                _, peak = tracemalloc.get_traced_memory()
+                samples[label].append(peak - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {label: sorted(values)[len(values) // 2] for label, values in samples.items() if values}
+
+def summarize(labels: List[str], latencies, errors, statements, allocations, wall) -> Dict[str, Dict]:
+    latency = []
+    count = 0
+    for label in labels:
+        latency.extend(latencies.get(label, []))
+        count += len(latencies.get(label, []))
+    if not count:
+        return {}
+    summary = {
+        'requests': count,
+        'errors': sum(errors.get(label, 0) for label in labels),
+        'throughput_rps': round(count / wall, 2),
+        **latency_summary(latency),
+        'db_statements_per_request': round(sum(statements.get(label, 0) for label in labels) / count, 2),
+    }
+    sampled = [allocations[label] for label in labels if label in allocations]
+    if sampled:
+        summary['alloc_peak_bytes_per_request'] = int(sum(sampled) / len(sampled))
+    return summary
+
+async def main_async(args):
+    from sqlalchemy import event
+    from app.database.db import engine, get_async_engine
+    from app.main import app
+
+    seed_database(args.users)
+
+    statements: Dict[str, int] = {}
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        label = _current_endpoint.get()
+        statements[label] = statements.get(label, 0) + 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    event.listen(get_async_engine().sync_engine, "before_cursor_execute", count_statement)
+
+    workload = build_workload(args.requests, args.users, args.seed)
+
+    async with app.router.lifespan_context(app):
+        # Warm up agents, connection pools and caches outside the measurement
+        await run_load(app, build_workload(args.warmup, args.users, args.seed + 1), args.concurrency, {})
+        statements.clear()
+
+        latencies, errors, wall = await run_load(app, workload, args.concurrency, statements)
+        allocations = await measure_allocations(app, workload, args.alloc_requests) if args.alloc_requests else {}
+
+    labels = sorted(latencies)
+    by_label = {label: summarize([label], latencies, errors, statements, allocations, wall) for label in labels}
+    endpoints: Dict[str, Dict] = {}
+    for name in ('/api/chat/', '/api/faq/{q}', '/api/recommend/{user_id}'):
+        summary = summarize([label for label in labels if endpoint_of(label) == name],
+                            latencies, errors, statements, allocations, wall)
+        if summary:
+            endpoints[name] = summary
+
+    return {
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'users': args.users,
+            'seed': args.seed,
+            'warmup': args.warmup,
+        },
+        'overall': {
+            'requests': len(workload),
+            'wall_seconds': round(wall, 3),
+            'throughput_rps': round(len(workload) / wall, 2),
+            # Statements run outside any request, e.g. by the background log writer
+            'background_db_statements': statements.get('background', 0),
+        },
+        'endpoints': endpoints,
+        'messages': by_label,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests in the measured run")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users / chat sessions")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests sent first")
+    parser.add_argument("--alloc-requests", type=int, default=20,
+                        help="Requests per message type replayed under tracemalloc (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42, help="Workload random seed")
+    parser.add_argument("--database", help="SQLite file to use (default: a fresh temporary file)")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Point the app at a throwaway database before anything imports it
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix="chatbot-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.setdefault("SESSION_STORE_PATH", os.path.join(os.path.dirname(database), "sessions.db"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    results = asyncio.run(main_async(args))
+    path = write_results("app", results, args.output)
+
+    print(f"\n{results['overall']['requests']} requests in {results['overall']['wall_seconds']}s "
+          f"({results['overall']['throughput_rps']} req/s, concurrency {args.concurrency})")
+    print(f"{'endpoint':<34}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'stmts':>7}{'alloc KB':>10}{'errors':>8}")
+    for section in ('endpoints', 'messages'):
+        for name, summary in results[section].items():
+            alloc = summary.get('alloc_peak_bytes_per_request')
+            print(f"{name:<34}{summary['throughput_rps']:>9}{summary['p50_ms']:>9}{summary['p95_ms']:>9}"
+                  f"{summary['p99_ms']:>9}{summary['db_statements_per_request']:>7}"
+                  f"{(alloc / 1024 if alloc is not None else 0):>10.1f}{summary['errors']:>8}")
+        print()
+    print(f"Results written to {path}")
+
+    if args.compare:
+        compare_results(args.compare, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Intent classification cost as the rule set grows.
+
+Compares the Classification Agent's 'rules' mode (every pattern searched
+separately) with its 'scored' mode (one scan against the rules indexed by
+first word), starting from the built-in rules and adding synthetic keyword and
+phrase rules spread over the intents. It also times the 'embedding' mode's
+centroid scoring on random vectors, i.e. the cost once embeddings exist.
+
+Usage (from the backend directory):
+    python benchmarks/bench_classifier.py
+    python benchmarks/bench_classifier.py --extra-rules 0 500 5000 --messages 2000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import compare_results, write_results
+from app.agents.classification_agent import ClassificationAgent
+from app.services.intent_model import CentroidIntentModel
+
+SAMPLE_MESSAGES = [
+    "How can I order a latte?",
+    "I want to buy two croissants",
+    "What is in the chocolate muffin?",
+    "Is the banana bread vegan?",
+    "How much does the cappuccino cost?",
+    "Can you recommend something for breakfast?",
+    "What is your most popular pastry?",
+    "Something similar to an espresso please",
+    "hello there",
+    "Where is my payment confirmation?",
+]
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+def build_rules(extra: int, rng: random.Random):
+    intent_patterns = {intent: list(patterns) for intent, patterns in ClassificationAgent().intent_patterns.items()}
+    intents = list(intent_patterns)
+    vocabulary = []
+    for i in range(extra):
+        words = [random_word(rng) for _ in range(rng.choice((1, 1, 2)))]
+        vocabulary.extend(words)
+        intent_patterns[intents[i % len(intents)]].append(r"\b" + " ".join(words) + r"\b")
+    return intent_patterns, vocabulary
+
+def build_messages(count: int, vocabulary, rng: random.Random):
+    messages = []
+    for i in range(count):
+        message = SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)]
+        # Half the messages also mention words from the synthetic rules
+        if vocabulary and i % 2 == 0:
+            message += " " + " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4)))
+        messages.append(message)
+    return messages
+
+def time_per_message(classify, messages, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            classify(message)
+        best = min(best, time.perf_counter() - started)
+    return best / len(messages) * 1e6
+
+def time_centroid_scoring(batch_sizes, dimension: int, repeat: int, seed: int):
+    rng = np.random.default_rng(seed)
+    intents = list(ClassificationAgent.AGENT_MAPPING)[:-1]
+    model = CentroidIntentModel(intents, rng.normal(size=(len(intents), dimension)), min_similarity=-1.0)
+
+    batches = {}
+    print(f"\n{'batch':>7}{'centroid us/msg':>17}{'batch ms':>10}")
+    for batch_size in batch_sizes:
+        vectors = rng.normal(size=(batch_size, dimension)).astype(np.float32)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            model.predict(vectors)
+            best = min(best, time.perf_counter() - started)
+        batches[str(batch_size)] = {
+            'centroid_us_per_message': round(best / batch_size * 1e6, 3),
+            'batch_ms': round(best * 1000, 3),
+        }
+        print(f"{batch_size:>7}{best / batch_size * 1e6:>17.2f}{best * 1000:>10.3f}")
+    return batches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--extra-rules", type=int, nargs="+", default=[0, 100, 1000, 5000],
+                        help="Synthetic rules added to the built-in ones")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages classified per rule set")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 1000],
+                        help="Batch sizes for the centroid scoring timings")
+    parser.add_argument("--dimension", type=int, default=384, help="Embedding dimension for the centroid timings")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    sizes = {}
+
+    print(f"{'rules':>7}{'rules us/msg':>14}{'scored us/msg':>15}{'agreement':>11}")
+    for extra in args.extra_rules:
+        intent_patterns, vocabulary = build_rules(extra, rng)
+        messages = build_messages(args.messages, vocabulary, rng)
+        rule_count = sum(len(patterns) for patterns in intent_patterns.values())
+
+        rules_agent = ClassificationAgent(mode='rules', intent_patterns=intent_patterns)
+        scored_agent = ClassificationAgent(mode='scored', intent_patterns=intent_patterns)
+        rules_us = time_per_message(rules_agent.process, messages, args.repeat)
+        scored_us = time_per_message(scored_agent.process, messages, args.repeat)
+
+        # How often the two modes pick the same intent
+        agreement = sum(rules_agent.process(message)['intent'] == scored_agent.process(message)['intent']
+                        for message in messages) / len(messages)
+
+        sizes[str(rule_count)] = {
+            'rules_us_per_message': round(rules_us, 3),
+            'scored_us_per_message': round(scored_us, 3),
+            'agreement': round(agreement, 4),
+        }
+        print(f"{rule_count:>7}{rules_us:>14.2f}{scored_us:>15.2f}{agreement:>11.1%}")
+
+    batches = time_centroid_scoring(args.batch_sizes, args.dimension, args.repeat, args.seed)
+
+    results = {
+        'config': {'messages': args.messages, 'repeat': args.repeat, 'seed': args.seed,
+                   'dimension': args.dimension},
+        'sizes': sizes,
+        'centroid_batches': batches,
+    }
+    path = write_results("classifier", results, args.output)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        compare_results(args.compare, results, section='sizes',
+                        metrics=('rules_us_per_message', 'scored_us_per_message'))
+
+if __name__ == "__main__":
+    main()
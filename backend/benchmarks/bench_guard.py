@@ -0,0 +1,105 @@
+"""
+Guard screening cost as the lexicon grows.
+
+Compares the single-scan MultiPatternMatcher with the previous approach of
+one compiled regex per entry searched in turn, on synthetic lexicons of
+increasing size. The matcher's cost per message should stay flat.
+
+Usage (from the backend directory):
+    python benchmarks/bench_guard.py
+    python benchmarks/bench_guard.py --sizes 10 1000 100000 --messages 2000
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import compare_results, write_results
+from app.utils.pattern_matcher import MultiPatternMatcher
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+def build_lexicon(size: int, rng: random.Random):
+    # Mostly single words with some two- and three-word phrases, like a real blocklist
+    return [" ".join(random_word(rng) for _ in range(rng.choice((1, 1, 1, 2, 3)))) for _ in range(size)]
+
+def build_messages(count: int, lexicon, rng: random.Random):
+    vocabulary = [random_word(rng) for _ in range(2000)]
+    messages = []
+    for i in range(count):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(8, 30))]
+        # About one message in ten contains a blocked entry
+        if i % 10 == 0:
+            words.insert(rng.randrange(len(words)), rng.choice(lexicon))
+        messages.append(" ".join(words))
+    return messages
+
+def time_per_message(scan, messages, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            scan(message)
+        best = min(best, time.perf_counter() - started)
+    return best / len(messages) * 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000],
+                        help="Lexicon sizes to test")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages screened per size")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--legacy-max", type=int, default=1000,
+                        help="Largest lexicon to time with per-entry regexes (they get slow)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    sizes = {}
+
+    print(f"{'entries':>9}{'matcher us/msg':>16}{'per-regex us/msg':>18}{'build ms':>10}")
+    for size in args.sizes:
+        lexicon = build_lexicon(size, rng)
+        messages = build_messages(args.messages, lexicon, rng)
+
+        started = time.perf_counter()
+        matcher = MultiPatternMatcher({'blocked': lexicon})
+        build_ms = (time.perf_counter() - started) * 1000
+        matcher_us = time_per_message(matcher.scan, messages, args.repeat)
+
+        legacy_us = None
+        if size <= args.legacy_max:
+            patterns = [re.compile(r"\b" + re.escape(term) + r"\b", re.IGNORECASE) for term in lexicon]
+
+            def legacy_scan(message):
+                return [pattern for pattern in patterns if pattern.search(message)]
+
+            legacy_us = time_per_message(legacy_scan, messages, 1)
+
+        sizes[str(size)] = {
+            'matcher_us_per_message': round(matcher_us, 3),
+            'per_regex_us_per_message': round(legacy_us, 3) if legacy_us is not None else None,
+            'build_ms': round(build_ms, 3),
+        }
+        legacy_text = f"{legacy_us:.1f}" if legacy_us is not None else "-"
+        print(f"{size:>9}{matcher_us:>16.2f}{legacy_text:>18}{build_ms:>10.1f}")
+
+    results = {
+        'config': {'messages': args.messages, 'repeat': args.repeat, 'seed': args.seed},
+        'sizes': sizes,
+    }
+    path = write_results("guard", results, args.output)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        compare_results(args.compare, results, section='sizes', metrics=('matcher_us_per_message',))
+
+if __name__ == "__main__":
+    main()
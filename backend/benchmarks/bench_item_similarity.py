@@ -0,0 +1,88 @@
+"""
+Item-item similarity build time and per-request scoring latency.
+
+Generates synthetic ratings (users rate products clustered around a few
+interests, popular products more often), builds and saves the Recommendation
+Agent's ItemSimilarityModel, then times similar_to() on the memory-mapped
+model for user histories of several sizes.
+
+Usage (from the backend directory):
+    python benchmarks/bench_item_similarity.py
+    python benchmarks/bench_item_similarity.py --products 100000 --users 200000 --ratings-per-user 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import compare_results, latency_summary, write_results
+from app.services.item_similarity import ItemSimilarityModel
+
+def random_ratings(rng: np.random.Generator, users: int, products: int, per_user: int):
+    user_ids = np.repeat(np.arange(1, users + 1), per_user)
+    # Each user sticks to products near a few interests; interests favor popular products
+    interests = rng.zipf(1.3, size=(users, 3)) % products
+    picks = interests[np.arange(users).repeat(per_user), rng.integers(0, 3, size=users * per_user)]
+    product_ids = (picks + rng.integers(-50, 51, size=users * per_user)) % products + 1
+    ratings = rng.integers(1, 6, size=users * per_user).astype(np.float64)
+    return user_ids, product_ids, ratings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--neighbors", type=int, default=50, help="Neighbors kept per product")
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[1, 10, 100],
+                        help="Rated products per scored user")
+    parser.add_argument("--requests", type=int, default=2000, help="Users scored per history size")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    user_ids, product_ids, ratings = random_ratings(rng, args.users, args.products, args.ratings_per_user)
+
+    started = time.perf_counter()
+    model = ItemSimilarityModel.build(user_ids, product_ids, ratings, neighbors=args.neighbors)
+    build_s = time.perf_counter() - started
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_item_similarity_"), "model")
+    version = os.path.join(path, ItemSimilarityModel.VERSIONS_DIR, model.save(path))
+    size_mb = sum(os.path.getsize(os.path.join(version, name)) for name in os.listdir(version)) / 1e6
+    model = ItemSimilarityModel.load(path)
+    print(f"{len(ratings)} ratings -> {len(model)} products, {len(model.scores)} pairs, "
+          f"built in {build_s:.1f}s, {size_mb:.1f} MB on disk\n")
+
+    histories = {}
+    print(f"{'history':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for size in args.history_sizes:
+        latencies = []
+        for _ in range(args.requests):
+            rated = rng.choice(model.product_ids, size=min(size, len(model)), replace=False)
+            history = {int(product_id): float(rng.integers(1, 6)) for product_id in rated}
+            started = time.perf_counter()
+            model.similar_to(history, 50)
+            latencies.append((time.perf_counter() - started) * 1000)
+        summary = latency_summary(latencies)
+        histories[str(size)] = summary
+        print(f"{size:>8}{summary['p50_ms']:>9.3f}{summary['p99_ms']:>9.3f}")
+
+    results = {
+        'config': {'products': args.products, 'users': args.users, 'ratings_per_user': args.ratings_per_user,
+                   'neighbors': args.neighbors, 'requests': args.requests, 'seed': args.seed},
+        'build': {'seconds': round(build_s, 2), 'pairs': int(len(model.scores)), 'size_mb': round(size_mb, 2)},
+        'histories': histories,
+    }
+    path = write_results("item-similarity", results, args.output)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        compare_results(args.compare, results, section='histories', metrics=('p50_ms', 'p99_ms'))
+
+if __name__ == "__main__":
+    main()
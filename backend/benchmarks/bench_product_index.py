@@ -0,0 +1,142 @@
+"""
+Product search latency on large synthetic catalogs.
+
+Fills a temporary SQLite database with generated products, builds the
+Details Agent's ProductIndex from it, and times queries, incremental
+updates through the ORM and the periodic check for new rows.
+
+Usage (from the backend directory):
+    python benchmarks/bench_product_index.py
+    python benchmarks/bench_product_index.py --products 10000 100000 --queries 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import compare_results, latency_summary, write_results
+
+CATEGORIES = ["Electronics", "Clothing", "Home & Kitchen", "Sports & Fitness", "Books", "Toys", "Beauty", "Garden"]
+ADJECTIVES = ["wireless", "smart", "compact", "premium", "organic", "portable", "classic", "ergonomic",
+              "waterproof", "lightweight", "vintage", "digital", "handmade", "adjustable", "rechargeable"]
+NOUNS = ["headphones", "watch", "shirt", "mat", "coffee", "maker", "lamp", "backpack", "speaker", "bottle",
+         "jacket", "blender", "keyboard", "camera", "chair", "sneakers", "kettle", "tent", "drone", "novel"]
+
+def random_product(rng: random.Random, product_id: int) -> dict:
+    noun = rng.choice(NOUNS)
+    name = f"{rng.choice(ADJECTIVES).title()} {noun.title()} {product_id}"
+    words = [rng.choice(ADJECTIVES + NOUNS) for _ in range(rng.randint(10, 30))]
+    return {
+        'name': name,
+        'category': rng.choice(CATEGORIES),
+        'price': round(rng.uniform(5, 500), 2),
+        'stock': rng.randint(0, 200),
+        'description': f"A {noun} that is " + " ".join(words) + ".",
+        'features': json.dumps({'color': rng.choice(["black", "white", "red", "blue"]),
+                                'material': rng.choice(["cotton", "steel", "plastic", "wood"])}),
+    }
+
+def random_query(rng: random.Random) -> str:
+    templates = [
+        "Tell me about the {adj} {noun}",
+        "Do you have a {noun}?",
+        "{adj} {noun} in {color}",
+        "what {noun} do you sell",
+        "{adj} {adj2} {noun} {material}",
+    ]
+    return rng.choice(templates).format(adj=rng.choice(ADJECTIVES), adj2=rng.choice(ADJECTIVES),
+                                        noun=rng.choice(NOUNS), color=rng.choice(["black", "red"]),
+                                        material=rng.choice(["steel", "wood"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Catalog sizes to test")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries timed per catalog")
+    parser.add_argument("--updates", type=int, default=200, help="Products updated through the ORM per catalog")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench_product_index_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from sqlalchemy import insert
+    from app.database.change_tracking import subscribe
+    from app.database.db import Base, SessionLocal, engine
+    from app.database.models import Product
+    from app.services.product_index import ProductIndex
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(args.seed)
+    catalogs = {}
+    inserted = 0
+
+    print(f"{'products':>9}{'build ms':>10}{'p50 ms':>9}{'p99 ms':>9}{'update ms':>11}{'new rows ms':>13}")
+    for size in sorted(args.products):
+        # Grow the catalog to the next size
+        with engine.begin() as connection:
+            rows = [random_product(rng, product_id) for product_id in range(inserted + 1, size + 1)]
+            for start in range(0, len(rows), 5000):
+                connection.execute(insert(Product), rows[start:start + 5000])
+        inserted = size
+
+        index = ProductIndex(refresh_interval=0)
+        subscribe(index.on_change)
+        started = time.perf_counter()
+        index.refresh()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        queries = [random_query(rng) for _ in range(args.queries)]
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+        summary = latency_summary(latencies)
+
+        # Incremental updates through the ORM, applied on the next search
+        db = SessionLocal()
+        for product in db.query(Product).filter(Product.product_id <= args.updates):
+            product.description += " refurbished"
+        db.commit()
+        db.close()
+        started = time.perf_counter()
+        index.search("refurbished")
+        update_ms = (time.perf_counter() - started) * 1000
+
+        # Rows inserted elsewhere, found by the periodic check
+        with engine.begin() as connection:
+            connection.execute(insert(Product), [random_product(rng, inserted + i + 1) for i in range(100)])
+        inserted += 100
+        started = time.perf_counter()
+        index._load_new()
+        new_rows_ms = (time.perf_counter() - started) * 1000
+
+        catalogs[str(size)] = {
+            'build_ms': round(build_ms, 1),
+            **summary,
+            'update_ms': round(update_ms, 3),
+            'new_rows_ms': round(new_rows_ms, 3),
+        }
+        print(f"{size:>9}{build_ms:>10.0f}{summary['p50_ms']:>9.3f}{summary['p99_ms']:>9.3f}"
+              f"{update_ms:>11.2f}{new_rows_ms:>13.2f}")
+
+    results = {
+        'config': {'queries': args.queries, 'updates': args.updates, 'seed': args.seed},
+        'catalogs': catalogs,
+    }
+    path = write_results("product-index", results, args.output)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        compare_results(args.compare, results, section='catalogs', metrics=('p50_ms', 'p99_ms', 'build_ms'))
+
+if __name__ == "__main__":
+    main()
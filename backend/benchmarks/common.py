@@ -0,0 +1,113 @@
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# Make `app` importable when a benchmark is run as a script
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted sequence.
+
+    Args:
+        sorted_values: Values in ascending order
+        pct: Percentile between 0 and 100
+
+    Returns:
+        The percentile, or 0.0 for an empty sequence
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    """
+    Summarize request latencies (milliseconds).
+    """
+    values = sorted(latencies_ms)
+    return {
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'mean_ms': round(sum(values) / len(values), 3) if values else 0.0,
+        'max_ms': round(values[-1], 3) if values else 0.0,
+    }
+
+def git_commit() -> Optional[str]:
+    """
+    Get the short hash of the checked out commit, if this is a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(name: str, results: Dict, output: Optional[str] = None) -> str:
+    """
+    Save benchmark results as JSON, tagged with the commit and environment.
+
+    Args:
+        name: Benchmark name, used in the default file name
+        results: The measurements
+        output: Path to write to (default: benchmarks/results/<name>-<commit>-<time>.json)
+
+    Returns:
+        The path that was written
+    """
+    commit = git_commit()
+    document = {
+        'benchmark': name,
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        **results,
+    }
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{commit or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    return output
+
+def compare_results(baseline_path: str, current: Dict, section: str = 'endpoints',
+                    metrics: Sequence[str] = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')):
+    """
+    Print how each entry of `section` changed against a saved result file.
+
+    Args:
+        baseline_path: A JSON file written by write_results()
+        current: The new results
+        section: Top-level key holding {name: {metric: value}}
+        metrics: Metrics to compare
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    for name, values in current.get(section, {}).items():
+        old_values = baseline.get(section, {}).get(name)
+        if old_values is None:
+            continue
+        changes = []
+        for metric in metrics:
+            old, new = old_values.get(metric), values.get(metric)
+            if not old or new is None:
+                continue
+            changes.append(f"{metric} {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+        print(f"  {name}: " + ", ".join(changes))
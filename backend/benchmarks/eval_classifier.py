@@ -0,0 +1,217 @@
+"""
+Offline evaluation of the Classification Agent on logged traffic.
+
+Streams labeled messages from the database and classifies them with one of
+the agent's modes (see ClassificationAgent.MODES) in parallel worker
+processes, then reports accuracy, a confusion matrix, messages per second
+and per-message latency percentiles.
+
+Sources:
+    interactions: user_interactions.query_text labeled by its intent column
+    chat_logs: chat_logs.message labeled by the agent that answered it
+        (guard rejections are skipped); this measures agreement with the
+        routing in production rather than accuracy against human labels
+
+Rows are read in chunks with a server-side cursor and only a bounded number
+of chunks is in flight at once, so memory use does not grow with the table.
+Latency percentiles come from a fixed-size random sample of all messages.
+
+Usage (from the backend directory):
+    python benchmarks/eval_classifier.py --mode scored
+    python benchmarks/eval_classifier.py --mode rules --source chat_logs --workers 8 --limit 1000000
+    python benchmarks/eval_classifier.py --database-url postgresql://... --mode embedding --batch
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import compare_results, latency_summary, write_results
+
+# Chat log rows answered by these agents are labeled with the matching intent
+AGENT_INTENTS = {
+    'order_agent': 'order',
+    'details_agent': 'details',
+    'recommendation_agent': 'recommendation',
+}
+
+# Set in each worker process by init_worker()
+_classifier = None
+
+def init_worker(mode: str):
+    global _classifier
+    from app.agents.classification_agent import ClassificationAgent
+    _classifier = ClassificationAgent(mode=mode)
+
+def classify_chunk(chunk: List[Tuple[str, str]], batch: bool) -> List[Tuple[str, str, float]]:
+    """
+    Classify one chunk of (message, label) rows in a worker.
+
+    Returns:
+        (label, predicted intent, latency in ms) per row; with `batch` every
+        row gets the chunk's average latency
+    """
+    if batch:
+        started = time.perf_counter()
+        results = _classifier.process_batch([message for message, _ in chunk])
+        latency_ms = (time.perf_counter() - started) * 1000 / max(1, len(chunk))
+        return [(label, result['intent'], latency_ms) for (_, label), result in zip(chunk, results)]
+
+    outcomes = []
+    for message, label in chunk:
+        started = time.perf_counter()
+        result = _classifier.process(message)
+        outcomes.append((label, result['intent'], (time.perf_counter() - started) * 1000))
+    return outcomes
+
+def stream_rows(source: str, chunk_size: int, limit: Optional[int]) -> Iterator[List[Tuple[str, str]]]:
+    """
+    Yield chunks of (message, label) rows without loading the whole table.
+    """
+    from sqlalchemy import select
+    from app.database.db import SessionLocal
+    from app.database.models import ChatLog, UserInteraction
+    from app.services.intent_model import INTENT_ALIASES
+
+    if source == 'interactions':
+        query = select(UserInteraction.query_text, UserInteraction.intent).order_by(UserInteraction.interaction_id)
+    else:
+        query = (select(ChatLog.message, ChatLog.agent_name)
+                 .where(ChatLog.agent_name.in_(list(AGENT_INTENTS)))
+                 .order_by(ChatLog.chat_id))
+    if limit:
+        query = query.limit(limit)
+
+    db = SessionLocal()
+    try:
+        chunk = []
+        for message, label in db.execute(query.execution_options(yield_per=chunk_size)):
+            if source == 'interactions':
+                label = (label or '').strip().lower()
+                label = INTENT_ALIASES.get(label, label)
+            else:
+                label = AGENT_INTENTS[label]
+            chunk.append((message or '', label))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+class Evaluation:
+    """
+    Running totals of the classified messages.
+    """
+
+    def __init__(self, sample_size: int, seed: int):
+        self.confusion: Dict[str, Dict[str, int]] = {}
+        self.count = 0
+        self.correct = 0
+        self.sample_size = sample_size
+        self.latencies: List[float] = []
+        self._rng = random.Random(seed)
+
+    def add(self, outcomes: List[Tuple[str, str, float]]):
+        for label, predicted, latency_ms in outcomes:
+            row = self.confusion.setdefault(label, {})
+            row[predicted] = row.get(predicted, 0) + 1
+            self.correct += label == predicted
+            self.count += 1
+
+            # Reservoir sample of the latencies
+            if len(self.latencies) < self.sample_size:
+                self.latencies.append(latency_ms)
+            else:
+                slot = self._rng.randrange(self.count)
+                if slot < self.sample_size:
+                    self.latencies[slot] = latency_ms
+
+    def print_confusion(self):
+        labels = sorted(set(self.confusion) | {p for row in self.confusion.values() for p in row})
+        width = max([len("label \\ predicted")] + [len(label) for label in labels]) + 2
+        print("label \\ predicted".ljust(width) + "".join(label.rjust(width) for label in labels))
+        for label in labels:
+            row = self.confusion.get(label, {})
+            print(label.ljust(width) + "".join(str(row.get(predicted, 0)).rjust(width) for predicted in labels))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="rules", help="Classifier mode (see ClassificationAgent.MODES)")
+    parser.add_argument("--source", choices=("interactions", "chat_logs"), default="interactions")
+    parser.add_argument("--database-url", help="Database to read (default: DATABASE_URL)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows read and sent to a worker at a time")
+    parser.add_argument("--batch", action="store_true", help="Classify each chunk with process_batch()")
+    parser.add_argument("--limit", type=int, help="Stop after this many rows")
+    parser.add_argument("--latency-sample", type=int, default=100000, help="Latencies kept for the percentiles")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from app.agents.classification_agent import ClassificationAgent
+    if args.mode not in ClassificationAgent.MODES:
+        parser.error(f"--mode must be one of {', '.join(ClassificationAgent.MODES)}")
+
+    evaluation = Evaluation(args.latency_sample, args.seed)
+    workers = max(1, args.workers)
+    # Chunks in flight at once: enough to keep every worker busy
+    max_pending = workers * 2
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(args.mode,)) as pool:
+        pending = deque()
+        for chunk in stream_rows(args.source, args.chunk_size, args.limit):
+            pending.append(pool.apply_async(classify_chunk, (chunk, args.batch)))
+            if len(pending) >= max_pending:
+                evaluation.add(pending.popleft().get())
+        while pending:
+            evaluation.add(pending.popleft().get())
+    elapsed = time.perf_counter() - started
+
+    if not evaluation.count:
+        print("No labeled rows found")
+        return
+
+    accuracy = evaluation.correct / evaluation.count
+    throughput = evaluation.count / elapsed
+    latency = latency_summary(evaluation.latencies)
+
+    print(f"mode={args.mode} source={args.source} workers={workers} messages={evaluation.count}\n")
+    evaluation.print_confusion()
+    print(f"\naccuracy {accuracy:.2%}  {throughput:,.0f} msg/s  "
+          f"latency p50 {latency['p50_ms']:.3f} ms  p95 {latency['p95_ms']:.3f} ms  p99 {latency['p99_ms']:.3f} ms")
+
+    results = {
+        'config': {'mode': args.mode, 'source': args.source, 'workers': workers,
+                   'chunk_size': args.chunk_size, 'batch': args.batch, 'limit': args.limit},
+        'summary': {
+            args.mode: {
+                'messages': evaluation.count,
+                'accuracy': round(accuracy, 4),
+                'messages_per_second': round(throughput, 1),
+                **latency,
+            },
+        },
+        'confusion': evaluation.confusion,
+    }
+    path = write_results("classifier-eval", results, args.output)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        compare_results(args.compare, results, section='summary',
+                        metrics=('accuracy', 'messages_per_second', 'p50_ms', 'p99_ms'))
+
+if __name__ == "__main__":
+    main()
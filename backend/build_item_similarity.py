@@ -0,0 +1,47 @@
+"""
+Build the item-item similarity model served by the Recommendation Agent.
+
+Reads every rating from the recommendations table, computes the cosine
+similarity between products rated by the same users and saves each
+product's nearest neighbors as a new version under ITEM_SIMILARITY_PATH.
+Running apps pick up the new build within ITEM_SIMILARITY_RELOAD_SECONDS;
+the previous version is kept for apps that have not switched yet.
+
+Usage (from the backend directory):
+    python build_item_similarity.py
+    python build_item_similarity.py --neighbors 100 --output ./item_similarity
+"""
+import argparse
+import time
+from app import config
+from app.database.db import SessionLocal
+from app.services.item_similarity import ItemSimilarityModel, load_ratings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--neighbors", type=int, default=config.ITEM_SIMILARITY_NEIGHBORS,
+                        help="Most similar products kept per product")
+    parser.add_argument("--output", default=config.ITEM_SIMILARITY_PATH, help="Model directory")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        user_ids, product_ids, ratings = load_ratings(db)
+    finally:
+        db.close()
+    print(f"Read {len(ratings)} ratings in {time.perf_counter() - started:.1f}s")
+
+    if not len(ratings):
+        print("No ratings found, nothing to build")
+        return
+
+    started = time.perf_counter()
+    model = ItemSimilarityModel.build(user_ids, product_ids, ratings, neighbors=args.neighbors)
+    version = model.save(args.output)
+    print(f"Saved similarities for {model.meta['items']} products from {model.meta['users']} users "
+          f"({len(model.scores)} pairs) to {args.output} as version {version} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
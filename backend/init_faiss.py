@@ -147,7 +147,7 @@ def init_faiss_index():
     
     # Create and save the FAISS index
     print("Creating FAISS index...")
-    index = FAISSIndex()
+    index = FAISSIndex(vector_size=len(embeddings[0]))
     index.add_data(embeddings, metadata)
     
     # Save the index
@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react';
 import Header from '../components/Header';
 import ChatMessage from '../components/ChatMessage';
-import { sendChatMessage } from '../services/api';
+import { streamChatMessage } from '../services/api';
 
 const Chat = () => {
   const [messages, setMessages] = useState([
@@ -34,15 +34,31 @@ const Chat = () => {
     setIsLoading(true);
     
     try {
+      // Add an empty bot message and fill it in as the response streams
+      let started = false;
+      const appendChunk = (text) => {
+        const isFirst = !started;
+        started = true;
+        setMessages(prev => {
+          if (isFirst) {
+            return [...prev, { text, isUser: false }];
+          }
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, text: last.text + text }];
+        });
+        setIsLoading(false);
+      };
+
       // Send message to API
-      const response = await sendChatMessage(input, null, sessionId);
-      
-      // Add bot response to chat
-      const botMessage = { text: response.response, isUser: false };
-      setMessages(prev => [...prev, botMessage]);
+      const response = await streamChatMessage(input, null, sessionId, { onChunk: appendChunk });
+
+      // Nothing was streamed (e.g. an error response): show the final text
+      if (!started && response) {
+        setMessages(prev => [...prev, { text: response.response, isUser: false }]);
+      }
       
       // If there are product recommendations, display them
-      if (response.additional_data && response.additional_data.products && response.additional_data.products.length > 0) {
+      if (response && response.additional_data && response.additional_data.products && response.additional_data.products.length > 0) {
         // You could display product cards here
         console.log('Products:', response.additional_data.products);
       }
@@ -23,6 +23,89 @@ export const sendChatMessage = async (message, userId = null, sessionId = null)
   }
 };
 
+// Streaming Chat API (Server-Sent Events)
+// Calls onDecision({status, intent, agent}) as soon as the message is classified,
+// onChunk(text) for each piece of the response, and resolves with the full
+// ChatResponse once the 'done' event arrives.
+export const streamChatMessage = async (message, userId = null, sessionId = null, { onDecision, onChunk } = {}) => {
+  const response = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ message, user_id: userId, session_id: sessionId }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Streaming chat failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE frames are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === 'decision' && onDecision) onDecision(payload);
+      else if (event === 'chunk' && onChunk) onChunk(payload.text);
+      else if (event === 'done') result = payload;
+    }
+  }
+
+  return result;
+};
+
+// Persistent chat connection (WebSocket), one per session.
+// onEvent(event, data) receives the same 'decision' / 'chunk' / 'done' events
+// as streamChatMessage. Returns { send(message, userId), close() }.
+export const openChatSocket = (sessionId, onEvent, userId = null) => {
+  const httpBase = api.defaults.baseURL.startsWith('http')
+    ? api.defaults.baseURL
+    : `${window.location.origin}${api.defaults.baseURL}`;
+  const params = new URLSearchParams();
+  if (sessionId) params.set('session_id', sessionId);
+  if (userId !== null) params.set('user_id', userId);
+
+  const socket = new WebSocket(`${httpBase.replace(/^http/, 'ws')}/chat/ws?${params}`);
+  const pending = [];
+
+  socket.onopen = () => {
+    while (pending.length) socket.send(pending.shift());
+  };
+  socket.onmessage = (msg) => {
+    const { event, data } = JSON.parse(msg.data);
+    onEvent(event, data);
+  };
+  socket.onerror = (error) => {
+    console.error('Chat socket error:', error);
+  };
+
+  return {
+    send: (message, messageUserId = userId) => {
+      const frame = JSON.stringify({ message, user_id: messageUserId, session_id: sessionId });
+      if (socket.readyState === WebSocket.OPEN) socket.send(frame);
+      else pending.push(frame);
+    },
+    close: () => socket.close(),
+  };
+};
+
 // Products API
 export const getProducts = async (category = null) => {
   try {